@@ -0,0 +1,92 @@
+"""JSON vs Arrow IPC for /predict/batch: latency, rows/s and payload size.
+
+Starts the app with a large MAX_BATCH_SIZE and sends the same seeded records
+in every combination of request and response format, one request at a time:
+
+    python -m benchmarks.batch_formats --rows 10000 --requests 20
+
+Needs pyarrow on both sides.
+"""
+import argparse
+import json
+import random
+import time
+
+import httpx
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+
+from .common import latency_summary, register_and_login, run_server
+from .suite import random_patient
+
+ARROW = "application/vnd.apache.arrow.stream"
+
+
+def arrow_body(records: list) -> bytes:
+    table = pa.table({name: [record[name] for record in records] for name in records[0]})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def run_combination(client: httpx.Client, headers: dict, records: list, request_format: str, response_format: str,
+                    requests: int) -> dict:
+    if request_format == "arrow":
+        content, content_type = arrow_body(records), ARROW
+    else:
+        content, content_type = json.dumps({"records": records}).encode(), "application/json"
+    request_headers = {**headers, "Content-Type": content_type,
+                       "Accept": ARROW if response_format == "arrow" else "application/json"}
+
+    samples = []
+    response_bytes = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.post("/predict/batch", content=content, headers=request_headers)
+        response.raise_for_status()
+        if response_format == "arrow":
+            probabilities = pa.ipc.open_stream(response.content).read_all().column("probability").to_numpy()
+        else:
+            probabilities = [item["probability"] for item in response.json()["results"]]
+        samples.append(time.perf_counter() - started)
+        response_bytes = len(response.content)
+        assert len(probabilities) == len(records)
+
+    latency = latency_summary(samples)
+    return {
+        "request": request_format,
+        "response": response_format,
+        "request_bytes": len(content),
+        "response_bytes": response_bytes,
+        "rows_per_s": round(len(records) / float(np.median(samples))),
+        "latency": latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="records per request")
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per combination")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [random_patient(rng) for _ in range(args.rows)]
+    env = {"MAX_BATCH_SIZE": str(args.rows), "PREDICTION_HISTORY_ENABLED": "0", "LOG_LEVEL": "WARNING",
+           "RATE_LIMIT_ENABLED": "0"}
+    results = []
+    with run_server(env=env) as base_url, httpx.Client(base_url=base_url, timeout=120) as client:
+        headers = {"Authorization": f"Bearer {register_and_login(client, 'batchformats')}"}
+        for request_format in ("json", "arrow"):
+            for response_format in ("json", "arrow"):
+                # One untimed request first so each combination starts warm
+                run_combination(client, headers, records, request_format, response_format, 1)
+                results.append(run_combination(client, headers, records, request_format, response_format,
+                                               args.requests))
+    print(json.dumps({"rows": args.rows, "requests": args.requests, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
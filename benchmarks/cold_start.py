@@ -0,0 +1,91 @@
+"""Cold-start time: process spawn -> /health/live -> /health/ready, and shutdown time.
+
+Starts uvicorn in a fresh directory several times and reports the median of
+each phase as JSON. Exits with status 1 when the median time to ready is over
+--target-ms, so it can gate CI:
+
+    python -m benchmarks.cold_start --runs 5 --target-ms 5000
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .common import ROOT_DIR, free_port
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """ Seconds until url answers 200. """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer 200 within {timeout}s")
+
+
+def one_run(env: dict, timeout: float) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        spawned = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fastapi_app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            # No readiness drain delay, so shutdown_ms is the teardown itself
+            cwd=workdir, env={**os.environ, "PYTHONPATH": str(ROOT_DIR), "SHUTDOWN_DRAIN_DELAY": "0", **env},
+        )
+        try:
+            wait_for(base_url + "/health/live", process, timeout)
+            live = time.perf_counter() - spawned
+            wait_for(base_url + "/health/ready", process, timeout)
+            ready = time.perf_counter() - spawned
+            reported = httpx.get(base_url + "/health/ready").json()
+
+            stopping = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+            shutdown = time.perf_counter() - stopping
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+    return {
+        "live_ms": round(live * 1000, 1),
+        "ready_ms": round(ready * 1000, 1),
+        "shutdown_ms": round(shutdown * 1000, 1),
+        "app_startup_ms": reported["startup_ms"],
+        "app_steps_ms": reported["startup_steps_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--target-ms", type=float, default=5000.0, help="fail when the median spawn->ready is above this")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each probe")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server environment")
+    args = parser.parse_args()
+
+    env = dict(item.split("=", 1) for item in args.env)
+    runs = [one_run(env, args.timeout) for _ in range(args.runs)]
+    summary = {key: statistics.median(run[key] for run in runs) for key in ("live_ms", "ready_ms", "shutdown_ms")}
+    passed = summary["ready_ms"] <= args.target_ms
+    print(json.dumps({"median": summary, "target_ms": args.target_ms, "passed": passed, "runs": runs}, indent=2))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Helpers shared by the benchmark scripts."""
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+SAMPLE_PATIENT = {
+    "Pregnancies": 6,
+    "Glucose": 148,
+    "BloodPressure": 72,
+    "Insulin": 0,
+    "BMI": 33.6,
+    "DiabetesPedigreeFunction": 0.627,
+    "Age": 50,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def run_server(app: str = "fastapi_app.main:app", env: dict = None, workdir: str = None, port: int = None):
+    """ Start the app under uvicorn in a subprocess and yield its base URL.
+
+    Runs in a fresh temporary directory by default so the benchmark gets its
+    own SQLite database and log file.
+    """
+    port = port or free_port()
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="bench-"))
+        process_env = {**os.environ, "PYTHONPATH": str(ROOT_DIR), "SHUTDOWN_DRAIN_DELAY": "0", **(env or {})}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=process_env,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(base_url, process)
+            yield base_url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def wait_until_up(base_url: str, process: subprocess.Popen = None, timeout: float = 60.0, path: str = "/"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(base_url + path, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def register_and_login(client: httpx.Client, username: str, password: str = "benchmark123") -> str:
+    """ Create the user if needed and return a bearer token. """
+    client.post("/register", json={"username": username, "email": f"{username}@example.com", "password": password})
+    response = client.post("/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_summary(samples_seconds) -> dict:
+    """ p50/p95/p99/mean/max in milliseconds. """
+    samples = [s * 1000 for s in samples_seconds]
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "max_ms": round(max(samples), 3) if samples else 0.0,
+    }
@@ -0,0 +1,104 @@
+"""Profile reads and profile writes against SQLite: sync vs async session, stock vs tuned pragmas.
+
+Runs GET /users/profile and PUT /users/update under load four times: on the
+old sync session (benchmarks.sync_db_app, a threadpool worker per request)
+and on the async one the app uses now, each with SQLite's stock settings
+(rollback journal, synchronous=FULL, no mmap) and with the defaults from
+database.py (WAL, synchronous=NORMAL, larger cache, mmap). "sync/stock" is
+how the app ran before, "async/tuned" is how it runs now. The user cache is
+switched off so every read reaches the database. Prints all results as JSON:
+
+    python -m benchmarks.db_load --readers 16 --writers 4 --duration 10
+"""
+import argparse
+import json
+import threading
+import time
+
+import httpx
+
+from .common import latency_summary, register_and_login, run_server
+
+UNTUNED = {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_CACHE_SIZE": "-2000", "SQLITE_MMAP_SIZE": "0"}
+SESSIONS = {"sync": "benchmarks.sync_db_app:app", "async": "fastapi_app.main:app"}
+
+
+def load(base_url: str, readers: int, writers: int, duration: float) -> dict:
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        tokens = [register_and_login(client, f"reader{i}") for i in range(readers)]
+        writer_tokens = [register_and_login(client, f"writer{i}") for i in range(writers)]
+
+    stop = threading.Event()
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader(token):
+        headers = {"Authorization": f"Bearer {token}"}
+        samples = []
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = client.get("/users/profile", headers=headers)
+                if response.status_code == 200:
+                    samples.append(time.perf_counter() - started)
+                else:
+                    errors.append(response.status_code)
+        with lock:
+            reads.extend(samples)
+
+    def writer(i, token):
+        headers = {"Authorization": f"Bearer {token}"}
+        samples = []
+        n = 0
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set():
+                body = {"username": f"writer{i}", "email": f"writer{i}.{n}@example.com"}
+                started = time.perf_counter()
+                response = client.put("/users/update", json=body, headers=headers)
+                if response.status_code == 200:
+                    samples.append(time.perf_counter() - started)
+                else:
+                    errors.append(response.status_code)
+                n += 1
+        with lock:
+            writes.extend(samples)
+
+    threads = [threading.Thread(target=reader, args=(t,)) for t in tokens]
+    threads += [threading.Thread(target=writer, args=(i, t)) for i, t in enumerate(writer_tokens)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "read_rps": round(len(reads) / elapsed, 2),
+        "write_rps": round(len(writes) / elapsed, 2),
+        "errors": len(errors),
+        "reads": latency_summary(reads),
+        "writes": latency_summary(writes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16, help="concurrent GET /users/profile threads")
+    parser.add_argument("--writers", type=int, default=4, help="concurrent PUT /users/update threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per mode")
+    args = parser.parse_args()
+
+    # Cheap bcrypt so registering the benchmark users doesn't dominate setup
+    env = {"USER_CACHE_ENABLED": "0", "BCRYPT_ROUNDS": "4", "RATE_LIMIT_ENABLED": "0"}
+    results = {}
+    for session, app in SESSIONS.items():
+        for pragmas, extra in (("stock", UNTUNED), ("tuned", {})):
+            with run_server(app=app, env={**env, **extra}) as base_url:
+                results[f"{session}/{pragmas}"] = load(base_url, args.readers, args.writers, args.duration)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Cost of feature contributions: NumpyForest.explain() against predict_proba().
+
+Scores the same seeded rows both ways, in-process, at several batch sizes and
+reports the median time per call and their ratio as JSON. Also checks that
+expected_value + the contributions give back the probabilities. Exits with
+status 1 when explaining is more than --max-ratio times slower than scoring
+at any batch size:
+
+    python -m benchmarks.explain_overhead --sizes 1,100,1000 --max-ratio 2
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from .common import ROOT_DIR
+
+
+def load_model(path: str):
+    from fastapi_app.registry import ModelRegistry
+
+    model_version = ModelRegistry("numpy").load(path)
+    return model_version.explainer
+
+
+def time_calls(fn, X, repeats: int) -> float:
+    """ Median milliseconds per call. """
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(ROOT_DIR / "fastapi_app" / "diabetes_model.npz"))
+    parser.add_argument("--sizes", default="1,10,100,1000", help="comma-separated rows per call")
+    parser.add_argument("--repeats", type=int, default=200, help="calls per size and mode")
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="fail when explain/predict_proba is above this")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    model = load_model(args.model)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    rng = np.random.default_rng(0)
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        X = rng.uniform(0, 200, size=(size, model.n_features_in_))
+        # Warm both paths before timing
+        proba = model.predict_proba(X)
+        explained, contributions, expected_value = model.explain(X)
+        max_error = float(np.abs(expected_value + contributions.sum(axis=1) - explained).max())
+
+        predict_ms = time_calls(model.predict_proba, X, args.repeats)
+        explain_ms = time_calls(model.explain, X, args.repeats)
+        results.append({
+            "rows": size,
+            "predict_proba_ms": round(predict_ms, 3),
+            "explain_ms": round(explain_ms, 3),
+            "ratio": round(explain_ms / predict_ms, 2),
+            "same_probabilities": bool(np.array_equal(proba, explained)),
+            "max_additivity_error": max_error,
+        })
+
+    passed = all(r["ratio"] <= args.max_ratio and r["same_probabilities"] for r in results)
+    print(json.dumps({"model": args.model, "trees": model.n_estimators, "load_ms": round(load_ms, 2),
+                      "max_ratio": args.max_ratio, "passed": passed, "results": results}, indent=2))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
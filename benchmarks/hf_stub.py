@@ -0,0 +1,70 @@
+"""Local stand-in for the Hugging Face inference API used by /chat.
+
+Answers POST requests with the same shape as the real API,
+``[{"generated_text": "<prompt echoed back>\\n<advice lines>"}]``, after an
+optional delay, and can be told to fail a share of calls with 429/503 to
+exercise the client's retries. With ``"stream": true`` it answers with
+text-generation-inference style server-sent events, one token at a time and
+without echoing the prompt, like the real streaming API.
+
+    uvicorn benchmarks.hf_stub:app --port 9000
+    HF_API_URL=http://127.0.0.1:9000/models/stub uvicorn fastapi_app.main:app
+"""
+import asyncio
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Seconds to wait before answering, and share of calls answered with an error status
+STUB_DELAY = float(os.getenv("HF_STUB_DELAY", "0.05"))
+STUB_ERROR_RATE = float(os.getenv("HF_STUB_ERROR_RATE", "0"))
+STUB_ERROR_STATUS = int(os.getenv("HF_STUB_ERROR_STATUS", "503"))
+# Seconds between streamed tokens
+STUB_TOKEN_DELAY = float(os.getenv("HF_STUB_TOKEN_DELAY", "0.01"))
+
+ADVICE = [
+    "- Keep fasting glucose under 100 mg/dL and check it regularly.",
+    "- Aim for 150 minutes of moderate exercise per week.",
+    "- Prefer whole grains, vegetables and lean protein; limit sugary drinks.",
+    "- Work towards a BMI in the 18.5-24.9 range.",
+    "- Schedule a follow-up with your doctor for an HbA1c test.",
+]
+
+app = FastAPI(title="Hugging Face inference stand-in")
+
+
+def generated_text(prompt: str) -> str:
+    # The real model echoes the prompt before its answer
+    return prompt + "\n\n" + "\n".join(ADVICE)
+
+
+async def token_events():
+    text = "\n".join(ADVICE)
+    tokens = text.replace("\n", " \n").split(" ")
+    for i, token in enumerate(tokens):
+        if STUB_TOKEN_DELAY:
+            await asyncio.sleep(STUB_TOKEN_DELAY)
+        piece = token if token.startswith("\n") or i == 0 else " " + token
+        last = i == len(tokens) - 1
+        event = {
+            "token": {"id": i, "text": piece, "logprob": 0.0, "special": False},
+            "generated_text": text if last else None,
+            "details": None,
+        }
+        yield f"data:{json.dumps(event)}\n\n"
+
+
+@app.post("/models/{model_id:path}")
+async def generate(model_id: str, request: Request):
+    payload = await request.json()
+    if STUB_DELAY:
+        await asyncio.sleep(STUB_DELAY)
+    if STUB_ERROR_RATE and random.random() < STUB_ERROR_RATE:
+        return JSONResponse({"error": "Model is currently loading"}, status_code=STUB_ERROR_STATUS,
+                            headers={"Retry-After": "0"})
+    if payload.get("stream"):
+        return StreamingResponse(token_events(), media_type="text/event-stream")
+    return [{"generated_text": generated_text(payload.get("inputs", ""))}]
@@ -0,0 +1,122 @@
+"""Per-request logging cost on the request thread, before and after the queue pipeline.
+
+"before" is the old setup: logging.basicConfig writing app.log synchronously,
+two formatted INFO lines per prediction. "after" is logging_setup: a queue
+handler feeding a background listener that writes rotated JSON, one
+structured record per prediction plus the access record. Both write into a
+temporary directory and print JSON:
+
+    python -m benchmarks.logging_overhead --requests 20000 --threads 8
+
+--write-delay-ms adds a sleep to every file write to model slow or
+contended storage (network volumes, a busy disk, rotation).
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from fastapi_app import logging_setup
+
+from .common import latency_summary
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def slow_down(handler, delay: float):
+    if delay <= 0:
+        return
+    emit = handler.emit
+
+    def delayed_emit(record):
+        time.sleep(delay)
+        emit(record)
+    handler.emit = delayed_emit
+
+
+def before(logger, username, i):
+    probability = (i % 100) / 100
+    result = "Diabetic" if probability > 0.5 else "Non-Diabetic"
+    logger.info(f" User '{username}' - Prediction: {result} (Probability: {probability:.2f}%)")
+    logger.info(f" Message:Hello, {username}! You are at high risk for diabetes. Please consult a doctor immediately!")
+
+
+def after(logger, username, i):
+    probability = (i % 100) / 100
+    result = "Diabetic" if probability > 0.5 else "Non-Diabetic"
+    token = logging_setup.request_id_var.set(f"req-{i}")
+    logger.info("prediction", extra={"user": username, "prediction": result, "probability": round(probability, 4)})
+    logging_setup.access_logger.info("request", extra={
+        "method": "POST", "path": "/predict", "status": 200, "duration_ms": 1.234,
+    })
+    logging_setup.request_id_var.reset(token)
+
+
+def run(emit, requests: int, threads: int) -> dict:
+    logger = logging.getLogger("fastapi_app.routes.diabetes")
+    per_thread = requests // threads
+    samples = []
+    lock = threading.Lock()
+
+    def worker(n):
+        local = []
+        for i in range(per_thread):
+            started = time.perf_counter()
+            emit(logger, f"user{n}", i)
+            local.append(time.perf_counter() - started)
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {"requests_per_second": round(len(samples) / elapsed, 1), "per_request": latency_summary(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="simulated requests per mode")
+    parser.add_argument("--threads", type=int, default=8, help="request threads logging concurrently")
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="simulated latency of each file write")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-logging-") as workdir:
+        reset_root()
+        logging.basicConfig(
+            filename=os.path.join(workdir, "before.log"),
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+            force=True,
+        )
+        slow_down(logging.getLogger().handlers[0], args.write_delay_ms / 1000)
+        results["before"] = run(before, args.requests, args.threads)
+        reset_root()
+
+        logging_setup.LOG_FILE = os.path.join(workdir, "after.log")
+        logging_setup.setup_logging()
+        slow_down(logging_setup._listener.handlers[0], args.write_delay_ms / 1000)
+        results["after"] = run(after, args.requests, args.threads)
+        # Time the listener still needed to write the backlog, off the request threads
+        started = time.perf_counter()
+        logging_setup.shutdown_logging()
+        results["after"]["drain_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
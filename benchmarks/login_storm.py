@@ -0,0 +1,90 @@
+"""Login throughput and /predict latency during a concurrent login storm.
+
+Runs the app once with bcrypt on the request threads (BCRYPT_WORKERS=0) and
+once with the dedicated bcrypt process pool, and prints both results as JSON:
+
+    python -m benchmarks.login_storm --logins 16 --duration 10
+"""
+import argparse
+import json
+import threading
+import time
+
+import httpx
+
+from .common import SAMPLE_PATIENT, latency_summary, register_and_login, run_server
+
+
+def storm(base_url: str, login_threads: int, duration: float) -> dict:
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        token = register_and_login(client, "probe")
+        for i in range(login_threads):
+            register_and_login(client, f"storm{i}")
+
+    headers = {"Authorization": f"Bearer {token}"}
+    stop = threading.Event()
+    counts = {"ok": 0, "busy": 0, "errors": 0}
+    counts_lock = threading.Lock()
+
+    def login_loop(i):
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set():
+                response = client.post("/login", data={"username": f"storm{i}", "password": "benchmark123"})
+                key = "ok" if response.status_code == 200 else "busy" if response.status_code == 503 else "errors"
+                with counts_lock:
+                    counts[key] += 1
+
+    def probe(samples, until):
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            i = 0
+            while time.monotonic() < until:
+                # Vary the input so the prediction cache does not hide the model call
+                patient = {**SAMPLE_PATIENT, "Glucose": 80 + i % 120}
+                started = time.perf_counter()
+                client.post("/predict", json=patient, headers=headers).raise_for_status()
+                samples.append(time.perf_counter() - started)
+                i += 1
+
+    idle = []
+    probe(idle, time.monotonic() + min(3.0, duration))
+
+    threads = [threading.Thread(target=login_loop, args=(i,)) for i in range(login_threads)]
+    under_storm = []
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    probe(under_storm, started + duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "logins_ok": counts["ok"],
+        "logins_busy_503": counts["busy"],
+        "login_errors": counts["errors"],
+        "login_rps": round(counts["ok"] / elapsed, 2),
+        "predict_idle": latency_summary(idle),
+        "predict_during_storm": latency_summary(under_storm),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of login storm per mode")
+    parser.add_argument("--workers", type=int, default=None, help="BCRYPT_WORKERS for the pooled run")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    args = parser.parse_args()
+
+    env = {"BCRYPT_ROUNDS": str(args.rounds), "PREDICTION_CACHE_ENABLED": "0", "RATE_LIMIT_ENABLED": "0"}
+    pooled = {"BCRYPT_WORKERS": str(args.workers)} if args.workers else {}
+    results = {}
+    for mode, extra in (("inline", {"BCRYPT_WORKERS": "0"}), ("process_pool", pooled)):
+        with run_server(env={**env, **extra}) as base_url:
+            results[mode] = storm(base_url, args.logins, args.duration)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
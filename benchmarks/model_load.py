@@ -0,0 +1,97 @@
+"""Model load time and per-worker memory: pickle vs the memory-mapped .npz artifact.
+
+Starts --workers processes per format that each load the model the way the
+app does (pickle: unpickle + compile to NumpyForest; npz: NumpyForest.load
+with mmap) and score one row. While all of them are still alive it reads
+their memory from /proc: RSS counts shared pages in full, PSS splits them
+between the processes sharing them, so PSS is the real cost per worker.
+
+    python -m benchmarks.model_load --workers 4
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from .common import ROOT_DIR, percentile
+
+LOADER = r"""
+import json, sys, time
+started = time.perf_counter()
+import numpy as np
+from fastapi_app.inference import NumpyForest
+imported = time.perf_counter()
+path = sys.argv[1]
+if path.endswith(".npz"):
+    model = NumpyForest.load(path)
+else:
+    import pickle
+    with open(path, "rb") as f:
+        model = NumpyForest.from_sklearn(pickle.load(f))
+model.predict_proba(np.zeros((1, model.n_features_in_)))
+loaded = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "load_ms": (loaded - imported) * 1000}), flush=True)
+sys.stdin.read()
+"""
+
+
+def memory_kb(pid: int) -> dict:
+    """ Rss/Pss/shared/private totals of a process, from /proc/<pid>/smaps_rollup. """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def measure(path: str, workers: int) -> dict:
+    processes = [
+        subprocess.Popen([sys.executable, "-c", LOADER, path], cwd=ROOT_DIR, stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        timings = [json.loads(process.stdout.readline()) for process in processes]
+        # Everyone is loaded and still running, so shared pages are counted once across them
+        memory = [memory_kb(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+    load_ms = [t["load_ms"] for t in timings]
+    return {
+        "workers": workers,
+        "load_ms_p50": round(percentile(load_ms, 0.5), 2),
+        "load_ms_max": round(max(load_ms), 2),
+        "import_ms_p50": round(percentile([t["import_ms"] for t in timings], 0.5), 2),
+        "rss_kb_per_worker": round(sum(m["rss_kb"] for m in memory) / workers),
+        "pss_kb_per_worker": round(sum(m["pss_kb"] for m in memory) / workers),
+        "private_kb_per_worker": round(sum(m["private_kb"] for m in memory) / workers),
+        "pss_kb_total": sum(m["pss_kb"] for m in memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="processes loading the model at the same time")
+    parser.add_argument("--pickle", default=str(ROOT_DIR / "fastapi_app" / "diabetes_model.pkl"))
+    parser.add_argument("--npz", default=str(ROOT_DIR / "fastapi_app" / "diabetes_model.npz"))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = {"pickle": measure(args.pickle, args.workers), "npz_mmap": measure(args.npz, args.workers)}
+    results["elapsed_s"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Rate limits under realistic load: well-behaved clients next to abusive ones.
+
+Starts the app with the limiter on and the default budgets (override with
+--env), behind one simulated proxy (RATE_LIMIT_TRUSTED_PROXIES=1, every
+client sends its own X-Forwarded-For). For --duration seconds these run at
+the same time:
+
+- predict: --users users calling /predict at --user-rate requests/s each,
+  below the per-user budget;
+- predict_abuser: one user calling /predict back to back from --abusers threads;
+- login: --logins users logging in every --login-interval seconds, all from
+  the same address, like everyone signing in through the frontend;
+- login_guesser: one client at another address trying passwords for one
+  of those accounts back to back.
+
+Then the same run is repeated with RATE_LIMIT_ENABLED=0. Prints requests/s,
+status counts and latency (of the 2xx answers) per client and run as JSON.
+The well-behaved clients should see no 429s; compare their latency between
+the runs to see what the limiter costs them and what it saves them:
+
+    python -m benchmarks.ratelimit_load --users 10 --user-rate 5 --duration 15
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import httpx
+
+from .common import SAMPLE_PATIENT, latency_summary, register_and_login, run_server
+from .suite import random_patient
+
+PASSWORD = "benchmark123"
+FRONTEND_ADDRESS = "10.0.0.2"
+GUESSER_ADDRESS = "10.9.9.9"
+
+DEFAULT_ENV = {
+    "PREDICTION_CACHE_ENABLED": "0",
+    "ADVICE_CACHE_ENABLED": "0",
+    "LOG_LEVEL": "WARNING",
+    "RATE_LIMIT_TRUSTED_PROXIES": "1",
+    "ADMIN_USERNAMES": "rl_admin",
+}
+
+
+def address(i: int) -> str:
+    return f"10.1.{i // 250}.{i % 250 + 1}"
+
+
+def seed(base_url: str, names: list) -> dict:
+    """ Register and log in every user from its own address; returns username -> auth headers. """
+    headers = {}
+    for i, name in enumerate(names):
+        with httpx.Client(base_url=base_url, timeout=120, headers={"X-Forwarded-For": address(i)}) as client:
+            token = register_and_login(client, name, PASSWORD)
+            headers[name] = {"Authorization": f"Bearer {token}", "X-Forwarded-For": address(i)}
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        client.post("/predict", json=SAMPLE_PATIENT, headers=next(iter(headers.values()))).raise_for_status()
+    return headers
+
+
+def run_load(base_url: str, args, headers: dict) -> dict:
+    results = {}
+    lock = threading.Lock()
+    started = time.monotonic()
+    until = started + args.duration
+
+    def record(kind: str, status: str, elapsed: float):
+        with lock:
+            result = results.setdefault(kind, {"status": {}, "samples": []})
+            result["status"][status] = result["status"].get(status, 0) + 1
+            if status.startswith("2"):
+                result["samples"].append(elapsed)
+
+    def loop(kind: str, send, interval: float = 0.0, offset: float = 0.0):
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            next_at = started + offset
+            while True:
+                if interval:
+                    # Open loop: keep the schedule whatever the answers
+                    time.sleep(max(0.0, next_at - time.monotonic()))
+                    next_at += interval
+                request_started = time.monotonic()
+                if request_started >= until:
+                    return
+                try:
+                    status = str(send(client).status_code)
+                except httpx.HTTPError as e:
+                    status = e.__class__.__name__
+                record(kind, status, time.monotonic() - request_started)
+
+    def predict(user_headers: dict, rng: random.Random):
+        return lambda client: client.post("/predict", json=random_patient(rng), headers=user_headers)
+
+    def login(name: str, password: str = PASSWORD, forwarded_for: str = FRONTEND_ADDRESS):
+        return lambda client: client.post("/login", data={"username": name, "password": password},
+                                          headers={"X-Forwarded-For": forwarded_for})
+
+    rng = random.Random(args.seed)
+    threads = []
+    for i in range(args.users):
+        user_rng = random.Random(f"{args.seed}-{i}")
+        threads.append(threading.Thread(target=loop, args=(
+            "predict", predict(headers[f"rl_user{i}"], user_rng), 1 / args.user_rate, rng.uniform(0, 1 / args.user_rate)
+        )))
+    for i in range(args.abusers):
+        threads.append(threading.Thread(target=loop, args=(
+            "predict_abuser", predict(headers["rl_abuser"], random.Random(f"{args.seed}-abuser-{i}"))
+        )))
+    for i in range(args.logins):
+        threads.append(threading.Thread(target=loop, args=(
+            "login", login(f"rl_login{i}"), args.login_interval, rng.uniform(0, args.login_interval)
+        )))
+    threads.append(threading.Thread(target=loop, args=(
+        "login_guesser", login("rl_login0", "not-the-password", GUESSER_ADDRESS)
+    )))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        kind: {
+            "rps": round(sum(result["status"].values()) / args.duration, 2),
+            "status": dict(sorted(result["status"].items())),
+            "latency": latency_summary(result["samples"]),
+        }
+        for kind, result in sorted(results.items())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="well-behaved /predict users")
+    parser.add_argument("--user-rate", type=float, default=5.0, help="requests/s per well-behaved user")
+    parser.add_argument("--abusers", type=int, default=4, help="threads sending as one abusive user")
+    parser.add_argument("--logins", type=int, default=5, help="users logging in through the same address")
+    parser.add_argument("--login-interval", type=float, default=5.0, help="seconds between a user's logins")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server setting")
+    args = parser.parse_args()
+
+    env = dict(DEFAULT_ENV, **dict(item.split("=", 1) for item in args.env))
+    names = [f"rl_user{i}" for i in range(args.users)] + ["rl_abuser"] + [f"rl_login{i}" for i in range(args.logins)] + ["rl_admin"]
+    report = {"users": args.users, "user_rate": args.user_rate, "abusers": args.abusers, "logins": args.logins,
+              "duration": args.duration}
+    for run, enabled in (("limited", "1"), ("unlimited", "0")):
+        with run_server(env={**env, "RATE_LIMIT_ENABLED": enabled}) as base_url:
+            headers = seed(base_url, names)
+            report[run] = run_load(base_url, args, headers)
+            if enabled == "1":
+                report[run]["limiters"] = httpx.get(base_url + "/ratelimit/stats", headers=headers["rl_admin"]).json()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
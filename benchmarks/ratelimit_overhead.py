@@ -0,0 +1,42 @@
+"""Cost of one rate-limit check, in-process.
+
+Times TokenBucketLimiter.acquire() over a working set of --keys identities
+(every call allowed, so the full bucket update runs) and with more identities
+than the limiter keeps (every call evicts one):
+
+    python -m benchmarks.ratelimit_overhead --calls 1000000 --keys 10000
+"""
+import argparse
+import json
+import time
+
+from fastapi_app.ratelimit import TokenBucketLimiter
+
+
+def ns_per_call(limiter: TokenBucketLimiter, keys: list, calls: int) -> float:
+    n_keys = len(keys)
+    started = time.perf_counter()
+    for i in range(calls):
+        limiter.acquire(keys[i % n_keys])
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--keys", type=int, default=10000, help="identities in the working set")
+    args = parser.parse_args()
+
+    keys = list(range(args.keys))
+    steady = TokenBucketLimiter("benchmark", rate=1e9, burst=1e9, max_keys=args.keys)
+    evicting = TokenBucketLimiter("benchmark", rate=1e9, burst=1e9, max_keys=max(1, args.keys // 10))
+    print(json.dumps({
+        "calls": args.calls,
+        "keys": args.keys,
+        "ns_per_check": round(ns_per_call(steady, keys, args.calls)),
+        "ns_per_check_evicting": round(ns_per_call(evicting, keys, args.calls)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
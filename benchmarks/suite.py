@@ -0,0 +1,230 @@
+"""Load benchmark for /predict, /login, /users/profile and /chat, with baseline comparison.
+
+Starts the app under uvicorn in a fresh directory (so a fresh SQLite
+database) next to the local Hugging Face stub, seeds the users, then drives
+each scenario with a fixed number of concurrent clients for a fixed time.
+Inputs come from a seeded RNG, so two runs send the same requests. The
+prediction and advice caches are off by default so the code under test runs
+on every call (override with --env).
+
+Reports requests/s, p50/p95/p99 latency and errors per scenario as JSON:
+
+    python -m benchmarks.suite --concurrency 8 --duration 10 --output baseline.json
+    # ... change the code ...
+    python -m benchmarks.suite --concurrency 8 --duration 10 --baseline baseline.json --threshold 0.1
+
+With --baseline, exits with status 1 when a scenario lost more than
+--threshold of its throughput, got that much slower at p95/p99, or started
+failing requests.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from .common import ROOT_DIR, SAMPLE_PATIENT, free_port, latency_summary, register_and_login, run_server
+
+SCENARIOS = ("predict", "login", "profile", "chat")
+
+# Server settings for every run, so results don't depend on the caller's shell
+DEFAULT_ENV = {
+    "PREDICTION_CACHE_ENABLED": "0",
+    "ADVICE_CACHE_ENABLED": "0",
+    "USER_CACHE_ENABLED": "1",
+    "LOG_LEVEL": "WARNING",
+    # A few seeded users send everything, so per-user limits would measure 429s
+    "RATE_LIMIT_ENABLED": "0",
+}
+
+PASSWORD = "benchmark123"
+
+
+def random_patient(rng: random.Random) -> dict:
+    return {
+        "Pregnancies": rng.randint(0, 12),
+        "Glucose": rng.randint(60, 200),
+        "BloodPressure": rng.randint(40, 110),
+        "Insulin": rng.randint(0, 300),
+        "BMI": round(rng.uniform(18, 50), 1),
+        "DiabetesPedigreeFunction": round(rng.uniform(0.08, 2.4), 3),
+        "Age": rng.randint(21, 80),
+    }
+
+
+def random_chat(rng: random.Random) -> dict:
+    patient = random_patient(rng)
+    return {
+        "glucose": patient["Glucose"],
+        "blood_pressure": patient["BloodPressure"],
+        "insulin": patient["Insulin"],
+        "bmi": patient["BMI"],
+        "age": patient["Age"],
+        "diabetes_pedigree_function": patient["DiabetesPedigreeFunction"],
+        "prediction": rng.choice(["Diabetic", "Not Diabetic"]),
+        "probability": f"{rng.uniform(0, 100):.2f}%",
+    }
+
+
+def make_request(scenario: str, client: httpx.Client, user: dict, rng: random.Random) -> httpx.Response:
+    if scenario == "predict":
+        return client.post("/predict", json=random_patient(rng), headers=user["headers"])
+    if scenario == "login":
+        return client.post("/login", data={"username": user["username"], "password": PASSWORD})
+    if scenario == "profile":
+        return client.get("/users/profile", headers=user["headers"])
+    if scenario == "chat":
+        return client.post("/chat", json=random_chat(rng), headers=user["headers"])
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+
+def seed_users(base_url: str, count: int) -> list:
+    users = []
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        for i in range(count):
+            username = f"bench{i}"
+            token = register_and_login(client, username, PASSWORD)
+            users.append({"username": username, "headers": {"Authorization": f"Bearer {token}"}})
+        # One prediction so the history table and model path are warm for every scenario
+        client.post("/predict", json=SAMPLE_PATIENT, headers=users[0]["headers"]).raise_for_status()
+    return users
+
+
+def run_scenario(base_url: str, scenario: str, users: list, concurrency: int, duration: float,
+                 warmup: float, seed: int) -> dict:
+    """ Closed loop: each client sends its next request as soon as the previous one returns. """
+    samples = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    measure_from = time.monotonic() + warmup
+    until = measure_from + duration
+
+    def client_loop(i):
+        rng = random.Random(f"{seed}-{scenario}-{i}")
+        user = users[i % len(users)]
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while True:
+                started = time.monotonic()
+                if started >= until:
+                    return
+                try:
+                    key = str(make_request(scenario, client, user, rng).status_code)
+                except httpx.HTTPError as e:
+                    key = e.__class__.__name__
+                if started >= measure_from:
+                    samples[i].append(time.monotonic() - started)
+                    statuses[i][key] = statuses[i].get(key, 0) + 1
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = [s for client_samples in samples for s in client_samples]
+    by_status = {}
+    for client_statuses in statuses:
+        for key, count in client_statuses.items():
+            by_status[key] = by_status.get(key, 0) + count
+    errors = sum(count for key, count in by_status.items() if not key.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / duration, 2),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "status": dict(sorted(by_status.items())),
+        "latency": latency_summary(latencies),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """ Human-readable regressions of current against baseline, empty when there are none. """
+    regressions = []
+    for scenario, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        if before["rps"] and result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{scenario}: rps {before['rps']} -> {result['rps']}")
+        for key in ("p95_ms", "p99_ms"):
+            old, new = before["latency"][key], result["latency"][key]
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{scenario}: {key} {old} -> {new}")
+        if result["errors"] and result["error_rate"] > before["error_rate"]:
+            regressions.append(f"{scenario}: error rate {before['error_rate']} -> {result['error_rate']}")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients per scenario")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--users", type=int, default=8, help="seeded users the clients log in as")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server environment")
+    parser.add_argument("--output", help="also write the JSON report here (e.g. to use as a baseline)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stub_port = free_port()
+    env = {
+        **DEFAULT_ENV,
+        "HF_API_URL": f"http://127.0.0.1:{stub_port}/models/stub",
+        "HF_API_KEY": "benchmark",
+        **dict(item.split("=", 1) for item in args.env),
+    }
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: getattr(args, key) for key in ("concurrency", "duration", "warmup", "users", "seed")},
+        "env": env,
+        "scenarios": {},
+    }
+    with run_server("benchmarks.hf_stub:app", port=stub_port), run_server(env=env) as base_url:
+        users = seed_users(base_url, args.users)
+        for scenario in scenarios:
+            report["scenarios"][scenario] = run_scenario(
+                base_url, scenario, users, args.concurrency, args.duration, args.warmup, args.seed
+            )
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        report["baseline"] = {"path": args.baseline, "revision": baseline.get("revision"),
+                              "threshold": args.threshold, "regressions": regressions}
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
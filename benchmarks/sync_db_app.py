@@ -0,0 +1,52 @@
+"""The app with /users/profile and /users/update on the old sync session, for benchmarks.db_load.
+
+Both routes are plain `def` endpoints on the sync Session again, as before the
+auth and profile routes moved to the async one: every request holds a
+threadpool worker while it waits for SQLite. Everything else is the current app.
+"""
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from fastapi_app.database import get_db
+from fastapi_app.main import app
+from fastapi_app.models.user import User
+from fastapi_app.schemas.user import UserBase, UserResponse
+from fastapi_app.utils import CachedUser, _decode_token_or_401, invalidate_user_cache, oauth2_scheme
+
+SYNC_PATHS = {"/users/profile", "/users/update"}
+
+
+def lookup_user_or_401(db: Session, token: str) -> User:
+    payload = _decode_token_or_401(token)
+    db_user = db.query(User).filter(User.username == payload.get("sub")).first()
+    if not db_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User is not present in the database",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return db_user
+
+
+def welcome_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user = CachedUser(lookup_user_or_401(db, token))
+    return {"id": user.id, "username": user.username, "email": user.email, "message": f"welcome MR : {user.username}"}
+
+
+def update_user(user_update: UserBase, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    current_user = lookup_user_or_401(db, token)
+    existing_user = db.query(User).filter(User.email == user_update.email, User.id != current_user.id).first()
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Email already in use.")
+    current_user.username = user_update.username
+    current_user.email = user_update.email
+    try:
+        db.commit()
+        db.refresh(current_user)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    invalidate_user_cache(current_user.id)
+    return UserResponse(id=current_user.id, username=current_user.username, email=current_user.email)
+
+
+app.router.routes = [route for route in app.router.routes if getattr(route, "path", None) not in SYNC_PATHS]
+app.add_api_route("/users/profile", welcome_user, methods=["GET"])
+app.add_api_route("/users/update", update_user, methods=["PUT"], response_model=UserResponse)
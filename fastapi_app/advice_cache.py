@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Longest time between two trims of the SQLite table while entries are being written
+STORE_TRIM_INTERVAL = 300.0
+
+# Default bin width per ChatRequest field; patients in the same bins share advice
+DEFAULT_BINS = {
+    "glucose": 10.0,
+    "blood_pressure": 10.0,
+    "insulin": 25.0,
+    "bmi": 2.0,
+    "age": 5.0,
+    "diabetes_pedigree_function": 0.25,
+}
+
+
+def parse_bins(spec: str) -> dict:
+    """ Parse "glucose=10,bmi=2" into bin widths, on top of DEFAULT_BINS. """
+    bins = dict(DEFAULT_BINS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        field, _, width = item.partition("=")
+        if field.strip() not in DEFAULT_BINS:
+            raise ValueError(f"Unknown advice cache field: {field!r}")
+        bins[field.strip()] = float(width)
+    return bins
+
+
+def risk_band(prediction: str, probability: str) -> str:
+    """ Same bands as generate_advice: none / low / moderate / high. """
+    if prediction != "Diabetic":
+        return "none"
+    try:
+        value = float(str(probability).strip().rstrip("%")) / 100
+    except ValueError:
+        return "unknown"
+    if value > 0.80:
+        return "high"
+    elif value > 0.50:
+        return "moderate"
+    return "low"
+
+
+class AdviceCache:
+    """ LLM advice cache keyed on binned ChatRequest fields plus the risk band.
+
+    Entries live in a bounded LRU with a TTL. With a path, every entry is also
+    written (from a background thread) to a small SQLite table and the most
+    recent unexpired ones are loaded back at startup, so the cache survives
+    restarts; the writer keeps the table trimmed to the TTL and max_size as
+    it goes. Concurrent misses on the same key share one upstream call.
+
+    Keys hold nothing about the user, so the generated advice must not either.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl_seconds: float = 86400.0, bins: dict = None, path: str = None):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self.bins = bins or dict(DEFAULT_BINS)
+        self.path = path or None
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._writer = None
+        self._db = None
+        self._writes_since_trim = 0
+        self._last_trim = 0.0
+        if self.path:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="advice-cache")
+            self._writer.submit(self._open_store).result()
+
+    def key(self, request):
+        """ Cache key for a ChatRequest, or None when a value can't be binned (inf/nan) and the cache is skipped. """
+        parts = [request.prediction, risk_band(request.prediction, request.probability)]
+        for field, width in self.bins.items():
+            value = float(getattr(request, field))
+            if not math.isfinite(value):
+                return None
+            bucket = math.floor(value / width) * width if width > 0 else value
+            parts.append(f"{field}={bucket:g}")
+        return "|".join(parts)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            advice, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return advice
+
+    def put(self, key: str, advice: str, created_at: float = None, persist: bool = True):
+        created_at = created_at or time.time()
+        with self._lock:
+            self._entries[key] = (advice, created_at + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if persist and self._writer is not None:
+            self._writer.submit(self._store, key, advice, created_at)
+
+    async def get_or_generate(self, key: str, generate):
+        """ Return cached advice for key, or await generate() once for all concurrent callers. """
+        advice = self.get(key)
+        if advice is not None:
+            return advice
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        try:
+            advice = await generate()
+        except BaseException as e:
+            # Coalesced callers weren't cancelled themselves: they get an ordinary error instead
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Generation was cancelled"))
+            # Nobody else may be waiting; don't let the loop warn about it
+            future.exception()
+            raise
+        else:
+            self.put(key, advice)
+            future.set_result(advice)
+            return advice
+        finally:
+            self._inflight.pop(key, None)
+
+    def record_miss(self):
+        self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "persistent": self.path is not None,
+            "bins": self.bins,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.submit(self._close_store)
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    # SQLite persistence, only ever touched from the writer thread
+
+    def _open_store(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS advice_cache ("
+            "key TEXT PRIMARY KEY, advice TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS advice_cache_created_at ON advice_cache (created_at)")
+        self._trim_store()
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, advice, created_at FROM advice_cache ORDER BY created_at DESC LIMIT ?",
+            (self.max_size,)
+        ).fetchall()
+        for key, advice, created_at in reversed(rows):
+            self.put(key, advice, created_at, persist=False)
+        logger.info(f"Advice cache: loaded {len(rows)} entries from {self.path}")
+
+    def _store(self, key, advice, created_at):
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO advice_cache (key, advice, created_at) VALUES (?, ?, ?)",
+                (key, advice, created_at)
+            )
+            # Trim every max_size/10 writes (or few minutes), so the table stays within ~10% of max_size
+            self._writes_since_trim += 1
+            if (self._writes_since_trim >= max(1, self.max_size // 10)
+                    or time.monotonic() - self._last_trim >= min(self.ttl, STORE_TRIM_INTERVAL)):
+                self._trim_store()
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Advice cache: could not persist entry: {e}")
+
+    def _trim_store(self):
+        """ Drop expired rows, then all but the max_size newest, like the in-memory cache. """
+        self._db.execute("DELETE FROM advice_cache WHERE created_at <= ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM advice_cache WHERE key NOT IN "
+            "(SELECT key FROM advice_cache ORDER BY created_at DESC LIMIT ?)", (self.max_size,)
+        )
+        self._writes_since_trim = 0
+        self._last_trim = time.monotonic()
+
+    def _close_store(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
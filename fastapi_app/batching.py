@@ -0,0 +1,205 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from .executor import InferenceBusy, InferenceTimeout
+
+
+class MicroBatcher:
+    """ Collects concurrent single-row predictions and scores them in one call.
+
+    Callers submit one feature row and get a Future back. A background thread
+    takes the oldest waiting row, keeps collecting until the batch is full or
+    max_wait_ms has passed since that row arrived, scores the stacked rows
+    with one score(model_version, X) call and resolves every caller with its
+    own row. Rows that were submitted for a specific model version (e.g.
+    during a traffic split) are scored with that version, one call per
+    version in the batch.
+
+    score is normally InferenceExecutor.predict_proba_sync, so batches get the
+    executor's pending limit, timeout and worker pool like any other call.
+    At most max_queue rows may wait (0: unbounded); past that submit() raises
+    InferenceBusy.
+    """
+
+    def __init__(self, get_model_version, score, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 max_queue: int = 0, sample_size: int = 1024):
+        self._get_model_version = get_model_version
+        self._score = score
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue = max(0, max_queue)
+        self._queue = queue.Queue()
+        self._stopping = False
+
+        # Stats, written by the worker thread and read by /batching/stats
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._size_buckets = self._bucket_bounds(self.max_batch_size)
+        self._size_counts = [0] * len(self._size_buckets)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=sample_size)
+        self._inference_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _bucket_bounds(max_batch_size):
+        bounds = [1]
+        while bounds[-1] < max_batch_size:
+            bounds.append(min(bounds[-1] * 2, max_batch_size))
+        return bounds
+
+    def submit(self, row, model_version=None) -> Future:
+        """ Queue one feature row, the Future resolves to its probability row.
+
+        Without a model_version the row is scored with whatever
+        get_model_version() returns when its batch runs.
+        """
+        if self._stopping:
+            raise RuntimeError("Micro-batcher is closed")
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            with self._lock:
+                self._rejected += 1
+            raise InferenceBusy(f"{self.max_queue} rows already waiting to be batched")
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float64).ravel(), time.perf_counter(), future, model_version))
+        return future
+
+    def predict_proba(self, row, timeout: float = None, model_version=None):
+        return self.submit(row, model_version).result(timeout)
+
+    async def predict_proba_async(self, row, timeout: float = None, model_version=None):
+        """ Await the row's probabilities; InferenceTimeout if they take longer than timeout, queueing included. """
+        future = self.submit(row, model_version)
+        try:
+            # On timeout the Future is cancelled too, so its row is dropped if it hasn't been scored yet
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise InferenceTimeout(f"Batched inference took longer than {timeout * 1000:.0f}ms")
+
+    def close(self, timeout: float = 5.0):
+        """ Stop accepting rows, finish what is queued and stop the worker. """
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = first[1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Closing: score what we have, the loop exits afterwards
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._process(batch)
+            elif self._stopping:
+                break
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        # Callers that gave up waiting have cancelled their Future; their rows are neither scored nor counted
+        live = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if len(live) < len(batch):
+            with self._lock:
+                self._cancelled += len(batch) - len(live)
+        if not live:
+            return
+        batch = live
+        default_version = self._get_model_version()
+        groups = {}
+        for item in batch:
+            model_version = item[3] if item[3] is not None else default_version
+            groups.setdefault(id(model_version), (model_version, []))[1].append(item)
+
+        failed = False
+        for model_version, items in groups.values():
+            try:
+                probabilities = self._score(model_version, np.stack([item[0] for item in items]))
+            except Exception as e:
+                for item in items:
+                    item[2].set_exception(e)
+                failed = True
+            else:
+                for item, row in zip(items, probabilities):
+                    item[2].set_result(row)
+        finished = time.perf_counter()
+
+        waits = [started - item[1] for item in batch]
+        with self._lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._errors += failed
+            for i, bound in enumerate(self._size_buckets):
+                if len(batch) <= bound:
+                    self._size_counts[i] += 1
+                    break
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._recent_waits.extend(waits)
+            self._inference_total += finished - started
+
+    def stats(self) -> dict:
+        """ Queue depth, batch-size distribution and wait times for tuning. """
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            batches, rows = self._batches, self._rows
+            histogram = {f"<={bound}": count for bound, count in zip(self._size_buckets, self._size_counts)}
+            wait_total, wait_max = self._wait_total, self._wait_max
+            inference_total, errors = self._inference_total, self._errors
+            rejected, timeouts, cancelled = self._rejected, self._timeouts, self._cancelled
+
+        def percentile(q):
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 3) if recent else 0.0
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue": self.max_queue or None,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "rows": rows,
+            "errors": errors,
+            "rejected": rejected,
+            "timeouts": timeouts,
+            "cancelled": cancelled,
+            "mean_batch_size": round(rows / batches, 3) if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "wait_ms": {
+                "mean": round(wait_total / rows * 1000, 3) if rows else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(wait_max * 1000, 3),
+            },
+            "mean_inference_ms": round(inference_total / batches * 1000, 3) if batches else 0.0,
+        }
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class PredictionCache:
+    """ Bounded LRU + TTL cache of model outputs keyed on (model version, features).
+
+    The whole cache is dropped the first time a new model version is seen, so
+    a reloaded model never serves stale results. Concurrent misses on the same
+    key are collapsed: the first caller computes, the others wait for it.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(version, features):
+        # + 0.0 folds -0.0 into 0.0 so equal vitals always share a key
+        return (version, tuple(float(value) + 0.0 for value in features))
+
+    def get_or_compute(self, version, features, compute):
+        """ Return the cached value for these features, calling compute() on a miss. """
+        key = self.make_key(version, features)
+        hit, future, owner = self._lookup(version, key)
+        if future is None:
+            return hit
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            self._fail(key, future, e)
+            raise
+        return self._store(version, key, future, value)
+
+    async def get_or_compute_async(self, version, features, compute):
+        """ Same as get_or_compute, for async callers: compute is awaited and waiting never blocks the loop. """
+        key = self.make_key(version, features)
+        hit, future, owner = self._lookup(version, key)
+        if future is None:
+            return hit
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._fail(key, future, e if isinstance(e, Exception) else RuntimeError("Computation was cancelled"))
+            raise
+        return self._store(version, key, future, value)
+
+    def _lookup(self, version, key):
+        """ (value, None, _) on a hit, else (None, future, owner); the owner must compute. """
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, None, False
+                del self._entries[key]
+                self.expirations += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = Future()
+            self._inflight[key] = future
+            self.misses += 1
+            return None, future, True
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_exception(error)
+
+    def _store(self, version, key, future, value):
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Skip storing if the model changed while we were computing
+            if version == self._version:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "model_version": self._version,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class UserCache:
+    """ Bounded token -> user snapshot cache used by get_current_user.
+
+    An entry never outlives the token it was created for (nor ttl_seconds),
+    and invalidate_user() drops every token of a user whose account changed.
+
+    A lookup that started before such an invalidation may still hold the old
+    row, so callers take generation() before reading the database and pass
+    it to put(), which skips the snapshot if the user changed in between.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; user id -> value at that user's last one
+        self._generation = 0
+        self._user_generations = {}
+        self._cleared_generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                user, expires_at = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return user
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, token: str, user, token_expires_at: float, generation: int = None):
+        expires_at = min(time.time() + self.ttl, token_expires_at)
+        with self._lock:
+            if generation is not None and (generation < self._cleared_generation
+                                           or generation < self._user_generations.get(user.id, 0)):
+                # Read before the account changed; the next request looks it up again
+                return
+            self._entries[token] = (user, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._user_generations[user_id] = self._generation
+            stale = [token for token, (user, _) in self._entries.items() if user.id == user_id]
+            for token in stale:
+                del self._entries[token]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_generation = self._generation
+            self._user_generations.clear()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "db_lookups_avoided": self.hits,
+                "db_lookups": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
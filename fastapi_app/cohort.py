@@ -0,0 +1,196 @@
+import codecs
+import csv
+import re
+
+import numpy as np
+
+# Dataset column names (model_preparation/diabetes.csv) -> DiabetesInput field names
+DEFAULT_COLUMN_MAP = {
+    "Preg": "Pregnancies",
+    "BPressure": "BloodPressure",
+}
+
+# Line breaks as text editors count them (str.splitlines also breaks on \x0c, \x1c, \u2028, ...)
+LINE_BREAK = re.compile(r"\r\n|\r|\n")
+# Longest record CsvChunker keeps waiting for, so an unterminated quote can't buffer the whole upload
+MAX_RECORD_CHARS = 1024 * 1024
+
+
+def parse_column_map(spec: str) -> dict:
+    """ Parse "Preg=Pregnancies,BP=BloodPressure" into a column map, on top of DEFAULT_COLUMN_MAP. """
+    mapping = dict(DEFAULT_COLUMN_MAP)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        column, _, field = item.partition("=")
+        if not field.strip():
+            raise ValueError(f"Column mapping {item!r} should look like Column=Field")
+        mapping[column.strip()] = field.strip()
+    return mapping
+
+
+def resolve_columns(header, features, column_map: dict, source: str = "CSV") -> list:
+    """ Index of each feature in the CSV header, after renaming columns through column_map. """
+    names = [column_map.get(name.strip(), name.strip()) for name in header]
+    missing = [feature for feature in features if feature not in names]
+    if missing:
+        raise ValueError(f"{source} is missing columns: {', '.join(missing)}")
+    return [names.index(feature) for feature in features]
+
+
+def in_quotes(text: str, quoted: bool = False) -> bool:
+    """ Whether a quoted field is still open at the end of text, read the way csv.reader does. """
+    field_start = not quoted
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quoted:
+            if char == '"':
+                if text[i + 1:i + 2] == '"':
+                    i += 1  # "" is an escaped quote
+                else:
+                    quoted = False
+        elif char == '"' and field_start:
+            quoted = True
+        field_start = char in ",\r\n" and not quoted
+        i += 1
+    return quoted
+
+
+def split_records(text: str):
+    """ (records, tail): text split at the line breaks that are not inside a quoted field.
+
+    tail is what follows the last such break: a partial record, or one whose
+    quoted field is still open.
+    """
+    if '"' not in text:
+        lines = LINE_BREAK.split(text)
+        return lines[:-1], lines[-1]
+    records, start, quoted, line_start = [], 0, False, 0
+    for match in LINE_BREAK.finditer(text):
+        line = text[line_start:match.start()]
+        if quoted or '"' in line:
+            quoted = in_quotes(line, quoted)
+        line_start = match.end()
+        if not quoted:
+            records.append(text[start:match.start()])
+            start = line_start
+    return records, text[start:]
+
+
+def parse_lines(text: str) -> list:
+    """ One CSV row per record of text; blank lines come back as empty rows, so row N is still record N.
+
+    A record is one line unless a quoted field has line breaks in it.
+    """
+    records, tail = split_records(text)
+    if tail:
+        records.append(tail)
+    return list(csv.reader(records))
+
+
+class CsvChunker:
+    """ Incremental CSV parser: feed it the body as it arrives, get complete rows back.
+
+    Only the trailing partial record is kept between calls, so memory does
+    not grow with the size of the upload. Every record yields one row, blank
+    lines included (as []), so callers can number rows like the records of
+    the file. A quoted field may have line breaks in it and be split across
+    chunks; a record longer than max_record_chars (an unterminated quote,
+    usually) raises ValueError.
+    """
+
+    def __init__(self, encoding: str = "utf-8-sig", max_record_chars: int = MAX_RECORD_CHARS):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._pending = ""
+        self.max_record_chars = max_record_chars
+
+    def feed(self, data: bytes) -> list:
+        text = self._pending + self._decoder.decode(data)
+        # A trailing \r may be the first half of \r\n, so it waits for the next chunk
+        held = "\r" if text.endswith("\r") else ""
+        records, tail = split_records(text[:len(text) - len(held)])
+        self._pending = tail + held
+        if len(self._pending) > self.max_record_chars:
+            raise ValueError(f"CSV record longer than {self.max_record_chars} characters (unterminated quote?)")
+        return list(csv.reader(records))
+
+    def close(self) -> list:
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        if not text:
+            return []
+        return parse_lines(text)
+
+
+def rows_to_matrix(rows, indices, features):
+    """ Float matrix of the selected columns plus per-row errors for rows that can't be scored.
+
+    Converts the whole chunk with one NumPy cast and only falls back to
+    row-by-row parsing when that fails. Returns (X, valid, errors) where
+    valid is a boolean mask over rows and errors maps row position -> list
+    of {"loc", "msg", "type"} dicts shaped like the /predict/batch errors.
+    """
+    X = None
+    try:
+        X = np.array([[row[i] for i in indices] for row in rows]).astype(np.float64)
+    except (IndexError, ValueError):
+        pass
+
+    errors = {}
+    if X is None:
+        X = np.zeros((len(rows), len(indices)), dtype=np.float64)
+        for position, row in enumerate(rows):
+            row_errors = []
+            for column, (index, feature) in enumerate(zip(indices, features)):
+                if index >= len(row) or not row[index].strip():
+                    row_errors.append({"loc": [feature], "msg": "Field required", "type": "missing"})
+                    continue
+                try:
+                    X[position, column] = float(row[index])
+                except ValueError:
+                    row_errors.append({"loc": [feature], "msg": "Input should be a valid number", "type": "float_parsing"})
+            if row_errors:
+                errors[position] = row_errors
+
+    valid = check_ranges(X, features, errors)
+    return X, valid, errors
+
+
+def records_to_matrix(records, features):
+    """ Float matrix of JSON records whose features are all plain non-negative numbers.
+
+    Returns (X, slow): the positions in slow have missing, non-numeric or
+    out-of-range values (their rows in X are meaningless) and need the full
+    DiabetesInput validation to get the same result and errors as before.
+    """
+    X = np.zeros((len(records), len(features)), dtype=np.float64)
+    slow = []
+    for position, record in enumerate(records):
+        try:
+            values = [record[feature] for feature in features]
+            if any(type(value) not in (int, float) for value in values):
+                raise TypeError
+            X[position] = values
+        except (KeyError, TypeError, OverflowError):
+            slow.append(position)
+    # Range checks for every row at once; anything odd goes through validation
+    bad = np.flatnonzero((~np.isfinite(X) | (X < 0)).any(axis=1)).tolist()
+    return X, sorted(set(slow).union(bad))
+
+
+def check_ranges(X, features, errors: dict):
+    """ Same rules as DiabetesInput (finite and >= 0): adds failing rows to errors, returns the valid mask. """
+    finite = np.isfinite(X)
+    bad = ~finite | (X < 0)
+    for position in np.flatnonzero(bad.any(axis=1)).tolist():
+        if position in errors:
+            continue
+        errors[position] = [
+            {"loc": [features[column]], "msg": "Input should be greater than or equal to 0", "type": "greater_than_equal"}
+            if finite[position, column] else
+            {"loc": [features[column]], "msg": "Input should be a finite number", "type": "finite_number"}
+            for column in np.flatnonzero(bad[position]).tolist()
+        ]
+
+    valid = np.ones(len(X), dtype=bool)
+    valid[list(errors)] = False
+    return valid
@@ -0,0 +1,112 @@
+"""Arrow IPC payloads for bulk scoring.
+
+The feature columns of an Arrow stream go straight into a float matrix and
+are range-checked column-wise, with no per-row objects. pyarrow is optional
+on the server: it is only imported when a client sends or asks for Arrow.
+"""
+import numpy as np
+
+from .cohort import check_ranges, resolve_columns
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class ColumnarUnavailable(Exception):
+    """ pyarrow is not installed, so Arrow payloads can't be read or written. """
+
+
+class TooManyRows(ValueError):
+    """ The stream has more rows than the caller accepts; rows is how many were read before stopping. """
+
+    def __init__(self, rows: int, max_rows: int):
+        super().__init__(f"More than {max_rows} rows")
+        self.rows = rows
+
+
+def require_pyarrow():
+    """ The pyarrow module, or ColumnarUnavailable when it isn't installed. """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ColumnarUnavailable("Arrow payloads need pyarrow on the server: pip install pyarrow")
+    return pyarrow
+
+
+def prefers_arrow(accept: str) -> bool:
+    """ True when the Accept header ranks Arrow at least as high as JSON. """
+    arrow_q = json_q = 0.0
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type == ARROW_MEDIA_TYPE:
+            arrow_q = max(arrow_q, q)
+        elif media_type in ("application/json", "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return arrow_q > 0 and arrow_q >= json_q
+
+
+def read_arrow(body: bytes, features, column_map: dict, max_rows: int = None):
+    """ Feature matrix and per-row errors from an Arrow IPC stream, like cohort.rows_to_matrix.
+
+    Columns are renamed through column_map (Preg -> Pregnancies, ...), extra
+    columns are ignored, and nulls are reported as missing fields. Raises
+    ValueError when the stream can't be read or a column isn't numeric, and
+    TooManyRows as soon as the record batches read add up to more than max_rows.
+    """
+    pa = require_pyarrow()
+    try:
+        reader = pa.ipc.open_stream(body)
+        batches, rows = [], 0
+        for batch in reader:
+            rows += batch.num_rows
+            if max_rows is not None and rows > max_rows:
+                raise TooManyRows(rows, max_rows)
+            batches.append(batch)
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ValueError(f"Could not read the Arrow stream: {e}")
+    indices = resolve_columns(table.column_names, features, column_map, source="Arrow stream")
+
+    X = np.empty((table.num_rows, len(features)), dtype=np.float64)
+    missing = np.zeros((table.num_rows, len(features)), dtype=bool)
+    for column, index in enumerate(indices):
+        values = table.column(index)
+        if not (pa.types.is_integer(values.type) or pa.types.is_floating(values.type)):
+            raise ValueError(f"Column {features[column]} should be numeric, got {values.type}")
+        if values.null_count:
+            missing[:, column] = values.is_null().to_numpy(zero_copy_only=False)
+            values = values.fill_null(0)
+        X[:, column] = values.to_numpy(zero_copy_only=False)
+
+    errors = {}
+    for position in np.flatnonzero(missing.any(axis=1)).tolist():
+        errors[position] = [
+            {"loc": [features[column]], "msg": "Field required", "type": "missing"}
+            for column in np.flatnonzero(missing[position]).tolist()
+        ]
+    check_ranges(X, features, errors)
+    return X, errors
+
+
+def write_arrow(columns: dict, metadata: dict = None) -> bytes:
+    """ One-batch Arrow IPC stream of the given {name: array or list} columns; NaN in float arrays is written as null. """
+    pa = require_pyarrow()
+    table = pa.table({
+        name: pa.array(values, from_pandas=True) if isinstance(values, np.ndarray) else values
+        for name, values in columns.items()
+    })
+    if metadata:
+        table = table.replace_schema_metadata({key: str(value) for key, value in metadata.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,56 @@
+"""Convert a pickled RandomForest into the memory-mappable .npz artifact.
+
+    python -m fastapi_app.convert_model fastapi_app/diabetes_model.pkl fastapi_app/diabetes_model.npz
+
+The artifact is checked against the pickle (bit-identical probabilities on
+the canary rows, plus the training CSV when one is given) before the command
+reports success.
+"""
+import argparse
+import csv
+import pickle
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .inference import NumpyForest
+from .registry import canary_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", type=Path, help="pickled sklearn RandomForestClassifier")
+    parser.add_argument("target", type=Path, nargs="?", help="output .npz (default: next to the pickle)")
+    parser.add_argument("--csv", type=Path, help="also compare on every row of this CSV (columns named like the model's features)")
+    args = parser.parse_args()
+    target = args.target or args.source.with_suffix(".npz")
+
+    with open(args.source, "rb") as model_file:
+        forest = pickle.load(model_file)
+    NumpyForest.from_sklearn(forest).save(target)
+
+    started = time.perf_counter()
+    engine = NumpyForest.load(target)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    X = canary_rows(engine.n_features_in_)
+    if args.csv:
+        with open(args.csv, newline="") as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader)
+            columns = [header.index(name) for name in forest.feature_names_in_]
+            rows = np.array([[float(row[i]) for i in columns] for row in reader])
+        X = np.vstack([X, rows])
+
+    identical = np.array_equal(forest.predict_proba(X), engine.predict_proba(X))
+    print(
+        f"{args.source} ({args.source.stat().st_size} bytes) -> {target} ({target.stat().st_size} bytes), "
+        f"{engine.n_estimators} trees, mmap load {load_ms:.2f}ms, {len(X)} rows {'bit-identical' if identical else 'MISMATCH'}"
+    )
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
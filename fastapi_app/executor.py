@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from .inference import NumpyForest
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBusy(Exception):
+    """ max_pending inference calls are already queued or running. """
+
+
+class InferenceTimeout(Exception):
+    """ An inference call did not finish within the per-task timeout. """
+
+
+def spawn_context():
+    """ multiprocessing context for every process pool in the app and its CLIs.
+
+    spawn, never fork: forking a process that is already running the server's
+    threads can copy a lock some other thread holds into the child. Spawned
+    workers import what they run by name, so every function a pool calls
+    (and the state it keeps per worker) must stay at the top level of its module.
+    """
+    return multiprocessing.get_context("spawn")
+
+
+# Process workers: models are loaded once per worker, keyed on version
+_worker_models = OrderedDict()
+_WORKER_MAX_MODELS = 3
+
+
+class ModelMismatch(Exception):
+    """ The file a worker was pointed at no longer hashes to the version it is meant to hold. """
+
+
+def _worker_model(version: str, path: str, engine: str, key: str = None):
+    key = key or version
+    model = _worker_models.get(key)
+    if model is None:
+        path = Path(path)
+        raw = path.read_bytes()
+        # Same content hash as the registry's version: never serve other bytes under this label
+        if hashlib.sha256(raw).hexdigest()[:len(version)] != version:
+            raise ModelMismatch(f"{path} does not hold model version {version}")
+        if path.suffix == ".npz":
+            # Memory-mapped: every worker shares the same pages
+            model = NumpyForest.load(path)
+        else:
+            model = pickle.loads(raw)
+            if engine.startswith("numpy"):
+                model = NumpyForest.from_sklearn(model)
+        _worker_models[key] = model
+        while len(_worker_models) > _WORKER_MAX_MODELS:
+            _worker_models.popitem(last=False)
+    return model
+
+
+def _worker_init(version: str, path: str, engine: str):
+    _worker_model(version, path, engine)
+
+
+def _worker_predict_proba(version: str, path: str, engine: str, X):
+    return _worker_model(version, path, engine).predict_proba(X)
+
+
+def _worker_explain(version: str, path: str, engine: str, X):
+    model = _worker_model(version, path, engine)
+    if not isinstance(model, NumpyForest):
+        # sklearn engine: keep a flattened copy next to it, built once per worker
+        model = _worker_model(version, path, "numpy", key=f"{version}:explain")
+    return model.explain(X)
+
+
+def _worker_ping(_=None) -> bool:
+    return True
+
+
+class InferenceExecutor:
+    """ Runs predict_proba off the event loop, on a pool that only does inference.
+
+    mode "shared" keeps using FastAPI's default threadpool (the old behaviour),
+    "thread" uses a dedicated thread pool, and "process" a spawn process pool
+    whose workers load the model themselves (memory-mapped for .npz artifacts)
+    so forest evaluation does not compete for the server's GIL.
+
+    In every mode at most max_pending calls may be queued or running; past
+    that callers get InferenceBusy straight away. A call holds its slot until
+    the work itself has finished, not just until its caller stopped waiting,
+    so calls that timed out or were cancelled still count while they run.
+    Calls that take longer than timeout_ms raise InferenceTimeout; in shared
+    mode the blocking predict_proba_sync runs on the calling thread (already
+    one of FastAPI's), so only the pending limit applies to it. In process
+    mode a monitor thread pings the pool every health_interval seconds and
+    replaces it if a worker died or hangs.
+    """
+
+    def __init__(self, mode: str = "shared", workers: int = 2, max_pending: int = 64, timeout_ms: float = 2000.0,
+                 health_interval: float = 5.0):
+        if mode not in ("shared", "thread", "process"):
+            raise ValueError(f"Unknown inference executor mode: {mode!r}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout_ms / 1000 if timeout_ms > 0 else None
+        self.health_interval = health_interval
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._preload = None
+        self._monitor = None
+        self._stopping = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+
+    # Pool lifecycle
+
+    def start(self, model_version=None):
+        """ Create the pool now (process mode: spawn every worker and preload model_version). """
+        if self.mode == "shared":
+            return
+        if model_version is not None:
+            self._preload = (model_version.version, str(model_version.path), model_version.engine)
+        pool = self._get_pool()
+        if self.mode == "process":
+            # Wait for every worker to be up and holding the model
+            list(pool.map(_worker_ping, range(self.workers)))
+            if self.health_interval > 0 and self._monitor is None:
+                self._stopping.clear()
+                self._monitor = threading.Thread(target=self._monitor_loop, name="inference-monitor", daemon=True)
+                self._monitor.start()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._new_pool()
+        return self._pool
+
+    def _new_pool(self):
+        if self.mode == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+        initializer, initargs = (_worker_init, self._preload) if self._preload else (None, ())
+        return ProcessPoolExecutor(
+            self.workers, mp_context=spawn_context(), initializer=initializer, initargs=initargs
+        )
+
+    def _restart(self, broken_pool, reason: str):
+        with self._pool_lock:
+            if self._pool is not broken_pool:
+                return  # someone else already replaced it
+            logger.error(f"Restarting inference workers: {reason}")
+            self._pool = self._new_pool()
+        with self._stats_lock:
+            self.restarts += 1
+        # Kill what is left of the old pool (a hung worker would otherwise keep running)
+        for process in list((getattr(broken_pool, "_processes", None) or {}).values()):
+            process.kill()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _monitor_loop(self):
+        while not self._stopping.wait(self.health_interval):
+            pool = self._pool
+            if pool is None:
+                continue
+            try:
+                pool.submit(_worker_ping).result(timeout=max(self.timeout or 0, 5.0))
+            except BrokenProcessPool:
+                self._restart(pool, "a worker process died")
+            except FutureTimeoutError:
+                self._restart(pool, "health check timed out")
+            except RuntimeError:
+                pass  # pool is shutting down
+
+    def shutdown(self):
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=5)
+            self._monitor = None
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # Scoring
+
+    @staticmethod
+    def _local(model_version, explain: bool):
+        return model_version.explainer.explain if explain else model_version.model.predict_proba
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise InferenceBusy(f"{self.max_pending} inference calls already pending")
+
+    def _release(self, _future=None):
+        self._slots.release()
+
+    def _holding_slot(self, fn):
+        """ fn wrapped to give its slot back when it returns, on whichever thread it ends up running. """
+        def run(X):
+            try:
+                return fn(X)
+            finally:
+                self._release()
+        return run
+
+    def _submit(self, pool, model_version, X, explain: bool = False):
+        """ Take a slot and submit; the slot is freed by the future's done callback, once the work has finished. """
+        self._acquire()
+        try:
+            # Raises BrokenProcessPool right away if a worker already died
+            if self.mode == "thread":
+                future = pool.submit(self._local(model_version, explain), X)
+            else:
+                future = pool.submit(
+                    _worker_explain if explain else _worker_predict_proba,
+                    model_version.version, str(model_version.path), model_version.engine, X
+                )
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _timed_out(self):
+        self._count("timeouts")
+        return InferenceTimeout(f"Inference took longer than {self.timeout * 1000:.0f}ms")
+
+    async def predict_proba(self, model_version, X, explain: bool = False):
+        """ predict_proba of model_version on X, awaited without blocking the event loop.
+
+        With explain the result is NumpyForest.explain()'s (proba, contributions, expected_value).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self.mode == "shared":
+            self._acquire()
+            task = asyncio.ensure_future(run_in_threadpool(self._holding_slot(self._local(model_version, explain)), X))
+            try:
+                # Shielded: a thread can't be stopped, so on timeout it finishes (and frees its slot) on its own
+                result = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+            except asyncio.TimeoutError:
+                raise self._timed_out()
+            except Exception:
+                self._count("errors")
+                raise
+            self._count("completed")
+            return result
+
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = self._submit(pool, model_version, X, explain)
+                # Cancelling the wrapper cancels a task that hasn't started; a running one keeps its slot until done
+                result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except BrokenProcessPool:
+                self._restart(pool, "a worker process died")
+                if attempt == 0:
+                    continue
+                self._count("errors")
+                raise
+            except asyncio.TimeoutError:
+                raise self._timed_out()
+            except InferenceBusy:
+                raise
+            except Exception:
+                self._count("errors")
+                raise
+            self._count("completed")
+            return result
+
+    def predict_proba_sync(self, model_version, X, explain: bool = False):
+        """ Blocking version for sync routes (which already run on a worker thread). """
+        X = np.asarray(X, dtype=np.float64)
+        if self.mode == "shared":
+            self._acquire()
+            try:
+                result = self._holding_slot(self._local(model_version, explain))(X)
+            except Exception:
+                self._count("errors")
+                raise
+            self._count("completed")
+            return result
+
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = self._submit(pool, model_version, X, explain)
+                result = future.result(timeout=self.timeout)
+            except BrokenProcessPool:
+                self._restart(pool, "a worker process died")
+                if attempt == 0:
+                    continue
+                self._count("errors")
+                raise
+            except FutureTimeoutError:
+                # Only stops a task that hasn't started; a running one keeps its slot until done
+                future.cancel()
+                raise self._timed_out()
+            except InferenceBusy:
+                raise
+            except Exception:
+                self._count("errors")
+                raise
+            self._count("completed")
+            return result
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        pool = self._pool
+        alive = None
+        if self.mode == "process" and pool is not None:
+            alive = sum(process.is_alive() for process in (getattr(pool, "_processes", None) or {}).values())
+        with self._stats_lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers if self.mode != "shared" else None,
+                "workers_alive": alive,
+                "max_pending": self.max_pending,
+                "pending": self.max_pending - self._slots._value,
+                "timeout_ms": self.timeout * 1000 if self.timeout else None,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "restarts": self.restarts,
+            }
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+from .metrics import upstream_chat_seconds
+
+logger = logging.getLogger(__name__)
+
+# Hugging Face API settings (override with environment variables, e.g. to point at a local stand-in)
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1")
+HF_API_KEY = os.getenv("HF_API_KEY", "Your_Hugging_face_api_acces_token")
+
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "5"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "30"))
+HF_MAX_CONNECTIONS = int(os.getenv("HF_MAX_CONNECTIONS", "20"))
+HF_MAX_CONCURRENCY = int(os.getenv("HF_MAX_CONCURRENCY", "8"))
+HF_QUEUE_TIMEOUT = float(os.getenv("HF_QUEUE_TIMEOUT", "10"))
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "3"))
+HF_BACKOFF_SECONDS = float(os.getenv("HF_BACKOFF_SECONDS", "0.5"))
+
+# Upstream answers worth retrying: rate limited or model still loading
+RETRY_STATUS_CODES = {429, 503}
+
+
+class HFClientError(Exception):
+    """ Upstream call failed; status_code is what the API route should answer with. """
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HFClient:
+    """ Async Hugging Face inference client sharing one keep-alive connection pool.
+
+    At most max_concurrency calls are in flight at once; callers wait up to
+    queue_timeout for a slot, which is given back while a retry waits.
+    429/503 answers are retried with exponential backoff, or after the
+    server's Retry-After, capped at the longest backoff (and the read timeout).
+    Other upstream failures surface as 502, timeouts as 504.
+    """
+
+    def __init__(self, api_url: str = HF_API_URL, api_key: str = HF_API_KEY,
+                 connect_timeout: float = HF_CONNECT_TIMEOUT, read_timeout: float = HF_READ_TIMEOUT,
+                 max_connections: int = HF_MAX_CONNECTIONS, max_concurrency: int = HF_MAX_CONCURRENCY,
+                 queue_timeout: float = HF_QUEUE_TIMEOUT, max_retries: int = HF_MAX_RETRIES,
+                 backoff_seconds: float = HF_BACKOFF_SECONDS, transport: httpx.AsyncBaseTransport = None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_retry_delay = min(backoff_seconds * (2 ** max_retries), read_timeout)
+        self._transport = transport
+        self._client = None
+        self._semaphore = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        delay = self.backoff_seconds * (2 ** attempt)
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                value = float(retry_after)
+            except ValueError:
+                value = math.nan
+            if math.isfinite(value):
+                delay = max(value, 0.0)
+        # The upstream doesn't get to park a caller for longer than our own backoff would
+        return min(delay, self.max_retry_delay)
+
+    @staticmethod
+    def _generated_text(body: bytes) -> str:
+        try:
+            return json.loads(body)[0]["generated_text"]
+        except (ValueError, LookupError, TypeError):
+            raise HFClientError(f"Hugging Face API returned an unexpected body: {body[:200]!r}", status_code=502)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """ Hold one of the max_concurrency upstream slots. """
+        client = self.client
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HFClientError("Too many chatbot requests in flight", status_code=503)
+        try:
+            yield client
+        finally:
+            self._semaphore.release()
+
+    async def generate(self, prompt: str) -> str:
+        """ Return the generated text for prompt. """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            text = await self._generate(prompt)
+            outcome = "ok"
+            return text
+        finally:
+            upstream_chat_seconds.observe(time.perf_counter() - started, "generate", outcome)
+
+    async def _generate(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            async with self._slot() as client:
+                try:
+                    response = await client.post(self.api_url, json={"inputs": prompt})
+                except httpx.TimeoutException as e:
+                    raise HFClientError(f"Hugging Face API timed out: {e!r}", status_code=504)
+                except httpx.HTTPError as e:
+                    raise HFClientError(f"Hugging Face API unreachable: {e!r}", status_code=502)
+
+            if response.status_code == 200:
+                return self._generated_text(response.content)
+            await self._before_retry(response, attempt)
+
+    async def stream(self, prompt: str):
+        """ Yield generated text chunks for prompt as the API produces them.
+
+        Asks for server-sent events ("stream": true). If the API answers with
+        a plain JSON body instead, the whole generated text is yielded at once.
+        Retries only happen before the first chunk has been yielded.
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async for chunk in self._stream(prompt):
+                yield chunk
+            outcome = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client went away mid-stream
+            outcome = "cancelled"
+            raise
+        finally:
+            upstream_chat_seconds.observe(time.perf_counter() - started, "stream", outcome)
+
+    async def _stream(self, prompt: str):
+        for attempt in range(self.max_retries + 1):
+            async with self._slot() as client:
+                try:
+                    async with client.stream("POST", self.api_url, json={"inputs": prompt, "stream": True}) as response:
+                        if response.status_code == 200:
+                            if "text/event-stream" in response.headers.get("content-type", ""):
+                                async for chunk in self._iter_events(response):
+                                    yield chunk
+                            else:
+                                yield self._generated_text(await response.aread())
+                            return
+                        await response.aread()
+                except httpx.TimeoutException as e:
+                    raise HFClientError(f"Hugging Face API timed out: {e!r}", status_code=504)
+                except httpx.HTTPError as e:
+                    raise HFClientError(f"Hugging Face API unreachable: {e!r}", status_code=502)
+            await self._before_retry(response, attempt)
+
+    async def _before_retry(self, response: httpx.Response, attempt: int):
+        """ Wait out a retryable answer, or raise for a final one. Called without a slot held. """
+        if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+            delay = self._retry_delay(response, attempt)
+            logger.warning(f"Hugging Face API returned {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            return
+        raise HFClientError(f"Hugging Face API Error {response.status_code}: {response.text}", status_code=502)
+
+    @staticmethod
+    async def _iter_events(response: httpx.Response):
+        # Text-generation-inference events: data:{"token": {"text": ..., "special": ...}, ...}
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if not data or data == "[DONE]":
+                continue
+            event = json.loads(data)
+            if "error" in event:
+                raise HFClientError(f"Hugging Face API Error: {event['error']}", status_code=502)
+            token = event.get("token") or {}
+            if token.get("text") and not token.get("special"):
+                yield token["text"]
@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models.prediction import Prediction
+
+logger = logging.getLogger(__name__)
+
+# DiabetesInput field -> Prediction column
+FEATURE_COLUMNS = {
+    "Pregnancies": "pregnancies",
+    "Glucose": "glucose",
+    "BloodPressure": "blood_pressure",
+    "Insulin": "insulin",
+    "BMI": "bmi",
+    "DiabetesPedigreeFunction": "diabetes_pedigree_function",
+    "Age": "age",
+}
+
+
+def utcnow() -> datetime:
+    # Stored naive, SQLite has no time zones
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PredictionWriter:
+    """ Write-behind queue for the predictions table.
+
+    record() only appends a row to an in-memory queue, so /predict never
+    waits for a commit. A background thread writes the queue out in one bulk
+    INSERT once max_batch_size rows are waiting or flush_interval_ms has
+    passed since the oldest one. close() flushes whatever is still queued,
+    so a graceful shutdown loses nothing. If the queue is full (the database
+    can't keep up) new rows are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, session_factory, max_batch_size: int = 200, flush_interval_ms: float = 500.0,
+                 max_queue_size: int = 10000):
+        self._session_factory = session_factory
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000
+        self._queue = queue.Queue(max_queue_size)
+        self._stopping = False
+
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self._flush_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, user_id: int, features: dict, prediction: str, probability: float, model_version: str):
+        """ Queue one scored record; features are keyed like DiabetesInput. """
+        row = {column: float(features[field]) for field, column in FEATURE_COLUMNS.items()}
+        row.update(
+            user_id=user_id,
+            prediction=prediction,
+            probability=float(probability),
+            model_version=model_version,
+            created_at=utcnow(),
+        )
+        if self._stopping:
+            logger.warning("Prediction writer is closed, dropping row")
+            self._count("dropped")
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            logger.warning("Prediction history queue is full, dropping row")
+            self._count("dropped")
+
+    def close(self, timeout: float = 30.0):
+        """ Stop accepting rows and write out everything still queued. """
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Prediction writer did not finish within {timeout}s, {self._queue.qsize()} rows left")
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Closing: write what we have, the loop drains the rest afterwards
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            elif self._stopping:
+                break
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            with self._session_factory() as db:
+                db.execute(insert(Prediction), batch)
+                db.commit()
+            written = len(batch)
+        except SQLAlchemyError as e:
+            # One bad row (e.g. its user was deleted meanwhile) must not sink the batch
+            logger.warning(f"Bulk insert of {len(batch)} predictions failed, retrying row by row: {e}")
+            written = self._flush_rows(batch)
+        with self._lock:
+            self.flushes += 1
+            self.written += written
+            self.failed += len(batch) - written
+            self._flush_total += time.perf_counter() - started
+
+    def _flush_rows(self, batch) -> int:
+        written = 0
+        with self._session_factory() as db:
+            for row in batch:
+                try:
+                    db.execute(insert(Prediction), [row])
+                    db.commit()
+                    written += 1
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    logger.error(f"Could not store prediction for user {row['user_id']}: {e}")
+        return written
+
+    def stats(self) -> dict:
+        with self._lock:
+            flushes = self.flushes
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "flush_interval_ms": self.flush_interval * 1000,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": flushes,
+                "mean_rows_per_flush": round(self.written / flushes, 3) if flushes else 0.0,
+                "mean_flush_ms": round(self._flush_total / flushes * 1000, 3) if flushes else 0.0,
+            }
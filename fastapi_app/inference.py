@@ -0,0 +1,255 @@
+import os
+import zipfile
+
+import numpy as np
+
+# Bumped whenever the layout of the .npz artifact changes
+ARTIFACT_FORMAT = 1
+
+
+class NumpyForest:
+    """ Fitted RandomForestClassifier flattened into NumPy node arrays.
+
+    Every tree is stored back to back in the same arrays, so one pass over the
+    depth of the forest scores all trees for 1 or N rows at once. Probabilities
+    are bit-identical to sklearn's predict_proba.
+
+    save() writes the arrays to an uncompressed .npz and load() memory-maps
+    them back, so worker processes share one copy of the model pages and
+    never unpickle (or import sklearn).
+
+    explain() returns per-feature contributions along with the probabilities
+    (the decision-path decomposition: each split's change in class fractions
+    is credited to the feature it splits on). Every node's contributions from
+    its root are summed up once by prepare_explanations(), so explaining a row
+    costs the same traversal as scoring it plus one lookup per tree.
+    """
+
+    def __init__(self, feature, threshold, left, right, missing_go_to_left, value, roots, max_depth, classes, n_features,
+                 children=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # Interleaved [left, right] pairs so a branch is a single take()
+        self.children = children if children is not None else np.stack([left, right], axis=1).ravel()
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.path_contributions = None
+        self.expected_value = None
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """ Build the flat arrays from a fitted sklearn RandomForestClassifier. """
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point at themselves so every row can take the same number of steps
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            missing.append(np.asarray(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count)), dtype=bool))
+            # sklearn stores per-leaf class fractions, which is exactly what predict_proba returns
+            values.append(tree.value[:, 0, :forest.n_classes_])
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            missing_go_to_left=np.concatenate(missing),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(forest.classes_),
+            n_features=forest.n_features_in_,
+        )
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """ Return the leaf node reached in every tree, shape (n_rows, n_trees). """
+        # sklearn compares float32 inputs against float64 thresholds, so do the same
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        has_nan = bool(np.isnan(flat_X).any())
+
+        # One flat (row, tree) cursor per pair, all advanced together one level per step
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_estimators)
+        nodes = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            values = flat_X.take(row_offsets + self.feature.take(nodes))
+            go_left = values <= self.threshold.take(nodes)
+            if has_nan:
+                go_left |= np.isnan(values) & self.missing_go_to_left.take(nodes)
+            nodes = self.children.take(2 * nodes + ~go_left)
+        return nodes.reshape(n_rows, self.n_estimators)
+
+    def predict_proba(self, X):
+        return self._proba(self.apply(X))
+
+    def _proba(self, leaves):
+        # cumsum adds tree by tree in estimator order, matching sklearn's accumulation exactly
+        proba = np.cumsum(self.value[leaves], axis=1)[:, -1, :]
+        proba /= self.n_estimators
+        return proba
+
+    def prepare_explanations(self):
+        """ Sum the contribution deltas from each root down to every node, level by level. Runs once per model. """
+        if self.path_contributions is not None:
+            return
+        n_classes = self.value.shape[1]
+        contributions = np.zeros((len(self.feature), self.n_features_in_, n_classes), dtype=np.float64)
+        nodes = np.asarray(self.roots)
+        while len(nodes):
+            nodes = nodes[self.left.take(nodes) != nodes]  # leaves point at themselves
+            feature = self.feature.take(nodes)
+            children = []
+            for child in (self.left.take(nodes), self.right.take(nodes)):
+                # A tree has no shared children, so the (child, feature) pairs are unique
+                contributions[child] = contributions[nodes]
+                contributions[child, feature] += self.value[child] - self.value[nodes]
+                children.append(child)
+            nodes = np.concatenate(children)
+        self.path_contributions = contributions
+        self.expected_value = self.value[self.roots].mean(axis=0)
+
+    def explain(self, X):
+        """ Return (proba, contributions, expected_value) for X.
+
+        contributions has shape (n_rows, n_features, n_classes); for every row
+        expected_value + contributions.sum(axis=1) equals proba (up to float
+        rounding).
+        """
+        self.prepare_explanations()
+        leaves = self.apply(X)
+        contributions = self.path_contributions[leaves].sum(axis=1)
+        contributions /= self.n_estimators
+        return self._proba(leaves), contributions, self.expected_value
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def save(self, path):
+        """ Write the forest as an uncompressed .npz that load() can memory-map. """
+        arrays = {
+            "format": np.int64(ARTIFACT_FORMAT),
+            "feature": self.feature.astype(np.int64),
+            "threshold": self.threshold.astype(np.float64),
+            # left/right are views into children after loading, no need to store them twice
+            "children": self.children.astype(np.int64),
+            "missing_go_to_left": self.missing_go_to_left.astype(bool),
+            "value": np.ascontiguousarray(self.value, dtype=np.float64),
+            "roots": self.roots.astype(np.int64),
+            "max_depth": np.int64(self.max_depth),
+            "classes": np.asarray(self.classes_),
+            "n_features": np.int64(self.n_features_in_),
+        }
+        # Write next to the target and rename, so a worker never maps a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as artifact:
+            np.savez(artifact, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True):
+        """ Open an artifact written by save(); with mmap the arrays stay backed by the file. """
+        arrays = _mmap_npz(path) if mmap else dict(np.load(path, allow_pickle=False))
+        if int(arrays["format"]) != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported model artifact format {int(arrays['format'])}")
+        children = arrays["children"]
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=children[0::2],
+            right=children[1::2],
+            missing_go_to_left=arrays["missing_go_to_left"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=int(arrays["max_depth"]),
+            classes=np.array(arrays["classes"]),
+            n_features=int(arrays["n_features"]),
+            children=children,
+        )
+
+
+def _mmap_npz(path) -> dict:
+    """ np.load ignores mmap_mode for .npz, so map every stored member at its offset in the zip. """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as raw:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed and can't be memory-mapped")
+            # Local file header: 30 fixed bytes, then the file name and extra field
+            raw.seek(info.header_offset)
+            header = raw.read(30)
+            name_length = int.from_bytes(header[26:28], "little")
+            extra_length = int.from_bytes(header[28:30], "little")
+            raw.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(raw)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(raw)
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename} holds Python objects")
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if not shape or 0 in shape:
+                # 0-d / empty arrays: np.memmap can't map zero bytes, and they are tiny anyway
+                arrays[name] = np.fromfile(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode="r", shape=shape, order="F" if fortran_order else "C", offset=raw.tell()
+                )
+    return arrays
+
+
+def check_against_sklearn(forest, engine, X):
+    """ Return True if the engine reproduces sklearn's probabilities bit for bit on X. """
+    expected = forest.predict_proba(np.asarray(X, dtype=np.float64))
+    return np.array_equal(expected, engine.predict_proba(X))
+
+
+if __name__ == "__main__":
+    # Bit-identity check against the training data:
+    #   python -m fastapi_app.inference model_preparation/diabetes.csv
+    import csv
+    import pickle
+    import sys
+    from pathlib import Path
+
+    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parent.parent / "model_preparation" / "diabetes.csv"
+    model_path = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(__file__).resolve().parent / "diabetes_model.pkl"
+
+    with open(model_path, "rb") as model_file:
+        forest = pickle.load(model_file)
+    engine = NumpyForest.from_sklearn(forest)
+
+    with open(csv_path, newline="") as csv_file:
+        reader = csv.DictReader(csv_file)
+        X = np.array([[float(row[name]) for name in forest.feature_names_in_] for row in reader])
+
+    identical = check_against_sklearn(forest, engine, X)
+    print(f"{len(X)} rows, {engine.n_estimators} trees: {'bit-identical' if identical else 'MISMATCH'}")
+    sys.exit(0 if identical else 1)
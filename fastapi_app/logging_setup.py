@@ -0,0 +1,222 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Log output settings
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" or "text"
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Fraction of sub-WARNING records kept per logger, e.g. "fastapi_app.access=0.1"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Logger for the one-line-per-request access records
+access_logger = logging.getLogger("fastapi_app.access")
+
+request_id_var = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "taskName"}
+
+_listener = None
+_queue_handler = None
+
+
+def parse_sample_rates(spec: str, skipped: list = None) -> dict:
+    """ Parse "logger.name=0.1,other=0.5" into {logger name: keep rate}.
+
+    Entries that aren't name=number are left out and appended to skipped, so
+    a typo in LOG_SAMPLE_RATES is reported instead of stopping startup.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        try:
+            if not name.strip():
+                raise ValueError
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            if skipped is not None:
+                skipped.append(item)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    """ Stamp records with the id of the request being handled (or None). """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """ Keep only a fraction of a logger's DEBUG/INFO records; warnings and errors always pass.
+
+    A rate set for "a.b" also covers "a.b.c" unless that has its own rate.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line: time, level, logger, message, request_id plus any extra= fields. """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message on the calling thread (args may change later), but leave
+        # formatting and extras to the listener instead of flattening them into msg.
+        # Works on a copy, like QueueHandler.prepare: other handlers still get the record as logged.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_formatter():
+    if LOG_FORMAT == "text":
+        return logging.Formatter(
+            "%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+        )
+    return JsonFormatter()
+
+
+def setup_logging():
+    """ Route every log record through a queue to a background thread that writes the log file.
+
+    Request handlers only pay for building the record and a queue put; JSON
+    formatting, file writes and size-based rotation happen on the listener
+    thread. Safe to call more than once, only the first call (after a
+    shutdown_logging) does anything.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(_file_formatter())
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _PreparedQueueHandler(log_queue)
+    skipped = []
+    _queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES, skipped)))
+    _queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    if skipped:
+        logging.getLogger(__name__).warning(f"LOG_SAMPLE_RATES: ignored {skipped}, expected logger.name=rate entries")
+
+
+def shutdown_logging():
+    """ Write out everything still queued and close the log file. """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+
+class RequestLoggingMiddleware:
+    """ Give every request an id and write one access record with its timing.
+
+    The id comes from the X-Request-ID header when the client sends one and
+    is echoed back in the response. Every record logged while handling the
+    request carries it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            access_logger.info("request", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+            request_id_var.reset(token)
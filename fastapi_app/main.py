@@ -1,29 +1,145 @@
+import time
+
+# Startup is timed from here to the end of the lifespan start (see /health/ready)
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+import os
+import signal
+import threading
 from fastapi import FastAPI, status
-import uvicorn
-from .routes import diabetes, auth, users
-from .database import engine, Base
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from .logging_setup import setup_logging, shutdown_logging, RequestLoggingMiddleware
+from .metrics import MetricsMiddleware
+from .ratelimit import LoadSheddingMiddleware
+from .routes import diabetes, auth, users, predictions, admin, health, ratelimit
+from .routes.health import lifecycle
+from .database import async_engine, Base
+from .utils import password_hasher
+
+logger = logging.getLogger(__name__)
+
+# Import + lifespan start above this logs a warning
+STARTUP_TARGET_MS = float(os.getenv("STARTUP_TARGET_MS", "5000"))
+# How long /health/ready answers 503 after SIGTERM before uvicorn stops accepting connections,
+# long enough for the load balancer to notice (in-flight requests are then bounded by --timeout-graceful-shutdown)
+SHUTDOWN_DRAIN_DELAY = float(os.getenv("SHUTDOWN_DRAIN_DELAY", "5"))
+
+lifecycle.started_at = IMPORT_STARTED
+
+
+async def timed_step(name: str, fn, *args):
+    """ Run a blocking startup step off the event loop and record how long it took. """
+    started = time.perf_counter()
+    result = await run_in_threadpool(fn, *args)
+    lifecycle.step_done(name, started)
+    return result
+
+
+def drain_on_sigterm(delay: float):
+    """ On SIGTERM, turn readiness 503 and only pass the signal on to uvicorn delay seconds later.
+
+    uvicorn closes its sockets as soon as it sees the signal and runs the lifespan shutdown after the
+    last connection, when nobody can ask /health/ready any more, so the drain has to start here while
+    it still serves. A second SIGTERM stops at once. Returns a function that puts uvicorn's handler back.
+    Signal handlers can only be set from the main thread; elsewhere (e.g. the TestClient) this does nothing.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def stop(signum, frame):
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signal.SIGTERM, previous)
+            signal.raise_signal(signum)
+
+    def handle(signum, frame):
+        if lifecycle.draining:
+            stop(signum, frame)
+            return
+        lifecycle.draining = True
+        logger.info(f"SIGTERM: readiness is 503, stopping in {delay:g} s")
+        loop.call_soon_threadsafe(loop.call_later, delay, stop, signum, None)
+
+    signal.signal(signal.SIGTERM, handle)
+    return lambda: signal.signal(signal.SIGTERM, previous)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import: logging, tables, model and worker pools all start here
+    setup_logging()
+    lifecycle.begin()
+    started = time.perf_counter()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    lifecycle.step_done("database", started)
+
+    # Independent, so they overlap: loading the model and spawning the bcrypt workers
+    await asyncio.gather(
+        timed_step("model", diabetes.load_active_model),
+        timed_step("bcrypt_workers", password_hasher.warm_up),
+    )
+    # Inference pool with the active model preloaded in every worker
+    await timed_step("inference_workers", diabetes.inference_executor.start, diabetes.registry.active)
+    diabetes.start_workers()
+    await timed_step("warm_up", diabetes.warm_up)
+
+    lifecycle.mark_ready()
+    log = logger.warning if lifecycle.startup_ms > STARTUP_TARGET_MS else logger.info
+    log(f"Startup took {lifecycle.startup_ms} ms (target {STARTUP_TARGET_MS:.0f} ms)", extra={"steps_ms": lifecycle.steps})
+    restore_sigterm = drain_on_sigterm(SHUTDOWN_DRAIN_DELAY)
+    yield
+
+    # uvicorn has stopped accepting and finished (or given up on) the open connections by now
+    restore_sigterm()
+    lifecycle.draining = True
+    # Write out queued batches and prediction history before the pools and engines go away
+    await run_in_threadpool(diabetes.stop_workers)
+    diabetes.inference_executor.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    # Close the pooled Hugging Face connections on shutdown
+    await diabetes.hf_client.aclose()
+    # Last, so everything logged during shutdown still reaches the file
+    shutdown_logging()
 
 
 app = FastAPI(
     title="Diabetes Prediction API",
     description="A FastAPI-powered Machine Learning API for Diabetes Prediction",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-
-# Create tables in the database
-Base.metadata.create_all(bind=engine)
+# Turn requests away with 503 once MAX_IN_FLIGHT are being handled (innermost, so they are still logged and counted)
+app.add_middleware(LoadSheddingMiddleware)
+# Request ids and one timed access record per request
+app.add_middleware(RequestLoggingMiddleware)
+# Request counts and latency histograms per route, served at /metrics
+app.add_middleware(MetricsMiddleware)
 
 
 # Registering our Diabetes router
 app.include_router(diabetes.router, tags=["Diabetes Prediction"])
 app.include_router(auth.router, tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
+app.include_router(predictions.router, tags=["Prediction History"])
+app.include_router(admin.router, prefix="/admin/models", tags=["Model Admin"])
+app.include_router(health.router, tags=["Health"])
+app.include_router(ratelimit.router, tags=["Rate Limits"])
 
 
 @app.get("/", status_code=status.HTTP_200_OK)
 def home():
     return {"message": "Diabetes Prediction API is running!"}
 
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
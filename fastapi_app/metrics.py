@@ -0,0 +1,212 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Default latency buckets in seconds (0.5 ms .. 30 s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Sharded:
+    """ Per-thread storage so the hot path never takes a lock.
+
+    Each thread that records a value gets its own shard (a dict keyed on the
+    label values); exposition sums the shards. A lock is only taken the
+    first time a thread records anything.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshot(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        # list() copies so a thread adding a new label set meanwhile can't break iteration
+        return [list(shard.items()) for shard in shards]
+
+    def _labels(self, labelvalues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter(_Sharded):
+    def inc(self, *labelvalues, amount: float = 1.0):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0.0) + amount
+
+    def render(self) -> list:
+        totals = {}
+        for items in self._snapshot():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0.0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(totals.items()):
+            lines.append(f"{self.name}{self._labels(labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(_Sharded):
+    # inc and dec may land in different shards, the sum is still the current value
+    def inc(self, *labelvalues, amount: float = 1.0):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def value(self, *labelvalues) -> float:
+        return sum(dict(items).get(labelvalues, 0.0) for items in self._snapshot())
+
+    def render(self) -> list:
+        totals = {}
+        for items in self._snapshot():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0.0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(totals.items()):
+            lines.append(f"{self.name}{self._labels(labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        shard = self._shard()
+        series = shard.get(labelvalues)
+        if series is None:
+            # One count per bucket, one for +Inf, then the running sum
+            series = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self) -> list:
+        totals = {}
+        for items in self._snapshot():
+            for labels, series in items:
+                total = totals.setdefault(labels, [0] * len(series))
+                for i, value in enumerate(list(series)):
+                    total[i] += value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled."))
+model_inference_seconds = registry.register(Histogram(
+    "model_inference_seconds", "Time spent in predict_proba.", ("endpoint",)))
+model_predictions_total = registry.register(Counter(
+    "model_predictions_total", "Scored records by model version and predicted label.", ("version", "prediction")))
+auth_user_lookup_seconds = registry.register(Histogram(
+    "auth_user_lookup_seconds", "JWT decode plus user lookup in get_current_user.", ("cache",)))
+bcrypt_seconds = registry.register(Histogram(
+    "bcrypt_seconds", "Password hash/verify time including the wait for a bcrypt worker.", ("operation",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+upstream_chat_seconds = registry.register(Histogram(
+    "upstream_chat_seconds", "Hugging Face API call latency (whole stream for streamed calls).", ("mode", "outcome")))
+rate_limited_total = registry.register(Counter(
+    "rate_limited_total", "Requests rejected with 429 by a per-identity token bucket.", ("budget",)))
+load_shed_total = registry.register(Counter(
+    "load_shed_total", "Requests rejected with 503 because MAX_IN_FLIGHT requests were already in flight."))
+
+
+class MetricsMiddleware:
+    """ Count and time every HTTP request, labelled with the matched route template.
+
+    Requests that match no route share one "unmatched" label, so random paths
+    can't blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+        http_requests_in_progress.inc()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration_seconds.observe(time.perf_counter() - started, method, path)
+            http_requests_total.inc(method, path, str(status_code))
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String
+from ..database import Base  # Import SQLAlchemy Base
+
+# SQLAlchemy Prediction Model (one row per scored /predict or /predict/batch record)
+class Prediction(Base):
+    __tablename__ = "predictions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    pregnancies = Column(Float, nullable=False)
+    glucose = Column(Float, nullable=False)
+    blood_pressure = Column(Float, nullable=False)
+    insulin = Column(Float, nullable=False)
+    bmi = Column(Float, nullable=False)
+    diabetes_pedigree_function = Column(Float, nullable=False)
+    age = Column(Float, nullable=False)
+    prediction = Column(String, nullable=False)
+    probability = Column(Float, nullable=False)
+    model_version = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    # Serves GET /predictions: one user's rows, newest first
+    __table_args__ = (
+        Index("ix_predictions_user_id_created_at", "user_id", "created_at"),
+    )
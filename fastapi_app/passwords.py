@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from .executor import spawn_context
+
+# bcrypt cost factor for new hashes; existing hashes with another cost are upgraded at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes for bcrypt (0 = hash on the calling thread)
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hash/verify calls allowed to queue for a worker before callers get a 503
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(max(1, BCRYPT_WORKERS) * 8)))
+
+
+class PasswordPoolBusy(Exception):
+    """ Too many hash/verify calls are already waiting for a worker. """
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Run inside the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return _context(BCRYPT_ROUNDS).verify(plain_password, hashed_password)
+
+
+def _ready(rounds: int) -> bool:
+    _context(rounds)
+    return True
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """ Cost factor of a bcrypt hash ("$2b$12$..." -> 12). """
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return -1
+
+
+class PasswordHasher:
+    """ bcrypt hashing/verification on a dedicated, size-limited process pool.
+
+    Keeps CPU-heavy bcrypt off the request threadpool, the event loop and the
+    GIL. Once max_pending calls are queued or running, new calls fail fast
+    with PasswordPoolBusy instead of piling up. A call keeps its slot until
+    its hash is done, even when the request awaiting it was cancelled.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=spawn_context())
+        return self._pool
+
+    async def _run_async(self, fn, *args):
+        if self.workers <= 0:
+            return await run_in_threadpool(fn, *args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy(f"{self.max_pending} password operations already pending")
+        try:
+            future = self.pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Freed when the worker is done, not when the caller stops waiting: cancelling the request only
+        # drops a hash that hasn't been handed to a worker yet, one already there still occupies it
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def pending(self) -> int:
+        """ Hash/verify calls queued or running in the pool. """
+        return self.max_pending - self._slots._value
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(_hash, password, self.rounds)
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run_async(_verify, plain_password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return hash_rounds(hashed_password) != self.rounds
+
+    def warm_up(self):
+        """ Start every worker process now instead of on the first login. """
+        if self.workers > 0:
+            list(self.pool.map(_ready, [self.rounds] * self.workers))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
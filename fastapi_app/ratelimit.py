@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from .metrics import load_shed_total, rate_limited_total
+from .schemas.user import UserResponse
+from .utils import get_current_user
+
+# Per-identity token buckets: RATE requests per second on average, bursts of up to BURST
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+# Cheap routes, per user, counted in records scored: /predict is one, /predict/batch and /predict/csv one per row
+RATE_LIMIT_PREDICT_RATE = float(os.getenv("RATE_LIMIT_PREDICT_RATE", "20"))
+RATE_LIMIT_PREDICT_BURST = float(os.getenv("RATE_LIMIT_PREDICT_BURST", "40"))
+# Expensive routes: /chat and /chat/stream, per user
+RATE_LIMIT_EXPENSIVE_RATE = float(os.getenv("RATE_LIMIT_EXPENSIVE_RATE", "1"))
+RATE_LIMIT_EXPENSIVE_BURST = float(os.getenv("RATE_LIMIT_EXPENSIVE_BURST", "10"))
+# /login, per submitted username and client address (password guessing, not the users behind one proxy)
+RATE_LIMIT_LOGIN_RATE = float(os.getenv("RATE_LIMIT_LOGIN_RATE", "0.2"))
+RATE_LIMIT_LOGIN_BURST = float(os.getenv("RATE_LIMIT_LOGIN_BURST", "10"))
+# /register, per client address
+RATE_LIMIT_REGISTER_RATE = float(os.getenv("RATE_LIMIT_REGISTER_RATE", "0.5"))
+RATE_LIMIT_REGISTER_BURST = float(os.getenv("RATE_LIMIT_REGISTER_BURST", "20"))
+# Proxies in front of the app that append to X-Forwarded-For; 0 uses the socket address
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+# Identities tracked at once; the least recently seen are forgotten first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests in flight above which new ones get 503 straight away (0 turns it off)
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "256"))
+
+
+class TokenBucketLimiter:
+    """ One token bucket per key, refilled lazily from the time of its last request.
+
+    acquire() is a dict lookup and some arithmetic under one lock, so checking
+    a request costs about a microsecond. Only the max_keys most recently seen
+    keys are kept; a forgotten key starts again with a full bucket, which is
+    what it would have refilled to anyway once it had been idle that long.
+    A cost above burst could never be paid in one go: it is allowed from a
+    full bucket and leaves it in debt, which later requests wait out.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int = 100000):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Rate limit {name!r} needs rate > 0 and burst >= 1")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max(1, max_keys)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key, cost: float = 1.0) -> float:
+        """ Take cost tokens from key's bucket: 0.0 when allowed, else the seconds until it could be. """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            needed = min(cost, self.burst)
+            if bucket[0] >= needed:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (needed - bucket[0]) / self.rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "keys": len(self._buckets),
+                    "allowed": self.allowed, "limited": self.limited}
+
+
+predict_limiter = TokenBucketLimiter("predict", RATE_LIMIT_PREDICT_RATE, RATE_LIMIT_PREDICT_BURST, RATE_LIMIT_MAX_KEYS)
+expensive_limiter = TokenBucketLimiter("expensive", RATE_LIMIT_EXPENSIVE_RATE, RATE_LIMIT_EXPENSIVE_BURST, RATE_LIMIT_MAX_KEYS)
+login_limiter = TokenBucketLimiter("login", RATE_LIMIT_LOGIN_RATE, RATE_LIMIT_LOGIN_BURST, RATE_LIMIT_MAX_KEYS)
+register_limiter = TokenBucketLimiter("register", RATE_LIMIT_REGISTER_RATE, RATE_LIMIT_REGISTER_BURST, RATE_LIMIT_MAX_KEYS)
+
+
+def client_address(request: Request, trusted_proxies: int = None) -> str:
+    """ Address of the client, read from X-Forwarded-For when the app runs behind trusted_proxies proxies.
+
+    Each proxy appends the address it received the request from, so the
+    entry trusted_proxies from the right is the last one a proxy we trust
+    wrote; anything left of it came from the client and could be forged.
+    """
+    trusted_proxies = RATE_LIMIT_TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    if trusted_proxies > 0:
+        forwarded = [part.strip() for part in ",".join(request.headers.getlist("x-forwarded-for")).split(",")]
+        forwarded = [part for part in forwarded if part]
+        if forwarded:
+            return forwarded[-min(trusted_proxies, len(forwarded))]
+    return request.client.host if request.client else ""
+
+
+def _check(limiter: TokenBucketLimiter, key, cost: float = 1.0, detail: str = "Too many requests, please slow down."):
+    if not RATE_LIMIT_ENABLED:
+        return
+    wait = limiter.acquire(key, cost)
+    if wait:
+        rate_limited_total.inc(limiter.name)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+def charge_rows(user: UserResponse, rows: int, detail: str = "Too many records, please slow down."):
+    """ Take rows from user's /predict budget; the bulk routes call this once they know how many they score. """
+    if rows > 0:
+        _check(predict_limiter, user.id, rows, detail)
+
+
+# Route dependencies. get_current_user is cached per request, so the route's own Depends reuses the same user.
+async def limit_predict(user: UserResponse = Depends(get_current_user)):
+    _check(predict_limiter, user.id)
+
+
+async def limit_chat(user: UserResponse = Depends(get_current_user)):
+    _check(expensive_limiter, ("user", user.id))
+
+
+async def limit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Nobody is authenticated yet; the route's own Depends() reuses this parsed form
+    _check(login_limiter, (form_data.username.lower(), client_address(request)))
+
+
+async def limit_register(request: Request):
+    _check(register_limiter, client_address(request))
+
+
+class LoadSheddingMiddleware:
+    """ Answer 503 with Retry-After as soon as max_in_flight requests are already being handled.
+
+    Past that point extra requests only queue up and make every response
+    slower, so they are turned away before any work is done for them.
+    Health probes and /metrics are never shed.
+    """
+
+    EXEMPT_PREFIXES = ("/health", "/metrics")
+    BODY = json.dumps({"detail": "Server is overloaded, please retry shortly."}).encode()
+
+    def __init__(self, app, max_in_flight: int = MAX_IN_FLIGHT):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        # Only touched from the event loop, so a plain int is enough
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_in_flight <= 0 or scope["path"].startswith(self.EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        if self.in_flight >= self.max_in_flight:
+            load_shed_total.inc()
+            await send({
+                "type": "http.response.start",
+                "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1"),
+                            (b"content-length", str(len(self.BODY)).encode())],
+            })
+            await send({"type": "http.response.body", "body": self.BODY})
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,309 @@
+import hashlib
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .inference import NumpyForest, check_against_sklearn
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoadError(Exception):
+    """ Artifact could not be loaded or failed canary validation. """
+
+
+def artifact_version(raw: bytes) -> str:
+    """ Content hash of an artifact, used as its version (and to version cached predictions). """
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+
+class ModelVersion:
+    """ One loaded artifact: the scoring object plus where it came from.
+
+    path is the registry's own copy of the artifact, named after its version,
+    so whatever later happens to source (the file it was loaded from) the
+    version always reloads the same bytes. explainer is the NumpyForest that
+    computes feature contributions (the model itself on the numpy engines),
+    or None when the model can't be flattened.
+    """
+    __slots__ = ("name", "version", "path", "source", "model", "engine", "loaded_at", "canary", "explainer")
+
+    def __init__(self, name, version, path, model, engine, canary, explainer=None, source=None):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.source = source if source is not None else path
+        self.model = model
+        self.engine = engine
+        self.loaded_at = time.time()
+        self.canary = canary
+        self.explainer = explainer
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": str(self.source),
+            "artifact": str(self.path),
+            "engine": self.engine,
+            "loaded_at": self.loaded_at,
+            "canary": self.canary,
+        }
+
+
+def canary_rows(n_features: int, size: int = 64) -> np.ndarray:
+    # Fixed seed, so every candidate is judged on the same rows
+    return np.random.default_rng(0).uniform(0, 200, size=(size, n_features))
+
+
+class ModelRegistry:
+    """ Loaded model versions, the active one, and an optional weighted traffic split.
+
+    load() copies an artifact into store_dir under its version, then
+    unpickles and validates it without touching what is being served
+    (load_in_background() does the same on its own thread). activate() then
+    swaps the active version with a single reference assignment, so requests
+    that already picked a version finish on it while new requests get the
+    new one. Every activation is remembered for rollback().
+    """
+
+    def __init__(self, inference_engine: str = "numpy", max_versions: int = 5, min_agreement: float = 0.0,
+                 store_dir="model_versions", max_jobs: int = 20):
+        self.inference_engine = inference_engine
+        self.max_versions = max(1, max_versions)
+        self.min_agreement = min_agreement
+        self.store_dir = Path(store_dir)
+        self.max_jobs = max(1, max_jobs)
+        self._versions = {}
+        self._active = None
+        self._history = []
+        self._split = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> ModelVersion:
+        return self._active
+
+    def get(self, version: str) -> ModelVersion:
+        model_version = self._versions.get(version)
+        if model_version is None:
+            raise KeyError(version)
+        return model_version
+
+    def load(self, path, name: str = None, activate: bool = False) -> ModelVersion:
+        """ Load and validate an artifact. Slow (unpickle + canary), so call it off the event loop.
+
+        .npz artifacts (see convert_model.py) are memory-mapped as a NumpyForest;
+        anything else is treated as a pickled sklearn forest.
+        """
+        path = Path(path)
+        try:
+            # Read once: the version, the stored copy and the model all come from these bytes
+            raw = path.read_bytes()
+        except OSError as e:
+            raise ModelLoadError(f"Could not load {path}: {e}")
+        version = artifact_version(raw)
+
+        existing = self._versions.get(version)
+        if existing is not None:
+            logger.info(f"Model {version} is already loaded")
+        else:
+            stored = self._store(raw, version, path.suffix)
+            model, engine = self._deserialize(stored, raw)
+            canary = self.validate(model)
+            existing = ModelVersion(name or path.stem, version, stored, model, engine, canary, self._explainer(model),
+                                    source=path)
+            with self._lock:
+                self._versions[version] = existing
+                self._evict()
+            logger.info(f"Model loaded successfully! (version {version}, {engine} engine, from {path})")
+
+        if activate:
+            self.activate(version)
+        return existing
+
+    def load_in_background(self, path, name: str = None, activate: bool = False) -> dict:
+        """ Start load() on its own thread and return the job; its outcome shows up in job() and describe(). """
+        job = {"id": uuid.uuid4().hex[:12], "path": str(path), "status": "loading", "version": None, "error": None,
+               "activate": activate, "started_at": time.time(), "finished_at": None}
+        with self._lock:
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run_job, args=(job, path, name, activate), name="model-load", daemon=True).start()
+        return dict(job)
+
+    def _run_job(self, job: dict, path, name: str, activate: bool):
+        try:
+            job["version"] = self.load(path, name, activate=activate).version
+            job["status"] = "loaded"
+        except Exception as e:
+            logger.error(f"Loading {path} failed: {e}")
+            job["status"], job["error"] = "failed", str(e)
+        job["finished_at"] = time.time()
+
+    def job(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return dict(job)
+
+    def _store(self, raw: bytes, version: str, suffix: str) -> Path:
+        """ Write the artifact to store_dir/<version><suffix> (once), the path every worker loads it from. """
+        stored = self.store_dir / f"{version}{suffix}"
+        try:
+            if not stored.is_file() or artifact_version(stored.read_bytes()) != version:
+                self.store_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = stored.with_name(f"{stored.name}.{uuid.uuid4().hex}.tmp")
+                tmp_path.write_bytes(raw)
+                os.replace(tmp_path, stored)
+        except OSError as e:
+            raise ModelLoadError(f"Could not store model {version} in {self.store_dir}: {e}")
+        return stored
+
+    def _deserialize(self, path: Path, raw: bytes):
+        if path.suffix == ".npz":
+            try:
+                return NumpyForest.load(path), "numpy-mmap"
+            except Exception as e:
+                raise ModelLoadError(f"Could not load {path}: {e}")
+
+        try:
+            model = pickle.loads(raw)
+        except Exception as e:
+            raise ModelLoadError(f"Could not load {path}: {e}")
+        engine = "sklearn"
+        if self.inference_engine == "numpy":
+            try:
+                compiled = NumpyForest.from_sklearn(model)
+                # Sanity check on random rows before trusting it with traffic
+                if not check_against_sklearn(model, compiled, canary_rows(compiled.n_features_in_)):
+                    raise ValueError("probabilities differ from sklearn")
+                model, engine = compiled, "numpy"
+            except Exception as e:
+                logger.error(f"NumPy forest engine unavailable for {path}, falling back to sklearn: {e}")
+        return model, engine
+
+    def _explainer(self, model):
+        """ Flattened copy of the model with its contribution tables built, so explanations cost no setup per request. """
+        try:
+            explainer = model if isinstance(model, NumpyForest) else NumpyForest.from_sklearn(model)
+            explainer.prepare_explanations()
+        except Exception as e:
+            logger.warning(f"Feature contributions unavailable for this model: {e}")
+            return None
+        return explainer
+
+    def validate(self, model) -> dict:
+        """ Canary checks a candidate must pass before it can be activated. """
+        try:
+            rows = canary_rows(model.n_features_in_)
+            probabilities = np.asarray(model.predict_proba(rows))
+        except Exception as e:
+            raise ModelLoadError(f"Canary scoring failed: {e}")
+        if list(model.classes_) != [0, 1]:
+            raise ModelLoadError(f"Expected classes [0, 1], got {list(model.classes_)}")
+        if probabilities.shape != (len(rows), 2) or not np.all(np.isfinite(probabilities)):
+            raise ModelLoadError("Canary probabilities have the wrong shape or are not finite")
+        if not np.allclose(probabilities.sum(axis=1), 1.0):
+            raise ModelLoadError("Canary probabilities do not sum to 1")
+
+        report = {"rows": len(rows), "positive_rate": round(float((probabilities[:, 1] > 0.5).mean()), 4)}
+        active = self._active
+        if active is not None and active.model.n_features_in_ == model.n_features_in_:
+            # How often the candidate gives the same label as what is serving now
+            current = np.asarray(active.model.predict_proba(rows))
+            agreement = float((current.argmax(axis=1) == probabilities.argmax(axis=1)).mean())
+            report["agreement_with_active"] = round(agreement, 4)
+            if agreement < self.min_agreement:
+                raise ModelLoadError(f"Canary agreement {agreement:.2%} with the active model is below {self.min_agreement:.2%}")
+        return report
+
+    def activate(self, version: str) -> ModelVersion:
+        with self._lock:
+            model_version = self.get(version)
+            if self._active is not None and self._active is not model_version:
+                self._history.append(self._active.version)
+            self._active = model_version
+        logger.info(f"Activated model {version}")
+        return model_version
+
+    def rollback(self) -> ModelVersion:
+        """ Re-activate the version that was active before the current one. """
+        with self._lock:
+            while self._history:
+                previous = self._versions.get(self._history.pop())
+                if previous is not None:
+                    self._active = previous
+                    break
+            else:
+                raise KeyError("No earlier version to roll back to")
+        logger.info(f"Rolled back to model {previous.version}")
+        return previous
+
+    def set_split(self, weights: dict):
+        """ Send a share of traffic to other loaded versions, e.g. {"abc": 0.9, "def": 0.1}; None turns it off. """
+        if not weights:
+            self._split = None
+            return
+        for version, weight in weights.items():
+            self.get(version)
+            if weight < 0:
+                raise ValueError(f"Negative weight for {version}")
+        total = sum(weights.values())
+        if total <= 0:
+            raise ValueError("Weights must add up to more than 0")
+        cumulative, acc = [], 0.0
+        for version, weight in weights.items():
+            acc += weight / total
+            cumulative.append((acc, version))
+        self._split = cumulative
+
+    def select(self) -> ModelVersion:
+        """ Version to score this request with: the active one, or a weighted pick while a split is set. """
+        split = self._split
+        if split is None:
+            return self._active
+        draw = random.random()
+        for bound, version in split:
+            if draw < bound:
+                return self._versions.get(version, self._active)
+        return self._versions.get(split[-1][1], self._active)
+
+    def split_weights(self) -> dict:
+        split = self._split
+        if split is None:
+            return {}
+        weights, previous = {}, 0.0
+        for bound, version in split:
+            weights[version] = round(bound - previous, 6)
+            previous = bound
+        return weights
+
+    def _evict(self):
+        # Drop the oldest versions nobody can reach (not active, not in the split)
+        pinned = {self._active.version} if self._active is not None else set()
+        pinned.update(version for _, version in self._split or ())
+        candidates = sorted(
+            (mv for mv in self._versions.values() if mv.version not in pinned), key=lambda mv: mv.loaded_at
+        )
+        while len(self._versions) > self.max_versions and candidates:
+            del self._versions[candidates.pop(0).version]
+
+    def describe(self) -> dict:
+        return {
+            "active": self._active.version if self._active is not None else None,
+            "rollback_to": self._history[-1] if self._history else None,
+            "split": self.split_weights(),
+            "versions": [mv.describe() for mv in sorted(self._versions.values(), key=lambda mv: mv.loaded_at)],
+            "loads": [dict(job) for job in reversed(self._jobs.values())],
+        }
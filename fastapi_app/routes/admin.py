@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from ..schemas.admin import ModelLoadRequest, ModelSplitRequest
+from ..utils import get_admin_user
+from .diabetes import registry, MODEL_REGISTRY_DIR
+
+# Every route here needs an admin (see ADMIN_USERNAMES)
+router = APIRouter(dependencies=[Depends(get_admin_user)])
+
+
+@router.get("", status_code=status.HTTP_200_OK,
+    summary="List model versions",
+    description="Loaded versions with their canary reports, the active version, the rollback target and the traffic split."
+)
+def list_models():
+    return registry.describe()
+
+
+@router.post("/load", status_code=status.HTTP_202_ACCEPTED,
+    summary="Load a model version",
+    description="Start loading an artifact from MODEL_REGISTRY_DIR in the background and validating it on the canary set. Serving is not affected unless activate is set. Follow the returned job at /admin/models/loads/{job_id}."
+)
+def load_model(request: ModelLoadRequest):
+    registry_dir = MODEL_REGISTRY_DIR.resolve()
+    path = (registry_dir / request.path).resolve()
+    if not path.is_relative_to(registry_dir) or not path.is_file():
+        raise HTTPException(status_code=400, detail=f"No model file {request.path!r} in the model registry directory.")
+    return registry.load_in_background(path, request.name, activate=request.activate)
+
+
+@router.get("/loads/{job_id}", status_code=status.HTTP_200_OK,
+    summary="Model load status",
+    description="loading, loaded (with the version) or failed (with the error, e.g. a canary check)."
+)
+def load_status(job_id: str):
+    try:
+        return registry.job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No model load {job_id!r}.")
+
+
+@router.post("/{version}/activate", status_code=status.HTTP_200_OK,
+    summary="Activate a model version",
+    description="Atomically switch /predict to a loaded version; requests already being scored finish on the old one."
+)
+def activate_model(version: str):
+    try:
+        model_version = registry.activate(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version!r} is not loaded.")
+    return {"active": model_version.version}
+
+
+@router.post("/rollback", status_code=status.HTTP_200_OK,
+    summary="Roll back the active model",
+    description="Re-activate the version that was active before the current one."
+)
+def rollback_model():
+    try:
+        model_version = registry.rollback()
+    except KeyError:
+        raise HTTPException(status_code=409, detail="No earlier model version to roll back to.")
+    return {"active": model_version.version}
+
+
+@router.put("/split", status_code=status.HTTP_200_OK,
+    summary="Set the traffic split",
+    description="Score a weighted share of /predict traffic with other loaded versions for A/B comparison (see model_predictions_total in /metrics). Empty weights turn the split off."
+)
+def set_split(request: ModelSplitRequest):
+    try:
+        registry.set_split(request.weights)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Model version {e.args[0]!r} is not loaded.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"split": registry.split_weights()}
@@ -1,57 +1,65 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..models.user import User
 from ..schemas.user import UserCreate, UserResponse, TokenResponse, UserLogin
 from ..utils import hash_password, verify_password, create_access_token, get_current_user, credentials_exception
+from ..utils import password_needs_rehash, invalidate_user_cache
+from ..ratelimit import limit_login, limit_register
 from fastapi.security import OAuth2PasswordRequestForm
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse,
-    status_code=status.HTTP_201_CREATED,
+    status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_register)],
     summary="Register a new user",
     description="Creates a new user with a hashed password.",
     tags=["Authentication"]
              )
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # check if user already exits or not
-    existing_user = db.query(User).filter(User.username == user.username).first()
+    existing_user = (await db.execute(select(User).where(User.username == user.username))).scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists!"
         )  
     # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user.email).first()
+    existing_email = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email is already registered!"
         )
         # Hash the password before saving
-    hashed_pwd = hash_password(user.password)
+    hashed_pwd = await hash_password(user.password)
 
     # Create new user
     new_user = User(username=user.username, email=user.email, password_hash=hashed_pwd)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)  
+    await db.commit()
+    await db.refresh(new_user)  
 
     return new_user
 
 @router.post("/login", response_model=TokenResponse,
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_200_OK, dependencies=[Depends(limit_login)],
     summary="User Login",
     description="Authenticate user and returns access token." ,
     tags=["Authentication"]
     )
-def login(form_data: OAuth2PasswordRequestForm = Depends(),  
-    db: Session = Depends(get_db)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(),  
+    db: AsyncSession = Depends(get_async_db)
     ):
-    db_user = db.query(User).filter(User.username == form_data.username).first()
-    if not db_user or not verify_password(form_data.password, db_user.password_hash):
+    db_user = (await db.execute(select(User).where(User.username == form_data.username))).scalars().first()
+    if not db_user or not await verify_password(form_data.password, db_user.password_hash):
         raise credentials_exception
+    # Transparently upgrade hashes made with an older bcrypt cost
+    if password_needs_rehash(db_user.password_hash):
+        db_user.password_hash = await hash_password(form_data.password)
+        await db.commit()
+        invalidate_user_cache(db_user.id)
     access_token = create_access_token({"sub": db_user.username})
     return TokenResponse(access_token=access_token, token_type="bearer")
 
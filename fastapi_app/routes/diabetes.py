@@ -1,155 +1,904 @@
-from fastapi import FastAPI, APIRouter, status, Depends, HTTPException
-import logging
-import pickle
-from ..schemas.diabetes import DiabetesInput, PredictionResponse, ChatRequest
-import numpy as np
-from ..utils import get_current_user
-from ..schemas.user import UserResponse
-import requests
-from pathlib import Path
-
-# setting Up Logginf files
-logging.basicConfig(
-    filename="app.log",  # Save logs in a file
-    level=logging.INFO,  # Log level: INFO (can change to DEBUG, ERROR, etc.)
-    format="%(asctime)s - %(levelname)s - %(message)s",  # Format logs
-    datefmt="%Y-%m-%d %H:%M:%S"  # Date format
-)
-logger = logging.getLogger(__name__)  # Create a logger instance
-
-# Hugging Face API settings
-HF_API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1"
-HF_API_KEY = "Your_Hugging_face_api_acces_token"
-
-
-# Get the absolute path of the current file (diabetes.py)
-BASE_DIR = Path(__file__).resolve().parent.parent
-# Construct the model path
-MODEL_PATH = BASE_DIR / "diabetes_model.pkl"
-
-# fast api
-app = FastAPI()
-
-#Loading our model
-try:
-    with open(MODEL_PATH, "rb") as model_file:
-        model = pickle.load(model_file)
-    logger.info("Model loaded successfully!")
-except Exception as e:
-    logger.error(f"Error loading model/scaler: {e}")
-    raise RuntimeError("Model file is missing or corrupted!")
-  
-#model dependency func
-def get_model(): # dependency function which can be used in future
-    return model
-
-
-router = APIRouter()
-
-
-# Function to Generate Message and Advice
-def generate_advice(prediction: int, probability: float) -> str:
-    """Returns a user-friendly health message based on prediction probability."""
-    if prediction == 1:
-        if probability > 0.80:
-            return "You are at high risk for diabetes. Please consult a doctor immediately!"
-        elif probability > 0.50:
-            return "You have a moderate risk for diabetes. Consider lifestyle changes and check with a doctor."
-        else: 
-            return "You have a low risk but should still maintain a healthy lifestyle."
-    else:
-        return "Great news! You are not diabetic. Keep maintaining a healthy lifestyle!"
-
-
-
-@router.post("/predict", response_model=PredictionResponse, status_code=status.HTTP_200_OK,
-    summary="Predict Diabetes",
-    description="Provide patient details and get a diabetes prediction with probability score."
-)
-def predict(data: DiabetesInput, model=Depends(get_model),
-            user: UserResponse = Depends(get_current_user)
-  ):
-    try:
-        # Convert input data to NumPy array
-        input_data = np.array([[
-            data.Pregnancies, data.Glucose, data.BloodPressure, 
-            data.Insulin, data.BMI,
-            data.DiabetesPedigreeFunction, data.Age
-        ]])
-        prediction = model.predict(input_data)[0]
-        probability = model.predict_proba(input_data)[0][1]
-
-        result = "Diabetic" if prediction == 1 else "Non-Diabetic"
-        advice = generate_advice(prediction, probability)
-        logger.info(f" User '{user.username}' - Prediction: {result} (Probability: {probability:.2f}%)")
-        personalized_message = f"Hello, {user.username}! {advice}"
-        logger.info(f" Message:{personalized_message}")
-
-        return {
-            "prediction": result,
-            "probability": f"{probability * 100:.2f}%",
-            "message": personalized_message
-        }
-
-    except Exception as e:
-        logger.error(f" Prediction error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal Server Error. Please check the model and input data."
-        )
-
-
-# Chatbot Route
-
-@router.post("/chat", status_code=status.HTTP_200_OK)
-def chat(request: ChatRequest, user: UserResponse = Depends(get_current_user)):
-    """ Chatbot providing health advice based on diabetes risk prediction. """
-
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized: Please log in first.")
-
-    # Construct user health summary
-    health_summary = (
-        f"User {user.username} has a {request.prediction} diabetes risk "
-        f"with a probability of {request.probability}.\n"
-        f"Health details:\n"
-        f"- Glucose: {request.glucose}\n"
-        f"- Blood Pressure: {request.blood_pressure}\n"
-        f"- Insulin: {request.insulin}\n"
-        f"- BMI: {request.bmi}\n"
-        f"- Age: {request.age}\n"
-        f"- Diabetes Pedigree Function: {request.diabetes_pedigree_function}\n"
-        f"Provide **concise** health recommendations for diabetes prevention and management "
-        f"in **bullet points** (avoid unnecessary introductions)."
-    )
-
-    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
-    payload = {"inputs": health_summary}
-
-    try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload)
-
-        if response.status_code == 200:
-            bot_response = response.json()[0]["generated_text"]
-            logger.info(f"Model Generated text : {bot_response}")
-            advice_lines = bot_response.split("\n")
-            structured_advice = []
-            count = 0
-            for line in advice_lines:
-                line = line.strip()
-                # Ignore lines that contain "User", "Health details", or input summary
-                if count < 10 :
-                    count = count + 1
-                    continue
-                structured_advice.append(f"{line}")
-
-            logger.info(f" Advice:{structured_advice}")
-            return {"advice": "\n".join(structured_advice)}
-
-        else:
-            logger.error(f"Hugging Face API Error: {response.json()}")
-            raise HTTPException(status_code=500, detail="Chatbot service error.")
-
-    except Exception as e:
-        logger.error(f"Chatbot error: {e}")
-        raise HTTPException(status_code=500, detail="Chatbot service error.")
+from fastapi import FastAPI, APIRouter, status, Depends, HTTPException, Response, Request, Query
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import asyncio
+import csv
+import io
+import itertools
+import logging
+import json
+import orjson
+import time
+from ..schemas.diabetes import DiabetesInput, PredictionResponse, ChatRequest, BatchPredictionRequest, BatchPredictionResponse, MAX_BATCH_SIZE
+import numpy as np
+import os
+import tempfile
+from pydantic import ValidationError
+from ..utils import get_admin_user, get_current_user
+from ..ratelimit import charge_rows, limit_chat, limit_predict
+from ..registry import ModelRegistry, ModelVersion, ModelLoadError, canary_rows
+from ..batching import MicroBatcher
+from ..executor import InferenceExecutor, InferenceBusy, InferenceTimeout
+from ..cache import PredictionCache
+from ..schemas.user import UserResponse
+from ..hf_client import HFClient, HFClientError
+from ..advice_cache import AdviceCache, parse_bins
+from ..cohort import CsvChunker, check_ranges, parse_column_map, records_to_matrix, resolve_columns, rows_to_matrix
+from ..columnar import ARROW_MEDIA_TYPE, ColumnarUnavailable, TooManyRows, prefers_arrow, read_arrow, require_pyarrow, write_arrow
+from ..history import PredictionWriter
+from ..metrics import model_inference_seconds, model_predictions_total
+from ..database import Session
+from pathlib import Path
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+# Handlers are set up once by logging_setup.setup_logging() in main.py
+logger = logging.getLogger(__name__)  # Create a logger instance
+
+# Upper bound on the /predict/batch body, checked before any of it is parsed (MAX_BATCH_SIZE is in schemas)
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(MAX_BATCH_SIZE * 1024)))
+
+# Rows scored per predict_proba call by /predict/csv, and extra "Column=Field" renames on top of Preg/BPressure
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "5000"))
+CSV_COLUMN_MAP = os.getenv("CSV_COLUMN_MAP", "")
+# Scored results above this many bytes are spooled to a temp file instead of memory
+CSV_SPOOL_BYTES = int(os.getenv("CSV_SPOOL_BYTES", str(1024 * 1024)))
+
+# Feature order the model was trained on
+FEATURE_ORDER = [
+    "Pregnancies", "Glucose", "BloodPressure",
+    "Insulin", "BMI",
+    "DiabetesPedigreeFunction", "Age"
+]
+
+
+# Get the absolute path of the current file (diabetes.py)
+BASE_DIR = Path(__file__).resolve().parent.parent
+# Inference engine: "numpy" (flat NumPy forest, default) or "sklearn" to fall back
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "numpy").lower()
+
+# Construct the model path (the version activated at startup). The memory-mapped
+# .npz artifact is preferred: workers share its pages and nothing is unpickled.
+DEFAULT_MODEL_PATH = BASE_DIR / "diabetes_model.npz"
+if INFERENCE_ENGINE != "numpy" or not DEFAULT_MODEL_PATH.exists():
+    DEFAULT_MODEL_PATH = BASE_DIR / "diabetes_model.pkl"
+MODEL_PATH = Path(os.getenv("MODEL_PATH", str(DEFAULT_MODEL_PATH)))
+# Directory the admin endpoints may load further model versions from
+MODEL_REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY_DIR", str(BASE_DIR.parent / "saved_models")))
+MODEL_REGISTRY_MAX_VERSIONS = int(os.getenv("MODEL_REGISTRY_MAX_VERSIONS", "5"))
+# The registry's own copy of every loaded version, named by content hash, so overwriting an upload never
+# changes what a version scores with
+MODEL_STORE_DIR = Path(os.getenv("MODEL_STORE_DIR", "model_versions"))
+# Share of canary rows a new version must label like the active one (0 = report only)
+MODEL_CANARY_MIN_AGREEMENT = float(os.getenv("MODEL_CANARY_MIN_AGREEMENT", "0"))
+
+# Where /predict runs predict_proba: "shared" (FastAPI's threadpool), "thread" or "process" (dedicated pools)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "shared").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "64"))
+INFERENCE_TIMEOUT_MS = float(os.getenv("INFERENCE_TIMEOUT_MS", "2000"))
+INFERENCE_HEALTH_INTERVAL = float(os.getenv("INFERENCE_HEALTH_INTERVAL", "5"))
+
+# Micro-batching of concurrent /predict calls (off by default)
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "0").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# Cache of /predict results keyed on features + model version
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+
+# Cache of /chat advice keyed on binned health values + risk band, optionally persisted to SQLite
+ADVICE_CACHE_ENABLED = os.getenv("ADVICE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+ADVICE_CACHE_SIZE = int(os.getenv("ADVICE_CACHE_SIZE", "5000"))
+ADVICE_CACHE_TTL = float(os.getenv("ADVICE_CACHE_TTL", "86400"))
+ADVICE_CACHE_BINS = os.getenv("ADVICE_CACHE_BINS", "")
+ADVICE_CACHE_PATH = os.getenv("ADVICE_CACHE_PATH", "")
+
+# Write-behind persistence of scored records to the predictions table
+PREDICTION_HISTORY_ENABLED = os.getenv("PREDICTION_HISTORY_ENABLED", "1").lower() in ("1", "true", "yes")
+PREDICTION_HISTORY_BATCH_SIZE = int(os.getenv("PREDICTION_HISTORY_BATCH_SIZE", "200"))
+PREDICTION_HISTORY_FLUSH_MS = float(os.getenv("PREDICTION_HISTORY_FLUSH_MS", "500"))
+PREDICTION_HISTORY_MAX_QUEUE = int(os.getenv("PREDICTION_HISTORY_MAX_QUEUE", "10000"))
+
+# fast api
+app = FastAPI()
+
+# Every loaded model version; /predict scores with registry.select()
+registry = ModelRegistry(INFERENCE_ENGINE, MODEL_REGISTRY_MAX_VERSIONS, MODEL_CANARY_MIN_AGREEMENT, MODEL_STORE_DIR)
+
+
+def load_active_model() -> bool:
+    """ Load MODEL_PATH as the active version. Called from the app lifespan, off the event loop.
+
+    A missing or corrupted file is logged rather than raised, so the app still
+    starts (not ready) and an admin can load another version.
+    """
+    try:
+        registry.load(MODEL_PATH, activate=True)
+    except ModelLoadError as e:
+        logger.error(f"Error loading model/scaler: {e}")
+        return False
+    return True
+
+#model dependency func
+def get_model(): # active model, swapped atomically by the registry
+    return registry.active.model
+
+def get_model_version():
+    return registry.active.version
+
+def get_active_model_version():
+    return registry.active
+
+# Version a request is scored with, picked once so the whole request uses the same one
+def select_model() -> ModelVersion:
+    selected = registry.select()
+    if selected is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model is not loaded yet",
+                            headers={"Retry-After": "1"})
+    return selected
+
+# Dedicated inference pool (started and stopped by the app lifespan)
+inference_executor = InferenceExecutor(
+    INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_TIMEOUT_MS, INFERENCE_HEALTH_INTERVAL
+)
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL) if PREDICTION_CACHE_ENABLED else None
+
+# Background workers, created by start_workers() in the app lifespan (never at import).
+# batcher is the batching queue in front of inference_executor, shared by every /predict call
+batcher = None
+prediction_writer = None
+advice_cache = None
+
+
+def start_workers():
+    """ Start the micro-batcher, history writer and advice cache that are enabled. """
+    global batcher, prediction_writer, advice_cache
+    if MICRO_BATCH_ENABLED and batcher is None:
+        # Batches go through the executor, so they get its pending limit, timeout and workers
+        batcher = MicroBatcher(get_active_model_version, inference_executor.predict_proba_sync,
+                               MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+                               max_queue=INFERENCE_MAX_PENDING * MICRO_BATCH_MAX_SIZE)
+    if PREDICTION_HISTORY_ENABLED and prediction_writer is None:
+        prediction_writer = PredictionWriter(
+            Session, PREDICTION_HISTORY_BATCH_SIZE, PREDICTION_HISTORY_FLUSH_MS, PREDICTION_HISTORY_MAX_QUEUE
+        )
+    if ADVICE_CACHE_ENABLED and advice_cache is None:
+        advice_cache = AdviceCache(ADVICE_CACHE_SIZE, ADVICE_CACHE_TTL, parse_bins(ADVICE_CACHE_BINS), ADVICE_CACHE_PATH)
+
+
+def stop_workers():
+    """ Finish queued work and stop the workers: batched rows first, then the history they produce. """
+    global batcher, prediction_writer, advice_cache
+    if batcher is not None:
+        batcher.close()
+        batcher = None
+    if prediction_writer is not None:
+        prediction_writer.close()
+        prediction_writer = None
+    if advice_cache is not None:
+        advice_cache.close()
+        advice_cache = None
+
+
+def batch_timeout():
+    """ Longest a /predict call waits for its batch: the executor's timeout plus the batching delay. """
+    if inference_executor.timeout is None:
+        return None
+    return inference_executor.timeout + MICRO_BATCH_MAX_WAIT_MS / 1000
+
+
+def warm_up():
+    """ Score the canary rows once through the real path so the first request pays no first-call costs. """
+    active = registry.active
+    if active is None:
+        return
+    rows = canary_rows(len(FEATURE_ORDER), size=8)
+    inference_executor.predict_proba_sync(active, rows)
+    if batcher is not None:
+        batcher.submit(rows[0]).result(timeout=10)
+
+
+router = APIRouter()
+
+
+# Function to Generate Message and Advice
+def generate_advice(prediction: int, probability: float) -> str:
+    """Returns a user-friendly health message based on prediction probability."""
+    if prediction == 1:
+        if probability > 0.80:
+            return "You are at high risk for diabetes. Please consult a doctor immediately!"
+        elif probability > 0.50:
+            return "You have a moderate risk for diabetes. Consider lifestyle changes and check with a doctor."
+        else: 
+            return "You have a low risk but should still maintain a healthy lifestyle."
+    else:
+        return "Great news! You are not diabetic. Keep maintaining a healthy lifestyle!"
+
+
+def require_explainer(selected: ModelVersion):
+    if selected.explainer is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Feature contributions are not available for this model.")
+
+
+def format_contributions(contributions) -> dict:
+    """ Contributions of one row to the diabetic probability, by feature name. """
+    return {feature: round(value, 6) for feature, value in zip(FEATURE_ORDER, contributions.tolist())}
+
+
+
+@router.post("/predict", response_model=PredictionResponse, response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK, dependencies=[Depends(limit_predict)],
+    summary="Predict Diabetes",
+    description="Provide patient details and get a diabetes prediction with probability score. "
+                "With explain=true the response also has each feature's contribution to the probability."
+)
+async def predict(data: DiabetesInput, response: Response, selected: ModelVersion = Depends(select_model),
+            user: UserResponse = Depends(get_current_user), explain: bool = Query(False)
+  ):
+    model = selected.model
+    response.headers["X-Model-Version"] = selected.version
+    if explain:
+        require_explainer(selected)
+    explanation = None
+    try:
+        # Convert input data to NumPy array
+        input_data = np.array([[
+            data.Pregnancies, data.Glucose, data.BloodPressure, 
+            data.Insulin, data.BMI,
+            data.DiabetesPedigreeFunction, data.Age
+        ]])
+        # One predict_proba call, label derived from it the same way model.predict does.
+        # Awaited, so the model never runs on the event loop or holds up the shared threadpool.
+        async def score():
+            with model_inference_seconds.time("predict"):
+                if batcher is not None:
+                    return await batcher.predict_proba_async(input_data[0], batch_timeout(), selected)
+                return (await inference_executor.predict_proba(selected, input_data))[0]
+
+        if explain:
+            # Same traversal as scoring; skips the cache and batcher, which only carry probabilities
+            with model_inference_seconds.time("predict_explain"):
+                proba, contributions, expected_value = await inference_executor.predict_proba(
+                    selected, input_data, explain=True
+                )
+            probabilities = proba[0]
+            explanation = {"base_value": round(float(expected_value[1]), 6),
+                           "contributions": format_contributions(contributions[0, :, 1])}
+        # Only the active version is cached; the cache is dropped whenever its version changes
+        elif prediction_cache is not None and selected is registry.active:
+            probabilities = await prediction_cache.get_or_compute_async(selected.version, input_data[0], score)
+        else:
+            probabilities = await score()
+        prediction = model.classes_[np.argmax(probabilities)]
+        probability = probabilities[1]
+
+        result = "Diabetic" if prediction == 1 else "Non-Diabetic"
+        advice = generate_advice(prediction, probability)
+        personalized_message = f"Hello, {user.username}! {advice}"
+        logger.info("prediction", extra={"user": user.username, "prediction": result, "probability": round(float(probability), 4), "model_version": selected.version})
+        model_predictions_total.inc(selected.version, result)
+        if prediction_writer is not None:
+            prediction_writer.record(user.id, data.model_dump(), result, probability, selected.version)
+
+        return {
+            "prediction": result,
+            "probability": f"{probability * 100:.2f}%",
+            "message": personalized_message,
+            **(explanation or {})
+        }
+
+    except InferenceBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": "1"}
+        )
+    except InferenceTimeout as e:
+        logger.error(f" Prediction timed out: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Prediction timed out.")
+    except Exception as e:
+        logger.error(f" Prediction error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Server Error. Please check the model and input data."
+        )
+
+
+BATCH_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": BatchPredictionRequest.model_json_schema()},
+        ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary",
+                                      "description": "Arrow IPC stream with the DiabetesInput columns"}},
+    },
+}
+
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse, status_code=status.HTTP_200_OK,
+    summary="Predict Diabetes (batch)",
+    description="Score many patient records in one request. Invalid rows are reported by index and do not fail the batch. "
+                "With explain=true every scored row also has its feature contributions. "
+                f"Send and/or accept {ARROW_MEDIA_TYPE} instead of JSON for a columnar payload: one column per "
+                "feature in, and index, prediction, probability (0-1), message and error columns out. "
+                "Every record counts against the same per-user budget as one /predict call.",
+    openapi_extra={"requestBody": BATCH_REQUEST_BODY},
+    responses={200: {"content": {ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def predict_batch(request: Request, selected: ModelVersion = Depends(select_model),
+                        user: UserResponse = Depends(get_current_user), explain: bool = Query(False)
+  ):
+    if explain:
+        require_explainer(selected)
+    # Content negotiation: the request body format from Content-Type, the response format from Accept
+    arrow_in = request.headers.get("content-type", "").split(";")[0].strip().lower() == ARROW_MEDIA_TYPE
+    arrow_out = prefers_arrow(request.headers.get("accept", ""))
+    body = await read_body(request, MAX_BATCH_BYTES)
+    # Parsing, scoring and encoding are CPU work, so off the event loop as before
+    return await run_in_threadpool(score_batch, body, arrow_in, arrow_out, selected, user, explain)
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """ The request body, or 413 as soon as Content-Length or the bytes received so far go past max_bytes. """
+    too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                              detail=f"Request body too large (max {max_bytes} bytes).")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def parse_batch(body: bytes, arrow_in: bool):
+    """ (X, errors, n_records) for a /predict/batch body; errors maps record index -> validation errors.
+
+    X is None when there are more than MAX_BATCH_SIZE records; the JSON and
+    Arrow readers both stop counting once past the limit.
+    """
+    if arrow_in:
+        try:
+            X, errors = read_arrow(body, FEATURE_ORDER, parse_column_map(CSV_COLUMN_MAP), max_rows=MAX_BATCH_SIZE)
+        except TooManyRows as e:
+            return None, None, e.rows
+        except ColumnarUnavailable as e:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return X, errors, len(X)
+
+    try:
+        request = BatchPredictionRequest.model_validate_json(body)
+    except ValidationError as e:
+        for error in e.errors(include_url=False):
+            # max_length on records: validation stopped at the size check, answered with 413 like before
+            if error["type"] == "too_long" and error["loc"] == ("records",):
+                return None, None, error["ctx"]["actual_length"]
+        # Same 422 body FastAPI gives for a declared body parameter
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+    records = request.records
+    # Plain numeric records skip pydantic; only the rest are validated one by one
+    X, slow = records_to_matrix(records, FEATURE_ORDER)
+    errors = {}
+    for index in slow:
+        try:
+            data = DiabetesInput.model_validate(records[index])
+        except ValidationError as e:
+            errors[index] = e.errors(include_url=False, include_context=False, include_input=False)
+            continue
+        X[index] = [getattr(data, feature) for feature in FEATURE_ORDER]
+    # Same finite, non-negative rule as DiabetesInput and the CSV and Arrow paths, with the same error bodies
+    check_ranges(X, FEATURE_ORDER, errors)
+    return X, errors, len(records)
+
+
+def score_batch(body: bytes, arrow_in: bool, arrow_out: bool, selected: ModelVersion, user: UserResponse,
+                explain: bool) -> Response:
+    if arrow_out:
+        try:
+            # Fail before scoring if the response can't be encoded
+            require_pyarrow()
+        except ColumnarUnavailable as e:
+            raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+
+    X, errors, total = parse_batch(body, arrow_in)
+    if X is None:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large: more than {MAX_BATCH_SIZE} records."
+        )
+    # Priced per record, like that many /predict calls
+    charge_rows(user, total)
+
+    valid = np.ones(total, dtype=bool)
+    valid[list(errors)] = False
+    valid_indices = np.flatnonzero(valid)
+    labels = np.full(total, -1, dtype=np.int64)
+    probabilities = np.full(total, np.nan)
+    contributions = None
+    base_value = None
+    if len(valid_indices):
+        try:
+            # One predict_proba call over the whole (N, 7) matrix, label derived from it
+            input_data = X[valid_indices]
+            if explain:
+                with model_inference_seconds.time("predict_batch_explain"):
+                    proba, valid_contributions, expected_value = inference_executor.predict_proba_sync(
+                        selected, input_data, explain=True
+                    )
+                base_value = round(float(expected_value[1]), 6)
+                contributions = np.full((total, len(FEATURE_ORDER)), np.nan)
+                contributions[valid_indices] = valid_contributions[:, :, 1]
+            else:
+                with model_inference_seconds.time("predict_batch"):
+                    proba = inference_executor.predict_proba_sync(selected, input_data)
+        except InferenceBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly.",
+                headers={"Retry-After": "1"}
+            )
+        except InferenceTimeout as e:
+            logger.error(f" Batch prediction timed out: {e}")
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Prediction timed out.")
+        except Exception as e:
+            logger.error(f" Batch prediction error: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Internal Server Error. Please check the model and input data."
+            )
+        labels[valid_indices] = selected.model.classes_[np.argmax(proba, axis=1)]
+        probabilities[valid_indices] = proba[:, 1]
+
+    results = ["Diabetic" if label == 1 else "Non-Diabetic" for label in labels.tolist()]
+    messages = [None] * total
+    for index in valid_indices.tolist():
+        label, probability = int(labels[index]), float(probabilities[index])
+        messages[index] = f"Hello, {user.username}! {generate_advice(label, probability)}"
+        if prediction_writer is not None:
+            prediction_writer.record(user.id, dict(zip(FEATURE_ORDER, X[index].tolist())), results[index], probability,
+                                     selected.version)
+    diabetic = int((labels[valid_indices] == 1).sum())
+    if diabetic:
+        model_predictions_total.inc(selected.version, "Diabetic", amount=diabetic)
+    if len(valid_indices) - diabetic:
+        model_predictions_total.inc(selected.version, "Non-Diabetic", amount=len(valid_indices) - diabetic)
+
+    failed = total - len(valid_indices)
+    logger.info("batch prediction", extra={"user": user.username, "scored": len(valid_indices), "rejected": failed})
+    headers = {"X-Model-Version": selected.version}
+    if arrow_out:
+        return Response(batch_to_arrow(total, valid, results, probabilities, messages, errors, contributions,
+                                       selected.version, base_value),
+                        media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return ORJSONResponse(batch_to_json(total, valid, results, probabilities, messages, errors, contributions, base_value),
+                          headers=headers)
+
+
+def batch_to_json(total, valid, results, probabilities, messages, errors, contributions, base_value) -> dict:
+    """ BatchPredictionResponse as plain dicts, ready for the JSON encoder. """
+    items = []
+    for index, (ok, probability) in enumerate(zip(valid.tolist(), probabilities.tolist())):
+        if not ok:
+            items.append({"index": index, "prediction": None, "probability": None, "message": None,
+                          "contributions": None, "errors": errors[index]})
+            continue
+        items.append({
+            "index": index,
+            "prediction": results[index],
+            "probability": f"{probability * 100:.2f}%",
+            "message": messages[index],
+            "contributions": format_contributions(contributions[index]) if contributions is not None else None,
+            "errors": None,
+        })
+    succeeded = int(valid.sum())
+    return {"total": total, "succeeded": succeeded, "failed": total - succeeded, "base_value": base_value,
+            "results": items}
+
+
+def batch_to_arrow(total, valid, results, probabilities, messages, errors, contributions, version, base_value) -> bytes:
+    """ One row per record; failed rows have null prediction/probability/message and their errors joined in error. """
+    columns = {
+        "index": np.arange(total, dtype=np.int64),
+        "prediction": [result if ok else None for result, ok in zip(results, valid.tolist())],
+        "probability": probabilities,
+        "message": messages,
+        "error": [
+            "; ".join(f"{e['loc'][0]}: {e['msg']}" if e["loc"] else e["msg"] for e in errors[index])
+            if index in errors else None
+            for index in range(total)
+        ],
+    }
+    if contributions is not None:
+        for column, feature in enumerate(FEATURE_ORDER):
+            columns[f"contribution_{feature}"] = contributions[:, column]
+    return write_arrow(columns, {"model_version": version, "base_value": base_value})
+
+
+def record_history(user: UserResponse, X, results, probabilities, selected: ModelVersion):
+    """ Queue scored rows for the predictions table, like /predict and /predict/batch do. """
+    for features, result, probability in zip(X.tolist(), results, probabilities.tolist()):
+        prediction_writer.record(user.id, dict(zip(FEATURE_ORDER, features)), result, probability, selected.version)
+
+
+def format_csv_results(rows_scored, first_row: int, errors: dict, output: str) -> str:
+    """ One NDJSON line or CSV row per input row of a chunk. rows_scored is [(position, label, probability)]. """
+    results = [(position, label, probability, None) for position, label, probability in rows_scored]
+    results += [(position, None, None, row_errors) for position, row_errors in errors.items()]
+    results.sort(key=lambda result: result[0])
+
+    if output == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for position, label, probability, row_errors in results:
+            error = "; ".join(f"{e['loc'][0]}: {e['msg']}" if e["loc"] else e["msg"] for e in row_errors or ())
+            writer.writerow([first_row + position, label or "", "" if probability is None else f"{probability:.4f}", error])
+        return buffer.getvalue()
+
+    lines = []
+    for position, label, probability, row_errors in results:
+        record = {"row": first_row + position}
+        if row_errors:
+            record["errors"] = row_errors
+        else:
+            record.update(prediction=label, probability=round(float(probability), 4))
+        lines.append(orjson.dumps(record).decode())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+@router.post("/predict/csv", status_code=status.HTTP_200_OK,
+    summary="Predict Diabetes (CSV cohort)",
+    description=(
+        "Upload a CSV shaped like model_preparation/diabetes.csv as the raw request body (Content-Type: text/csv). "
+        "Rows are parsed and scored in chunks while the upload streams in; results are spooled to disk and streamed "
+        "back as NDJSON (default) or CSV, one line per input row. Preg/BPressure are mapped to Pregnancies/BloodPressure; pass "
+        "more renames as columns=Column=Field,... Extra columns such as SThickness and Outcome are ignored. "
+        "Every row counts against the same per-user budget as one /predict call; the upload is answered with 429 "
+        "as soon as a chunk would go over it."
+    ),
+    openapi_extra={"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string"}}}}},
+)
+async def predict_csv(request: Request, output: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+                      columns: str = Query("", description="Extra column renames, e.g. Preg=Pregnancies"),
+                      selected: ModelVersion = Depends(select_model), user: UserResponse = Depends(get_current_user)
+  ):
+    try:
+        column_map = parse_column_map(",".join(filter(None, (CSV_COLUMN_MAP, columns))))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    # Read just far enough to check the header, so a wrong file fails with a status code, not mid-stream.
+    # Blank lines before the header are skipped; after it they still count as rows.
+    body = request.stream()
+    chunker = CsvChunker()
+    rows = []
+    try:
+        async for data in body:
+            rows = list(itertools.dropwhile(lambda row: not row, chunker.feed(data)))
+            if rows:
+                break
+        else:
+            rows = list(itertools.dropwhile(lambda row: not row, chunker.close()))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV must be UTF-8 encoded.")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV body is empty.")
+    try:
+        indices = resolve_columns(rows[0], FEATURE_ORDER, column_map)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    async def score_chunk(chunk, first_row):
+        # Blank lines get no result line, but keep their place in the numbering
+        lines = [position for position, row in enumerate(chunk) if row]
+        charge_rows(user, len(lines), f"Too many records, please slow down (stopped before row {first_row}).")
+        X, valid, errors = await run_in_threadpool(
+            rows_to_matrix, [chunk[position] for position in lines], indices, FEATURE_ORDER
+        )
+        errors = {lines[position]: row_errors for position, row_errors in errors.items()}
+        scored = []
+        if valid.any():
+            for attempt in range(20):
+                try:
+                    with model_inference_seconds.time("predict_csv"):
+                        probabilities = await inference_executor.predict_proba(selected, X[valid])
+                    break
+                except InferenceBusy:
+                    # A bulk upload waits for room instead of failing the rest of the file
+                    await asyncio.sleep(0.05 * (attempt + 1))
+                except Exception as e:
+                    probabilities = e
+                    break
+            else:
+                probabilities = InferenceBusy("inference pool stayed busy")
+
+            positions = np.asarray(lines)[valid]
+            if isinstance(probabilities, Exception):
+                logger.error(f" CSV chunk scoring error: {probabilities}")
+                failure = [{"loc": [], "msg": "Scoring failed, please retry these rows.", "type": "scoring_failed"}]
+                errors.update({int(position): failure for position in positions})
+            else:
+                labels = selected.model.classes_[np.argmax(probabilities, axis=1)]
+                names = np.where(labels == 1, "Diabetic", "Non-Diabetic")
+                scored = list(zip(positions.tolist(), names.tolist(), probabilities[:, 1].tolist()))
+                for name in ("Diabetic", "Non-Diabetic"):
+                    count = int(np.count_nonzero(names == name))
+                    if count:
+                        model_predictions_total.inc(selected.version, name, amount=count)
+                if prediction_writer is not None:
+                    await run_in_threadpool(record_history, user, X[valid], names.tolist(), probabilities[:, 1], selected)
+        text = await run_in_threadpool(format_csv_results, scored, first_row, errors, output)
+        return text, len(scored), len(lines) - len(scored)
+
+    # Results are written to a spooled temp file (on disk past CSV_SPOOL_BYTES) and sent once the upload is
+    # read: memory stays flat, and clients that send the whole body before reading the response still work
+    spool = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_BYTES)
+    if output == "csv":
+        spool.write(b"row,prediction,probability,error\n")
+    pending = rows[1:]
+    next_row = 1
+    scored_total = rejected_total = 0
+    done = False
+    try:
+        while not done:
+            # Keep at most one chunk of parsed rows in memory
+            while len(pending) < CSV_CHUNK_ROWS:
+                data = await anext(body, None)
+                if data is None:
+                    pending.extend(chunker.close())
+                    done = True
+                    break
+                pending.extend(chunker.feed(data))
+            while len(pending) >= CSV_CHUNK_ROWS or (done and pending):
+                chunk, pending = pending[:CSV_CHUNK_ROWS], pending[CSV_CHUNK_ROWS:]
+                text, scored, rejected = await score_chunk(chunk, next_row)
+                await run_in_threadpool(spool.write, text.encode())
+                next_row += len(chunk)
+                scored_total += scored
+                rejected_total += rejected
+    except UnicodeDecodeError:
+        spool.close()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"CSV must be UTF-8 encoded (invalid data after row {next_row - 1}).")
+    except ValueError as e:
+        spool.close()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{e} (after row {next_row - 1}).")
+    except BaseException:
+        spool.close()
+        raise
+
+    logger.info("csv prediction", extra={"user": user.username, "scored": scored_total, "rejected": rejected_total})
+    spool.seek(0)
+    return StreamingResponse(
+        iter(lambda: spool.read(64 * 1024), b""),
+        media_type="text/csv" if output == "csv" else "application/x-ndjson",
+        headers={"X-Model-Version": selected.version, "X-Rows-Scored": str(scored_total), "X-Rows-Rejected": str(rejected_total)},
+        background=BackgroundTask(spool.close),
+    )
+
+
+@router.get("/batching/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)],
+    summary="Micro-batching stats",
+    description="Queue depth, batch-size distribution and wait times of the /predict micro-batcher. Admins only."
+)
+def batching_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
+@router.get("/inference/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)],
+    summary="Inference executor stats",
+    description="Mode, pending calls, rejections, timeouts and worker restarts of the /predict inference pool. Admins only."
+)
+def inference_stats():
+    return inference_executor.stats()
+
+
+@router.get("/cache/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)],
+    summary="Prediction cache stats",
+    description="Size, hit/miss counters and invalidations of the /predict result cache. Admins only."
+)
+def cache_stats():
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+
+# Chatbot Route
+
+# Shared async client for the Hugging Face inference API (pooled connections, timeouts, retries)
+hf_client = HFClient()
+
+
+def build_health_summary(request: ChatRequest, username: str = None) -> str:
+    """ Prompt sent to the LLM for a user's prediction; without a username it names nobody. """
+    return (
+        f"{f'User {username}' if username else 'The patient'} has a {request.prediction} diabetes risk "
+        f"with a probability of {request.probability}.\n"
+        f"Health details:\n"
+        f"- Glucose: {request.glucose}\n"
+        f"- Blood Pressure: {request.blood_pressure}\n"
+        f"- Insulin: {request.insulin}\n"
+        f"- BMI: {request.bmi}\n"
+        f"- Age: {request.age}\n"
+        f"- Diabetes Pedigree Function: {request.diabetes_pedigree_function}\n"
+        f"Provide **concise** health recommendations for diabetes prevention and management "
+        f"in **bullet points** (avoid unnecessary introductions)."
+    )
+
+
+# Number of leading lines of the generated text that echo the prompt back
+PROMPT_ECHO_LINES = 10
+
+
+def format_advice(bot_response: str) -> str:
+    """ Drop the echoed prompt from the generated text and return the advice lines. """
+    advice_lines = bot_response.split("\n")
+    structured_advice = []
+    count = 0
+    for line in advice_lines:
+        line = line.strip()
+        # Ignore lines that contain "User", "Health details", or input summary
+        if count < PROMPT_ECHO_LINES :
+            count = count + 1
+            continue
+        structured_advice.append(f"{line}")
+    return "\n".join(structured_advice)
+
+
+class PromptEchoFilter:
+    """ Incremental version of format_advice for streamed text.
+
+    Chunks are split into lines as they arrive. Leading lines that repeat the
+    prompt (and blank lines around them) are dropped, every later line is
+    returned as soon as it is complete. Matching on the prompt rather than a
+    fixed line count matters here because streamed generations usually do
+    not echo the prompt at all.
+    """
+
+    def __init__(self, prompt: str):
+        self.prompt_lines = [line.strip() for line in prompt.split("\n")]
+        self.echo_index = 0
+        self.in_echo = True
+        self.buffer = ""
+
+    def _accept(self, line: str):
+        line = line.strip()
+        if self.in_echo:
+            if self.echo_index < len(self.prompt_lines) and line == self.prompt_lines[self.echo_index]:
+                self.echo_index += 1
+                return None
+            if not line:
+                return None
+            self.in_echo = False
+        return line
+
+    def feed(self, chunk: str) -> list:
+        """ Add a chunk of generated text, return the advice lines it completed. """
+        *complete, self.buffer = (self.buffer + chunk).split("\n")
+        return [line for line in map(self._accept, complete) if line is not None]
+
+    def flush(self) -> list:
+        """ Return the last, unterminated line once the stream has ended. """
+        line, self.buffer = self._accept(self.buffer), ""
+        return [line] if line else []
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat", status_code=status.HTTP_200_OK, dependencies=[Depends(limit_chat)])
+async def chat(request: ChatRequest, user: UserResponse = Depends(get_current_user)):
+    """ Chatbot providing health advice based on diabetes risk prediction. """
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized: Please log in first.")
+
+    # Construct user health summary (cached advice is shared between users, so it must not be personal)
+    health_summary = build_health_summary(request, None if advice_cache is not None else user.username)
+
+    async def generate():
+        bot_response = await hf_client.generate(health_summary)
+        logger.debug("Model generated text: %s", bot_response)
+        return format_advice(bot_response)
+
+    cache_key = advice_cache.key(request) if advice_cache is not None else None
+    try:
+        if cache_key is not None:
+            advice = await advice_cache.get_or_generate(cache_key, generate)
+        else:
+            advice = await generate()
+    except HFClientError as e:
+        logger.error(f"Hugging Face API Error: {e}")
+        raise HTTPException(status_code=e.status_code, detail="Chatbot service error.")
+    except Exception as e:
+        logger.error(f"Chatbot error: {e}")
+        raise HTTPException(status_code=500, detail="Chatbot service error.")
+
+    logger.info("chat advice", extra={"user": user.username, "advice_lines": advice.count("\n") + 1})
+    return {"advice": advice}
+
+
+@router.get("/chat/cache/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)],
+    summary="Advice cache stats",
+    description="Size, hit rate and bin widths of the /chat advice cache. Admins only."
+)
+def advice_cache_stats():
+    if advice_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **advice_cache.stats()}
+
+
+async def stream_advice(health_summary: str, username: str, cache_key: str = None):
+    """ Server-sent events: one "line" event per advice line, then "done" (or "error"). """
+    if cache_key is not None:
+        cached = advice_cache.get(cache_key)
+        if cached is not None:
+            for line in cached.split("\n"):
+                yield sse_event("line", {"line": line})
+            yield sse_event("done", {"advice": cached})
+            return
+        advice_cache.record_miss()
+
+    started = time.perf_counter()
+    first_line_ms = None
+    echo_filter = PromptEchoFilter(health_summary)
+    advice_lines = []
+    try:
+        async for chunk in hf_client.stream(health_summary):
+            for line in echo_filter.feed(chunk):
+                if first_line_ms is None:
+                    first_line_ms = (time.perf_counter() - started) * 1000
+                advice_lines.append(line)
+                yield sse_event("line", {"line": line})
+        for line in echo_filter.flush():
+            if first_line_ms is None:
+                first_line_ms = (time.perf_counter() - started) * 1000
+            advice_lines.append(line)
+            yield sse_event("line", {"line": line})
+    except HFClientError as e:
+        logger.error(f"Hugging Face API Error: {e}")
+        yield sse_event("error", {"status_code": e.status_code, "detail": "Chatbot service error."})
+        return
+    except Exception as e:
+        logger.error(f"Chatbot error: {e}")
+        yield sse_event("error", {"status_code": 500, "detail": "Chatbot service error."})
+        return
+
+    logger.info("streamed advice", extra={
+        "user": username,
+        "advice_lines": len(advice_lines),
+        "first_line_ms": round(first_line_ms, 1) if first_line_ms is not None else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    advice = "\n".join(advice_lines)
+    if cache_key is not None:
+        advice_cache.put(cache_key, advice)
+    yield sse_event("done", {"advice": advice})
+
+
+@router.post("/chat/stream", status_code=status.HTTP_200_OK, dependencies=[Depends(limit_chat)],
+    summary="Stream health advice",
+    description="Same as /chat, but advice lines are sent as server-sent events as soon as the model produces them."
+)
+async def chat_stream(request: ChatRequest, user: UserResponse = Depends(get_current_user)):
+    """ Streaming chatbot: forwards advice lines while the model is still generating. """
+    health_summary = build_health_summary(request, None if advice_cache is not None else user.username)
+    cache_key = advice_cache.key(request) if advice_cache is not None else None
+    return StreamingResponse(
+        stream_advice(health_summary, user.username, cache_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
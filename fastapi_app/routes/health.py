@@ -0,0 +1,81 @@
+import time
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import text
+
+from ..database import async_engine
+from ..metrics import CONTENT_TYPE, registry as metrics_registry
+from . import diabetes
+
+
+class Lifecycle:
+    """ Startup/shutdown phase of the app, set by the lifespan and read by the probes. """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = False
+        self.draining = False
+        self.startup_ms = None
+        self.steps = {}
+
+    def begin(self):
+        # A restarted lifespan (e.g. in tests) is timed from its own start, the first one from the import
+        if self.startup_ms is not None:
+            self.started_at = time.perf_counter()
+        self.ready = self.draining = False
+        self.steps = {}
+
+    def step_done(self, name: str, started: float):
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def mark_ready(self):
+        self.startup_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        self.ready = True
+
+
+lifecycle = Lifecycle()
+
+router = APIRouter()
+
+
+@router.get("/health/live", status_code=status.HTTP_200_OK,
+    summary="Liveness probe",
+    description="200 as long as the process is serving requests. Restart the container when this fails."
+)
+def live():
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", status_code=status.HTTP_200_OK,
+    summary="Readiness probe",
+    description="200 once startup finished, a model is active and the database answers; 503 otherwise and while draining."
+)
+async def ready():
+    problems = []
+    if lifecycle.draining:
+        problems.append("draining")
+    if not lifecycle.ready:
+        problems.append("starting")
+    if diabetes.registry.active is None:
+        problems.append("no active model")
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        problems.append(f"database: {e.__class__.__name__}")
+
+    body = {
+        "status": "not ready" if problems else "ready",
+        "problems": problems,
+        "model_version": diabetes.registry.active.version if diabetes.registry.active is not None else None,
+        "startup_ms": lifecycle.startup_ms,
+        "startup_steps_ms": lifecycle.steps,
+    }
+    return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE if problems else status.HTTP_200_OK)
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """ Prometheus text exposition of the request, model, auth, bcrypt and upstream metrics. """
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,82 @@
+import base64
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..history import FEATURE_COLUMNS
+from ..models.prediction import Prediction
+from ..schemas.diabetes import PredictionHistoryResponse
+from ..schemas.user import UserResponse
+from ..utils import get_admin_user, get_current_user
+from . import diabetes
+
+router = APIRouter()
+
+
+def encode_cursor(created_at: datetime, prediction_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{prediction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """ Inverse of encode_cursor: (created_at, id) of the last row already returned. """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, prediction_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(prediction_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+@router.get("/predictions", response_model=PredictionHistoryResponse, status_code=status.HTTP_200_OK,
+    summary="Prediction history",
+    description="Past predictions of the authenticated user, newest first. Pass next_cursor back as cursor for the next page."
+)
+async def list_predictions(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+    user: UserResponse = Depends(get_current_user)
+):
+    # Keyset pagination on (created_at, id): every page is an index range scan, however deep
+    query = select(Prediction).where(Prediction.user_id == user.id)
+    if cursor:
+        created_at, prediction_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Prediction.created_at < created_at,
+            and_(Prediction.created_at == created_at, Prediction.id < prediction_id)
+        ))
+    query = query.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "prediction": row.prediction,
+                "probability": row.probability,
+                "features": {field: getattr(row, column) for field, column in FEATURE_COLUMNS.items()},
+                "model_version": row.model_version,
+                "created_at": row.created_at,
+            }
+            for row in page
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/predictions/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)],
+    summary="Prediction history writer stats",
+    description="Queue depth, rows written/dropped and flush sizes of the write-behind prediction writer. Admins only."
+)
+def prediction_writer_stats():
+    # Looked up per call: the writer is created by the app lifespan
+    prediction_writer = diabetes.prediction_writer
+    if prediction_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_writer.stats()}
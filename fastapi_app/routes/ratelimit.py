@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends, status
+from ..ratelimit import expensive_limiter, login_limiter, predict_limiter, register_limiter
+from ..utils import get_admin_user
+
+# Every route here needs an admin (see ADMIN_USERNAMES)
+router = APIRouter(dependencies=[Depends(get_admin_user)])
+
+
+@router.get("/ratelimit/stats", status_code=status.HTTP_200_OK,
+    summary="Rate limit stats",
+    description="Budgets, tracked identities and allowed/limited counts of every token-bucket limiter. Admins only."
+)
+def rate_limit_stats():
+    return {"predict": predict_limiter.stats(), "expensive": expensive_limiter.stats(),
+            "login": login_limiter.stats(), "register": register_limiter.stats()}
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas.user import UserBase, UserResponse, UpdatePasswordRequest, UserDeleteRequest
 from ..utils import hash_password, verify_password
 from ..models.user import User
-from ..utils import get_current_user
-from ..database import get_db
+from ..utils import get_admin_user, get_current_user, get_current_user_from_db, invalidate_user_cache, user_cache
+from ..database import get_async_db
 
 router = APIRouter()
 
@@ -23,20 +24,32 @@ def welcome_user(user: User = Depends(get_current_user)):
 
 
 
+@router.get("/cache/stats",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_admin_user)],
+    summary="User cache stats",
+    description="How many database lookups get_current_user avoided. Admins only."
+)
+def user_cache_stats():
+    if user_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **user_cache.stats()}
+
+
 @router.put("/update", response_model=UserResponse, status_code=status.HTTP_200_OK)
-def update_user(
+async def update_user(
     user_update: UserBase,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_from_db)
 ):
     # Ensure current_user exists
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found.")
 
     # Check if email is already taken (Excluding current user)
-    existing_user = db.query(User).filter(
+    existing_user = (await db.execute(select(User).where(
         User.email == user_update.email, User.id != current_user.id
-    ).first()
+    ))).scalars().first()
 
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already in use.")
@@ -46,41 +59,43 @@ def update_user(
     current_user.email = user_update.email
 
     try:
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    invalidate_user_cache(current_user.id)
 
     return UserResponse(id=current_user.id, username=current_user.username, email=current_user.email)
 
 
 @router.put("/update-password", status_code=status.HTTP_200_OK)
-def update_password(
+async def update_password(
     password_data: UpdatePasswordRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_from_db)
 ):
     # Verify old password
-    if not verify_password(password_data.old_password, current_user.password_hash):
+    if not await verify_password(password_data.old_password, current_user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect old password.")
 
     # Hash new password & update
-    current_user.password_hash = hash_password(password_data.new_password)
+    current_user.password_hash = await hash_password(password_data.new_password)
     try:
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    invalidate_user_cache(current_user.id)
     
     return {"message": "Password updated successfully!"}
 
 @router.delete("/delete", status_code=status.HTTP_200_OK)
-def delete_user(
+async def delete_user(
     password_data: UserDeleteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_from_db)
 ):
     # Warning Message (Before Deletion)
     warning_message = {
@@ -89,12 +104,13 @@ def delete_user(
     }
 
     # Verify password before deletion
-    if not verify_password(password_data.password, current_user.password_hash):
+    if not await verify_password(password_data.password, current_user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect password.")
 
     # Proceed with deletion
-    db.delete(current_user)
-    db.commit()
+    await db.delete(current_user)
+    await db.commit()
+    invalidate_user_cache(current_user.id)
 
     return {
         "message": "Account deleted successfully!",
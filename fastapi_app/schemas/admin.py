@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+# Load a model artifact into the registry
+class ModelLoadRequest(BaseModel):
+    path: str = Field(description="Artifact file name, relative to MODEL_REGISTRY_DIR")
+    name: Optional[str] = Field(None, description="Display name (defaults to the file name)")
+    activate: bool = Field(False, description="Activate right after it passes the canary checks")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "path": "diabetes_model.pkl",
+                "name": "retrained-2025-03",
+                "activate": False
+            }
+        }
+
+# Weighted traffic split between loaded versions (empty = everything goes to the active version)
+class ModelSplitRequest(BaseModel):
+    weights: Dict[str, float] = Field(default_factory=dict, description="Model version -> share of /predict traffic")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "weights": {"8d992415291d": 0.9, "1f2e3d4c5b6a": 0.1}
+            }
+        }
@@ -1,64 +1,183 @@
-from pydantic import BaseModel, Field
-from typing import Dict
-
-# Input Schema
-class DiabetesInput(BaseModel):
-    Pregnancies: float = Field(..., ge=0, description="Number of times pregnant")
-    Glucose: float = Field(..., ge=0, description="Plasma glucose concentration")
-    BloodPressure: float = Field(..., ge=0, description="Diastolic blood pressure")
-    Insulin: float = Field(..., ge=0, description="2-Hour serum insulin")
-    BMI: float = Field(..., ge=0, description="Body mass index (BMI)")
-    DiabetesPedigreeFunction: float = Field(..., ge=0, description="Diabetes pedigree function")
-    Age: float = Field(..., ge=0, description="Age in years")
-
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "Pregnancies": 2,
-                "Glucose": 120,
-                "BloodPressure": 70,
-                "Insulin": 85,
-                "BMI": 28.5,
-                "DiabetesPedigreeFunction": 0.5,
-                "Age": 35
-            }
-        }
-
-# Response Schema
-class PredictionResponse(BaseModel):
-    prediction: str
-    probability: str
-    message: str
-
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "prediction": "Non-Diabetic",
-                "probability": "23.45%",
-                "message": "Hello, user! Great news! You are not diabetic. Keep maintaining a healthy lifestyle!"
-            }
-        }
-
-class ChatRequest(BaseModel):
-    glucose: float
-    blood_pressure: float
-    insulin: float
-    bmi: float
-    age: int
-    diabetes_pedigree_function: float
-    prediction: str
-    probability: str
-
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "glucose": 140,
-                "blood_pressure": 85,
-                "insulin": 120,
-                "bmi": 28.5,
-                "age": 35,
-                "diabetes_pedigree_function": 0.62,
-                "prediction": "Diabetic",
-                "probability": "76.89%"
-            }
-        }
\ No newline at end of file
+import os
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Upper bound on records accepted by /predict/batch in one request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+# Input Schema
+class DiabetesInput(BaseModel):
+    Pregnancies: float = Field(..., ge=0, description="Number of times pregnant")
+    Glucose: float = Field(..., ge=0, description="Plasma glucose concentration")
+    BloodPressure: float = Field(..., ge=0, description="Diastolic blood pressure")
+    Insulin: float = Field(..., ge=0, description="2-Hour serum insulin")
+    BMI: float = Field(..., ge=0, description="Body mass index (BMI)")
+    DiabetesPedigreeFunction: float = Field(..., ge=0, description="Diabetes pedigree function")
+    Age: float = Field(..., ge=0, description="Age in years")
+
+    class Config:
+        # inf/nan would pass ge=0 (or be scored as a max value); the batch, CSV and Arrow paths reject them too
+        allow_inf_nan = False
+        json_schema_extra = {
+            "example": {
+                "Pregnancies": 2,
+                "Glucose": 120,
+                "BloodPressure": 70,
+                "Insulin": 85,
+                "BMI": 28.5,
+                "DiabetesPedigreeFunction": 0.5,
+                "Age": 35
+            }
+        }
+
+# Response Schema
+class PredictionResponse(BaseModel):
+    prediction: str
+    probability: str
+    message: str
+    # Only with ?explain=true: base_value + sum(contributions) is the diabetic probability (0-1)
+    base_value: Optional[float] = None
+    contributions: Optional[Dict[str, float]] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prediction": "Non-Diabetic",
+                "probability": "23.45%",
+                "message": "Hello, user! Great news! You are not diabetic. Keep maintaining a healthy lifestyle!"
+            }
+        }
+
+# Batch Input Schema (rows are validated one by one so a bad row, even one that isn't an object, only fails itself)
+class BatchPredictionRequest(BaseModel):
+    records: List[Any] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE,
+                               description="Patient records shaped like DiabetesInput")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "records": [
+                    {
+                        "Pregnancies": 2,
+                        "Glucose": 120,
+                        "BloodPressure": 70,
+                        "Insulin": 85,
+                        "BMI": 28.5,
+                        "DiabetesPedigreeFunction": 0.5,
+                        "Age": 35
+                    },
+                    {
+                        "Pregnancies": 6,
+                        "Glucose": 148,
+                        "BloodPressure": 72,
+                        "Insulin": 0,
+                        "BMI": 33.6,
+                        "DiabetesPedigreeFunction": 0.627,
+                        "Age": 50
+                    }
+                ]
+            }
+        }
+
+# Batch Response Schema (one item per input record, same order)
+class BatchPredictionItem(BaseModel):
+    index: int
+    prediction: Optional[str] = None
+    probability: Optional[str] = None
+    message: Optional[str] = None
+    contributions: Optional[Dict[str, float]] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
+class BatchPredictionResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    base_value: Optional[float] = None
+    results: List[BatchPredictionItem]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "total": 2,
+                "succeeded": 1,
+                "failed": 1,
+                "results": [
+                    {
+                        "index": 0,
+                        "prediction": "Non-Diabetic",
+                        "probability": "23.45%",
+                        "message": "Hello, user! Great news! You are not diabetic. Keep maintaining a healthy lifestyle!"
+                    },
+                    {
+                        "index": 1,
+                        "errors": [
+                            {"loc": ["Glucose"], "msg": "Input should be greater than or equal to 0", "type": "greater_than_equal"}
+                        ]
+                    }
+                ]
+            }
+        }
+
+class ChatRequest(BaseModel):
+    glucose: float
+    blood_pressure: float
+    insulin: float
+    bmi: float
+    age: int
+    diabetes_pedigree_function: float
+    prediction: str
+    probability: str
+
+    class Config:
+        allow_inf_nan = False
+        json_schema_extra = {
+            "example": {
+                "glucose": 140,
+                "blood_pressure": 85,
+                "insulin": 120,
+                "bmi": 28.5,
+                "age": 35,
+                "diabetes_pedigree_function": 0.62,
+                "prediction": "Diabetic",
+                "probability": "76.89%"
+            }
+        }
+
+# Prediction History Schemas (GET /predictions, newest first)
+class PredictionRecord(BaseModel):
+    id: int
+    prediction: str
+    probability: float
+    features: Dict[str, float]
+    model_version: str
+    created_at: datetime
+
+class PredictionHistoryResponse(BaseModel):
+    items: List[PredictionRecord]
+    next_cursor: Optional[str] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {
+                        "id": 42,
+                        "prediction": "Diabetic",
+                        "probability": 0.7689,
+                        "features": {
+                            "Pregnancies": 6,
+                            "Glucose": 148,
+                            "BloodPressure": 72,
+                            "Insulin": 0,
+                            "BMI": 33.6,
+                            "DiabetesPedigreeFunction": 0.627,
+                            "Age": 50
+                        },
+                        "model_version": "8d992415291d",
+                        "created_at": "2025-03-01T12:00:00.123456"
+                    }
+                ],
+                "next_cursor": "MjAyNS0wMy0wMVQxMjowMDowMC4xMjM0NTZ8NDI"
+            }
+        }
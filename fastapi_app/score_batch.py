@@ -0,0 +1,255 @@
+"""Offline batch scoring: CSV or Parquet in, predictions with advice out, no HTTP.
+
+    python -m fastapi_app.score_batch cohort.csv scored.csv --workers 8 --chunk-rows 20000
+
+Loads the same model the API activates at startup (MODEL_PATH, or --model),
+reads the input in chunks and scores them on a process pool across all
+cores. Results are written in input order as CSV with the columns row,
+prediction, probability, advice and error; row N is the Nth record after the
+header (one line, unless a quoted field has line breaks in it), and blank
+lines are skipped but still counted. Progress is checkpointed after
+every written chunk; rerun with --resume after an interruption to continue
+from the last completed chunk. Parquet input needs pyarrow.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .cohort import DEFAULT_COLUMN_MAP, check_ranges, in_quotes, parse_column_map, parse_lines, resolve_columns, rows_to_matrix
+from .executor import _worker_init, _worker_model, spawn_context
+
+OUTPUT_HEADER = ["row", "prediction", "probability", "advice", "error"]
+
+
+# Run inside the worker processes
+def _score(model_key, X, features, errors):
+    valid = check_ranges(X, features, errors)
+    labels = np.full(len(X), -1, dtype=np.int64)
+    probabilities = np.full(len(X), np.nan)
+    if valid.any():
+        model = _worker_model(*model_key)
+        proba = model.predict_proba(X[valid])
+        labels[valid] = np.asarray(model.classes_)[np.argmax(proba, axis=1)]
+        probabilities[valid] = proba[:, 1]
+    return labels, probabilities, errors
+
+
+def _score_csv_chunk(model_key, data: bytes, indices, features):
+    """ Like _score, plus the positions of blank lines, which have no result but still count as rows. """
+    rows = parse_lines(data.decode("utf-8"))
+    lines = [position for position, row in enumerate(rows) if row]
+    X, _, errors = rows_to_matrix([rows[position] for position in lines], indices, features)
+    labels, probabilities, errors = _score(model_key, X, features, errors)
+    if len(lines) == len(rows):
+        return labels, probabilities, errors, []
+    # Spread the results back over every line of the chunk
+    all_labels = np.full(len(rows), -1, dtype=np.int64)
+    all_probabilities = np.full(len(rows), np.nan)
+    all_labels[lines] = labels
+    all_probabilities[lines] = probabilities
+    errors = {lines[position]: row_errors for position, row_errors in errors.items()}
+    blank = sorted(set(range(len(rows))).difference(lines))
+    return all_labels, all_probabilities, errors, blank
+
+
+def _score_matrix_chunk(model_key, X, features):
+    return (*_score(model_key, X, features, {}), [])
+
+
+def csv_chunks(path: Path, chunk_rows: int, column_map: dict, features, start_offset: int = None):
+    """ Yield (task args, input offset after the chunk); the first item is the resolved column indices. """
+    with open(path, "rb") as f:
+        # Blank lines before the header don't count as rows
+        line = f.readline().decode("utf-8-sig")
+        while line and not line.strip():
+            line = f.readline().decode("utf-8")
+        header = next(csv.reader([line]))
+        indices = resolve_columns(header, features, column_map)
+        yield indices
+        if start_offset is not None:
+            f.seek(start_offset)
+        while True:
+            lines = [f.readline() for _ in range(chunk_rows)]
+            data = b"".join(lines)
+            if not data:
+                return
+            # Don't end a chunk inside a quoted field that has a line break in it
+            quoted = b'"' in data and in_quotes(data.decode("utf-8", errors="replace"))
+            while quoted:
+                line = f.readline()
+                if not line:
+                    break
+                data += line
+                quoted = in_quotes(line.decode("utf-8", errors="replace"), quoted)
+            yield (_score_csv_chunk, data, indices, features), f.tell()
+
+
+def parquet_chunks(path: Path, chunk_rows: int, column_map: dict, features, start_offset: int = None):
+    """ Same as csv_chunks for Parquet; the offset is the number of rows consumed. """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet input needs pyarrow: pip install pyarrow")
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    indices = resolve_columns(names, features, column_map)
+    yield indices
+    columns = [names[i] for i in indices]
+    offset = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+        offset += batch.num_rows
+        if start_offset is not None and offset <= start_offset:
+            continue
+        X = np.column_stack([batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64) for name in columns])
+        yield (_score_matrix_chunk, X, features), offset
+
+
+class Checkpoint:
+    """ Progress of one run, kept next to the output so --resume can pick up after the last written chunk. """
+
+    def __init__(self, output: Path):
+        self.path = output.with_name(output.name + ".progress")
+
+    def load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: dict):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def format_rows(first_row: int, labels, probabilities, errors, generate_advice, blank=()) -> list:
+    rows = []
+    blank = set(blank)
+    for position, (label, probability) in enumerate(zip(labels.tolist(), probabilities.tolist())):
+        if position in blank:
+            continue
+        row_errors = errors.get(position)
+        if row_errors:
+            error = "; ".join(f"{e['loc'][0]}: {e['msg']}" for e in row_errors)
+            rows.append([first_row + position, "", "", "", error])
+            continue
+        result = "Diabetic" if label == 1 else "Non-Diabetic"
+        rows.append([first_row + position, result, f"{probability:.4f}", generate_advice(label, probability), ""])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help=".csv or .parquet file shaped like model_preparation/diabetes.csv")
+    parser.add_argument("output", type=Path, help="output CSV")
+    parser.add_argument("--model", type=Path, help="model artifact (default: MODEL_PATH, as used by the API)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (default: all cores)")
+    parser.add_argument("--chunk-rows", type=int, default=20000, help="rows per task sent to a worker")
+    parser.add_argument("--columns", default="", help="extra column renames, e.g. Gluc=Glucose (Preg/BPressure are built in)")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run from its last completed chunk")
+    args = parser.parse_args()
+
+    # Imported here rather than at the top so the spawned workers don't load the web app
+    from .registry import ModelRegistry
+    from .routes.diabetes import FEATURE_ORDER, INFERENCE_ENGINE, MODEL_PATH, MODEL_STORE_DIR, generate_advice
+
+    registry = ModelRegistry(INFERENCE_ENGINE, store_dir=MODEL_STORE_DIR)
+    model_version = registry.load(args.model or MODEL_PATH, activate=True)
+    model_key = (model_version.version, str(model_version.path), model_version.engine)
+    column_map = parse_column_map(args.columns) if args.columns else dict(DEFAULT_COLUMN_MAP)
+
+    stat = args.input.stat()
+    run = {
+        "input": str(args.input.resolve()), "input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns,
+        "chunk_rows": args.chunk_rows, "model_version": model_version.version,
+    }
+    checkpoint = Checkpoint(args.output)
+    state = checkpoint.load() if args.resume else None
+    if args.resume and state is None:
+        print(f"No checkpoint at {checkpoint.path}, starting from the beginning", file=sys.stderr)
+    if state is not None and state["run"] != run:
+        raise SystemExit(f"{checkpoint.path} belongs to a different input, chunk size or model; rerun without --resume")
+
+    reader = parquet_chunks if args.input.suffix.lower() in (".parquet", ".pq") else csv_chunks
+    chunks = reader(args.input, args.chunk_rows, column_map, FEATURE_ORDER, state["input_offset"] if state else None)
+    try:
+        next(chunks)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if state is None:
+        state = {"run": run, "input_offset": None, "output_bytes": 0, "rows": 0, "scored": 0, "rejected": 0}
+        output = open(args.output, "w", newline="")
+        csv.writer(output).writerow(OUTPUT_HEADER)
+    else:
+        output = open(args.output, "r+", newline="")
+        # Drop anything written after the last checkpoint
+        output.truncate(state["output_bytes"])
+        output.seek(state["output_bytes"])
+    writer = csv.writer(output)
+
+    resumed_rows = state["rows"]
+    started = time.perf_counter()
+    last_report = started
+    pool = ProcessPoolExecutor(
+        max(1, args.workers), mp_context=spawn_context(), initializer=_worker_init, initargs=model_key
+    )
+    try:
+        # Keep every worker busy but only a bounded number of chunks in memory; results are written in input order
+        inflight = deque()
+        for task, input_offset in chunks:
+            fn, *task_args = task
+            inflight.append((pool.submit(fn, model_key, *task_args), input_offset))
+            while len(inflight) >= args.workers * 2 or (inflight and inflight[0][0].done()):
+                write_result(inflight.popleft(), state, writer, output, checkpoint, generate_advice)
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                report(state, resumed_rows, now - started, file=sys.stderr)
+                last_report = now
+        while inflight:
+            write_result(inflight.popleft(), state, writer, output, checkpoint, generate_advice)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        output.close()
+        raise SystemExit(f"Interrupted after {state['rows']} rows; rerun with --resume to continue")
+    pool.shutdown()
+    output.close()
+    checkpoint.clear()
+    report(state, resumed_rows, time.perf_counter() - started, done=True)
+
+
+def write_result(item, state, writer, output, checkpoint, generate_advice):
+    future, input_offset = item
+    labels, probabilities, errors, blank = future.result()
+    writer.writerows(format_rows(state["rows"] + 1, labels, probabilities, errors, generate_advice, blank))
+    output.flush()
+    os.fsync(output.fileno())
+    state["rows"] += len(labels)
+    state["rejected"] += len(errors)
+    state["scored"] += len(labels) - len(errors) - len(blank)
+    state["input_offset"] = input_offset
+    state["output_bytes"] = output.tell()
+    checkpoint.save(state)
+
+
+def report(state, resumed_rows, elapsed, done=False, file=sys.stdout):
+    rows = state["rows"] - resumed_rows
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    prefix = "done:" if done else "progress:"
+    print(f"{prefix} {state['rows']} rows ({state['scored']} scored, {state['rejected']} rejected), "
+          f"{rate:,.0f} rows/s over {elapsed:.1f}s", file=file, flush=True)
+
+
+if __name__ == "__main__":
+    main()
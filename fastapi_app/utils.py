@@ -1,12 +1,17 @@
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from .models.user import User
 from .schemas.user import UserResponse
-from .database import get_db
+from .database import get_async_db, AsyncSessionLocal
+from .cache import UserCache
+from .passwords import PasswordHasher, PasswordPoolBusy
+from .metrics import auth_user_lookup_seconds, bcrypt_seconds
+import os
+import time
 
 
 # Secret Key (Keep it secure in a real project)
@@ -14,8 +19,16 @@ SECRET_KEY = "your_secret_key_here" # generate the secret key using the code sec
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cache of resolved users so protected routes skip the DB lookup (TTL capped at token lifetime)
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = min(float(os.getenv("USER_CACHE_TTL", "300")), ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# Usernames allowed to call the /admin endpoints (comma separated, empty = nobody)
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+# Password hashing on a dedicated bcrypt worker pool (see passwords.py for settings)
+password_hasher = PasswordHasher()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
 # exception while login
@@ -25,13 +38,32 @@ credentials_exception = HTTPException(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-# Function to hash password
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# exception when the bcrypt pool is saturated
+password_pool_busy_exception = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+# Function to hash password (awaits the bcrypt pool, the event loop stays free)
+async def hash_password(password: str) -> str:
+    try:
+        with bcrypt_seconds.time("hash"):
+            return await password_hasher.hash_async(password)
+    except PasswordPoolBusy:
+        raise password_pool_busy_exception
 
 # Function to verify password
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        with bcrypt_seconds.time("verify"):
+            return await password_hasher.verify_async(plain_password, hashed_password)
+    except PasswordPoolBusy:
+        raise password_pool_busy_exception
+
+# True when a stored hash was made with another bcrypt cost than the configured one
+def password_needs_rehash(hashed_password: str) -> bool:
+    return password_hasher.needs_rehash(hashed_password)
 
 # Function to create JWT token
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -49,7 +81,26 @@ def verify_access_token(token: str):
         return None  # Invalid token
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+class CachedUser:
+    """ Detached, read-only copy of a User row that can be shared between requests. """
+    __slots__ = ("id", "username", "email", "password_hash")
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.password_hash = user.password_hash
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL) if USER_CACHE_ENABLED else None
+
+# Call after changing or deleting a user so stale identities are never served
+def invalidate_user_cache(user_id: int):
+    if user_cache is not None:
+        user_cache.invalidate_user(user_id)
+
+
+def _decode_token_or_401(token: str) -> dict:
     payload = verify_access_token(token)
     if not payload:
         raise HTTPException(
@@ -57,8 +108,12 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    username = payload.get("sub")
-    db_user = db.query(User).filter(User.username == username).first()
+    return payload
+
+
+async def _lookup_user_or_401(db: AsyncSession, username: str) -> User:
+    result = await db.execute(select(User).where(User.username == username))
+    db_user = result.scalars().first()
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,7 +123,36 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return db_user
 
 
+# Read-only identity for protected routes, served from user_cache when possible
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    started = time.perf_counter()
+    if user_cache is not None:
+        cached = user_cache.get(token)
+        if cached is not None:
+            auth_user_lookup_seconds.observe(time.perf_counter() - started, "hit")
+            return cached
+
+    payload = _decode_token_or_401(token)
+    # Taken before the read, so a row that changes while we wait for it isn't cached
+    generation = user_cache.generation() if user_cache is not None else None
+    # Only open a session on a cache miss
+    async with AsyncSessionLocal() as db:
+        db_user = await _lookup_user_or_401(db, payload.get("sub"))
+    auth_user_lookup_seconds.observe(time.perf_counter() - started, "miss")
+    current_user = CachedUser(db_user)
+    if user_cache is not None:
+        user_cache.put(token, current_user, payload["exp"], generation)
+    return current_user
+
+
+# Session-bound User row, for routes that modify or delete the account
+async def get_current_user_from_db(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    payload = _decode_token_or_401(token)
+    return await _lookup_user_or_401(db, payload.get("sub"))
 
 
-    
-    
\ No newline at end of file
+# Protected admin routes: a logged-in user listed in ADMIN_USERNAMES
+async def get_admin_user(user: UserResponse = Depends(get_current_user)):
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
+    return user
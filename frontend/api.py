@@ -0,0 +1,164 @@
+import json
+import os
+from http.cookiejar import DefaultCookiePolicy
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+# Backend location and limits (the defaults match running both apps on one machine)
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000").rstrip("/")
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3"))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "15"))
+# Advice streams from the LLM, so allow more time between lines
+API_CHAT_TIMEOUT = float(os.getenv("API_CHAT_TIMEOUT", "120"))
+# Keep-alive connections kept open to the backend
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+# Seconds a fetched profile is reused for the same token (0 turns the cache off)
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "30"))
+
+
+class ApiClient:
+    """ Every backend call of the frontend, over one pool of keep-alive connections.
+
+    requests.Session is not thread-safe, so each thread (every Streamlit
+    session runs its script on its own) gets its own session; they all share
+    one HTTPAdapter, whose connection pool is. Sessions keep no cookies: the
+    backend authenticates with bearer tokens, and users must not share a jar.
+
+    Profiles are cached per token for PROFILE_CACHE_TTL seconds, so Streamlit
+    reruns don't refetch them, and dropped once a change to the account has
+    been sent. Methods return the requests.Response so pages can show status
+    and body as before.
+    """
+
+    def __init__(self, base_url: str = API_BASE_URL, pool_size: int = API_POOL_SIZE):
+        self.base_url = base_url
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._local = threading.local()
+        self._profiles = {}
+        # Bumped by every forget_profile(), so a fetch that overlapped a change doesn't cache what it read
+        self._profiles_generation = 0
+        self._profiles_lock = threading.Lock()
+        # Background requests (advice streams) started while the page is still rendering
+        self._background = ThreadPoolExecutor(max(1, pool_size // 2), thread_name_prefix="api")
+
+    @property
+    def session(self) -> requests.Session:
+        """ This thread's session. """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _request(self, method: str, path: str, token: str = None, timeout: float = API_TIMEOUT, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return self.session.request(method, self.base_url + path, headers=headers,
+                                    timeout=(API_CONNECT_TIMEOUT, timeout), **kwargs)
+
+    # Authentication
+
+    def login(self, username: str, password: str):
+        return self._request("POST", "/login", data={"username": username, "password": password})
+
+    def register(self, username: str, email: str, password: str):
+        return self._request("POST", "/register", json={"username": username, "email": email, "password": password})
+
+    # Profile
+
+    def get_profile(self, token: str):
+        """ GET /profile, answered from the cache while a successful response for this token is fresh. """
+        now = time.monotonic()
+        with self._profiles_lock:
+            cached = self._profiles.get(token)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+            generation = self._profiles_generation
+        response = self._request("GET", "/profile", token)
+        if response.status_code == 200 and PROFILE_CACHE_TTL > 0:
+            with self._profiles_lock:
+                if generation != self._profiles_generation:
+                    # An account changed while this was in flight; it may be the old profile
+                    return response
+                # Drop expired entries so tokens of logged-out users don't pile up
+                for key in [key for key, (expires_at, _) in self._profiles.items() if expires_at <= now]:
+                    del self._profiles[key]
+                self._profiles[token] = (now + PROFILE_CACHE_TTL, response)
+        return response
+
+    def forget_profile(self, token: str):
+        with self._profiles_lock:
+            self._profiles.pop(token, None)
+            self._profiles_generation += 1
+
+    def update_profile(self, token: str, username: str, email: str):
+        try:
+            return self._request("PUT", "/users/update", token, json={"username": username, "email": email})
+        finally:
+            # After the change, so a rerun during the request can't cache the old profile again
+            self.forget_profile(token)
+
+    def update_password(self, token: str, old_password: str, new_password: str):
+        return self._request("PUT", "/users/update-password", token,
+                             json={"old_password": old_password, "new_password": new_password})
+
+    def delete_account(self, token: str, password: str):
+        try:
+            return self._request("DELETE", "/users/delete", token, json={"password": password})
+        finally:
+            self.forget_profile(token)
+
+    # Prediction and advice
+
+    def predict(self, token: str, input_data: dict):
+        return self._request("POST", "/predict", token, json=input_data)
+
+    def stream_advice(self, token: str, chatbot_message: dict):
+        """ Yield (event, data) pairs from the streaming chatbot endpoint. """
+        with self._request("POST", "/chat/stream", token, timeout=API_CHAT_TIMEOUT, json=chatbot_message,
+                           stream=True) as response:
+            if response.status_code != 200:
+                yield "error", {"status_code": response.status_code, "detail": response.text}
+                return
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):])
+
+    def start_advice(self, token: str, chatbot_message: dict) -> queue.Queue:
+        """ Start stream_advice in the background and return a queue of its (event, data) pairs, ended by None.
+
+        The request is already on its way while the caller renders the
+        prediction; read the advice with iter(events.get, None).
+        """
+        events = queue.Queue()
+
+        def run():
+            try:
+                for item in self.stream_advice(token, chatbot_message):
+                    events.put(item)
+            except requests.RequestException as e:
+                events.put(("error", {"status_code": None, "detail": str(e)}))
+            finally:
+                events.put(None)
+
+        self._background.submit(run)
+        return events
+
+
+# One client per Streamlit server, shared by every session and rerun
+@st.cache_resource
+def get_client() -> ApiClient:
+    return ApiClient()
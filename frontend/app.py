@@ -1,11 +1,7 @@
 import streamlit as st
-import requests
 import predict  
 import profile
-
-# API Endpoints
-LOGIN_URL = "http://127.0.0.1:8000/login"
-REG_URL = "http://127.0.0.1:8000/register"
+from api import get_client
 
 # Initialize session state
 if "page" not in st.session_state:
@@ -34,11 +30,7 @@ def login():
     password = st.text_input("🔑 Password", type="password")
 
     if st.button("Login"):
-        response = requests.post(
-            LOGIN_URL,
-            data={"username": username, "password": password},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
+        response = get_client().login(username, password)
 
         if response.status_code == 200:
             data = response.json()
@@ -60,11 +52,7 @@ def register():
     password = st.text_input("🔑 Password", type="password")
 
     if st.button("Register"):
-        response = requests.post(
-            REG_URL,
-            json={"username": username, "email": email, "password": password},
-            headers={"Content-Type": "application/json"},
-        )
+        response = get_client().register(username, email, password)
 
         if response.status_code == 201:
             st.success(f"✅ User {username} registered successfully!")
@@ -1,10 +1,6 @@
 import streamlit as st
-import requests
-import json
 import profile
-# API Endpoint
-PREDICT_URL = "http://127.0.0.1:8000/predict"  # FastAPI predict endpoint
-CHAT_API_URL = "http://127.0.0.1:8000/chat"
+from api import get_client
 
 # Prediction Page
 def predict():
@@ -39,18 +35,16 @@ def predict():
             return
 
         # Send request to FastAPI
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        response = requests.post(PREDICT_URL, headers=headers, data=json.dumps(input_data))
+        client = get_client()
+        response = client.predict(token, input_data)
         
         if response.status_code == 200:
             result = response.json()
-            st.success(f"🩺 Prediction: {result['prediction']}")
-            st.write(f"📊 Probability: {result['probability']}")
-            st.info(result["message"])
             prediction = result['prediction']
             probability = result['probability']
+            advice = None
             if prediction == "Diabetic" :
-                # send message to the chatbot
+                # send message to the chatbot, in the background while the result below is rendered
                 chatbot_message = {
                     "prediction": prediction,
                     "probability": probability,
@@ -61,20 +55,20 @@ def predict():
                     "age": Age,
                     "diabetes_pedigree_function": DiabetesPedigreeFunction,
                 }
+                advice = client.start_advice(token, chatbot_message)
 
-                chat_response = requests.post(CHAT_API_URL, headers=headers, json=chatbot_message)
-
-                if chat_response.status_code == 200:
-                    bot_advice  = chat_response.json()
-                    
-                    # Display Chatbot Advice
-                    st.subheader("💡 Health Recommendations")
-                    advice_lines = bot_advice['advice'].split("\n")
-                    for line in advice_lines:
-                        st.write(f"✅ {line}")  # Add bullet points for readability
-                else:
-                    st.error("⚠️ Failed to get health advice from AI")
-                    st.write("🔍 Debug Response:", chat_response.status_code, chat_response.text)
+            st.success(f"🩺 Prediction: {result['prediction']}")
+            st.write(f"📊 Probability: {result['probability']}")
+            st.info(result["message"])
+            if advice is not None:
+                # Show each advice line as soon as the backend forwards it
+                st.subheader("💡 Health Recommendations")
+                for event, data in iter(advice.get, None):
+                    if event == "line":
+                        st.write(f"✅ {data['line']}")  # Add bullet points for readability
+                    elif event == "error":
+                        st.error("⚠️ Failed to get health advice from AI")
+                        st.write("🔍 Debug Response:", data.get("status_code"), data.get("detail"))
             
         else:
             st.error("❌ Prediction failed")
@@ -1,13 +1,5 @@
 import streamlit as st
-import requests
-import json
-
-
-# API Endpoint
-PROFILE_URL = "http://127.0.0.1:8000/profile"
-UPDATE_PROFILE_URL = "http://127.0.0.1:8000/users/update"
-UPDATE_PASSWORD_URL = "http://127.0.0.1:8000/users/update-password"
-DELETE_ACCOUNT_URL = "http://127.0.0.1:8000/users/delete"
+from api import get_client
 
 def profile():
     st.title("👤 User Profile")
@@ -19,9 +11,8 @@ def profile():
         st.error("⚠️ Please log in first!")
         return
 
-    # Fetch user profile from API
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(PROFILE_URL, headers=headers)
+    # Fetch user profile from API (cached per token, so reruns and update_profile() don't refetch it)
+    response = get_client().get_profile(token)
 
     if response.status_code == 200:
         user_data = response.json()
@@ -58,8 +49,7 @@ def update_profile():
         st.error("⚠️ Please log in first!")
         return
 
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(PROFILE_URL, headers=headers)
+    response = get_client().get_profile(token)
 
     if response.status_code == 200:
         user_data = response.json()
@@ -71,8 +61,7 @@ def update_profile():
         return  # Stop execution if fetching fails
 
     if st.button("Save Changes"):
-        data = {"username": username, "email": email}
-        update_response = requests.put(UPDATE_PROFILE_URL, headers=headers, json=data)
+        update_response = get_client().update_profile(token, username, email)
 
         if update_response.status_code == 200:
             st.success("✅ Profile updated successfully!")
@@ -98,9 +87,7 @@ def update_password():
             st.error("⚠️ Please log in first!")
             return
         
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        data = {"old_password": old_password, "new_password": new_password}
-        response = requests.put(UPDATE_PASSWORD_URL, headers=headers, data=json.dumps(data))
+        response = get_client().update_password(token, old_password, new_password)
         
         if response.status_code == 200:
             st.success("✅ Password updated successfully!")
@@ -120,9 +107,7 @@ def delete_account():
             st.error("⚠️ Please log in first!")
             return
         
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        data = {"password": password}
-        response = requests.delete(DELETE_ACCOUNT_URL, headers=headers, data=json.dumps(data))
+        response = get_client().delete_account(token, password)
         
         if response.status_code == 200:
             st.success("✅ Account deleted successfully!")
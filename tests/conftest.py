@@ -0,0 +1,30 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app import utils
+from fastapi_app.executor import InferenceExecutor
+from fastapi_app.main import app
+from fastapi_app.registry import ModelRegistry
+from fastapi_app.routes import diabetes
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT / "fastapi_app" / "diabetes_model.pkl"
+
+
+@pytest.fixture
+def scoring_client(monkeypatch, tmp_path):
+    """ Returns setup(writer=None): points the scoring routes at the deployed model and gives a TestClient. """
+    def setup(writer=None):
+        selected = ModelRegistry("numpy", store_dir=tmp_path).load(MODEL_PATH)
+        monkeypatch.setattr(diabetes, "prediction_writer", writer)
+        monkeypatch.setattr(diabetes, "inference_executor", InferenceExecutor("shared"))
+        app.dependency_overrides[diabetes.select_model] = lambda: selected
+        app.dependency_overrides[utils.get_current_user] = lambda: SimpleNamespace(id=7, username="alice")
+        # No lifespan: the model, executor and history writer are all replaced above
+        return TestClient(app)
+
+    yield setup
+    app.dependency_overrides.clear()
@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from fastapi_app.advice_cache import AdviceCache, parse_bins, risk_band
+from fastapi_app.schemas.diabetes import ChatRequest
+
+
+def chat(**changes) -> ChatRequest:
+    fields = {"glucose": 148, "blood_pressure": 72, "insulin": 0, "bmi": 33.6, "age": 50,
+              "diabetes_pedigree_function": 0.627, "prediction": "Diabetic", "probability": "94.81%"}
+    return ChatRequest(**{**fields, **changes})
+
+
+def test_similar_patients_share_a_key():
+    cache = AdviceCache()
+    assert cache.key(chat()) == cache.key(chat(glucose=141, bmi=32.1, age=54))
+    assert cache.key(chat()) != cache.key(chat(glucose=151))
+    # Same bins, different risk band
+    assert cache.key(chat()) != cache.key(chat(probability="60.00%"))
+
+
+def test_risk_bands_and_bins():
+    assert [risk_band("Diabetic", p) for p in ("94%", "60%", "20%", "n/a")] == ["high", "moderate", "low", "unknown"]
+    assert risk_band("Non-Diabetic", "94%") == "none"
+    assert parse_bins("glucose=5")["glucose"] == 5.0
+    with pytest.raises(ValueError):
+        parse_bins("height=3")
+
+
+def test_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = AdviceCache(max_size=2, ttl_seconds=60)
+    cache.put("a", "advice a")
+    cache.put("b", "advice b")
+    cache.get("a")
+    cache.put("c", "advice c")
+    assert cache.get("b") is None and cache.get("a") == "advice a"
+    now[0] += 61
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"]) == (1, 1)
+
+
+def test_concurrent_misses_share_one_call():
+    cache = AdviceCache()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "advice"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_generate("k", generate) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["advice"] * 3
+    assert len(calls) == 1
+    assert cache.get("k") == "advice"
+    assert (cache.stats()["misses"], cache.stats()["coalesced"]) == (1, 2)
+
+
+def test_failures_are_not_cached():
+    cache = AdviceCache()
+
+    async def broken():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_generate("k", broken))
+    assert cache.get("k") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = tmp_path / "advice.db"
+    cache = AdviceCache(path=str(path))
+    cache.put("k", "saved advice")
+    cache.close()
+
+    restarted = AdviceCache(path=str(path))
+    try:
+        assert restarted.get("k") == "saved advice"
+    finally:
+        restarted.close()
+
+
+def test_store_drops_expired_and_oldest_rows(tmp_path):
+    path = tmp_path / "advice.db"
+    cache = AdviceCache(max_size=2, ttl_seconds=60, path=str(path))
+    now = time.time()
+    cache.put("expired", "x", created_at=now - 120)
+    for i, key in enumerate(("old", "newer", "newest")):
+        cache.put(key, key, created_at=now + i)
+    cache.close()
+
+    keys = [row[0] for row in sqlite3.connect(path).execute("SELECT key FROM advice_cache ORDER BY created_at")]
+    assert keys == ["newer", "newest"]
+    restarted = AdviceCache(max_size=2, ttl_seconds=60, path=str(path))
+    try:
+        assert restarted.get("newest") == "newest" and restarted.get("old") is None
+    finally:
+        restarted.close()
+
+
+def test_non_finite_values_skip_the_cache():
+    with pytest.raises(ValueError):
+        chat(glucose=float("inf"))
+    # Built without validation, as if it had got past the schema
+    request = ChatRequest.model_construct(**{**chat().model_dump(), "bmi": float("nan")})
+    assert AdviceCache().key(request) is None
+
+
+def test_cancelled_owner_fails_waiters_with_an_error():
+    cache = AdviceCache()
+    started = asyncio.Event()
+
+    async def generate():
+        started.set()
+        await asyncio.sleep(10)
+        return "advice"
+
+    async def main():
+        owner = asyncio.create_task(cache.get_or_generate("k", generate))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_generate("k", generate))
+        await asyncio.sleep(0)
+        owner.cancel()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await waiter
+        assert owner.cancelled()
+
+    asyncio.run(main())
+    assert cache.get("k") is None
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from fastapi_app.batching import MicroBatcher
+from fastapi_app.executor import InferenceBusy, InferenceTimeout
+
+
+class Recorder:
+    """ score() stand-in: probability of class 1 is the row's first value; remembers every call. """
+
+    def __init__(self, gate: threading.Event = None):
+        self.calls = []
+        self.gate = gate
+
+    def __call__(self, model_version, X):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append((model_version, X.copy()))
+        return np.column_stack([1 - X[:, 0], X[:, 0]])
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(score, **kwargs):
+        batcher = MicroBatcher(lambda: "active", score, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+
+def test_concurrent_rows_share_one_call(make_batcher):
+    score = Recorder()
+    batcher = make_batcher(score, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit([i / 10, 0.0]) for i in range(5)]
+    results = [future.result(5) for future in futures]
+    assert [round(row[1], 6) for row in results] == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert len(score.calls) == 1 and score.calls[0][0] == "active"
+    stats = batcher.stats()
+    assert (stats["batches"], stats["rows"], stats["mean_batch_size"]) == (1, 5, 5.0)
+
+
+def test_batch_closes_at_max_size(make_batcher):
+    score = Recorder()
+    batcher = make_batcher(score, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit([0.5]) for _ in range(4)]
+    for future in futures:
+        future.result(5)
+    assert [len(X) for _, X in score.calls] == [2, 2]
+
+
+def test_pinned_versions_are_scored_separately(make_batcher):
+    score = Recorder()
+    batcher = make_batcher(score, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit([0.1]), batcher.submit([0.2], "canary"), batcher.submit([0.3])]
+    for future in futures:
+        future.result(5)
+    assert sorted((version, len(X)) for version, X in score.calls) == [("active", 2), ("canary", 1)]
+
+
+def test_score_errors_reach_every_caller(make_batcher):
+    def score(model_version, X):
+        raise RuntimeError("model broke")
+
+    batcher = make_batcher(score, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit([0.1]) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model broke"):
+            future.result(5)
+    assert batcher.stats()["errors"] == 1
+
+
+def test_full_queue_is_busy(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(Recorder(gate), max_batch_size=1, max_wait_ms=0, max_queue=2)
+    first = batcher.submit([0.1])
+    # Let the worker pick up the first row and block on the gate
+    while batcher.stats()["queue_depth"]:
+        time.sleep(0.001)
+    queued = [batcher.submit([0.2]), batcher.submit([0.3])]
+    with pytest.raises(InferenceBusy):
+        batcher.submit([0.4])
+    gate.set()
+    for future in [first, *queued]:
+        future.result(5)
+    assert batcher.stats()["rejected"] == 1
+
+
+def test_cancelled_rows_are_not_scored_or_counted(make_batcher):
+    gate = threading.Event()
+    score = Recorder(gate)
+    batcher = make_batcher(score, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit([0.1])
+    while batcher.stats()["queue_depth"]:
+        time.sleep(0.001)
+    # Both wait behind the blocked first batch; one caller gives up
+    abandoned, kept = batcher.submit([0.2]), batcher.submit([0.3])
+    assert abandoned.cancel()
+    gate.set()
+    first.result(5)
+    kept.result(5)
+    assert [X[0, 0] for _, X in score.calls] == [0.1, 0.3]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["rows"], stats["cancelled"]) == (2, 2, 1)
+
+
+def test_async_timeout(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(Recorder(gate), max_batch_size=1, max_wait_ms=0)
+
+    async def call():
+        return await batcher.predict_proba_async([0.1], timeout=0.05)
+
+    with pytest.raises(InferenceTimeout):
+        asyncio.run(call())
+    gate.set()
+    assert batcher.stats()["timeouts"] == 1
+
+
+def test_close_finishes_queued_rows(make_batcher):
+    batcher = make_batcher(Recorder(), max_batch_size=4, max_wait_ms=1000)
+    future = batcher.submit([0.7])
+    batcher.close()
+    assert round(future.result(0)[1], 6) == 0.7
+    with pytest.raises(RuntimeError):
+        batcher.submit([0.1])
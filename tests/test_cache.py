@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_app.cache import PredictionCache, UserCache
+
+
+def user(user_id: int, username: str):
+    return SimpleNamespace(id=user_id, username=username)
+
+
+def test_put_after_invalidation_is_skipped():
+    cache = UserCache()
+    expires = time.time() + 60
+    # A lookup reads the row, the account changes, then the lookup finishes
+    generation = cache.generation()
+    cache.invalidate_user(1)
+    cache.put("token", user(1, "old name"), expires, generation)
+    assert cache.get("token") is None
+
+    # The next lookup starts after the change and is cached as usual
+    cache.put("token", user(1, "new name"), expires, cache.generation())
+    assert cache.get("token").username == "new name"
+
+
+def test_other_users_are_not_affected():
+    cache = UserCache()
+    generation = cache.generation()
+    cache.invalidate_user(2)
+    cache.put("token", user(1, "alice"), time.time() + 60, generation)
+    assert cache.get("token").username == "alice"
+
+
+def test_put_after_clear_is_skipped():
+    cache = UserCache()
+    generation = cache.generation()
+    cache.clear()
+    cache.put("token", user(1, "alice"), time.time() + 60, generation)
+    assert cache.get("token") is None
+
+
+def test_invalidate_drops_every_token_of_the_user():
+    cache = UserCache()
+    expires = time.time() + 60
+    for token in ("a", "b"):
+        cache.put(token, user(1, "alice"), expires)
+    cache.put("c", user(2, "bob"), expires)
+    cache.invalidate_user(1)
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c").username == "bob"
+
+
+def counting(value):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+def test_prediction_hit_after_miss():
+    cache = PredictionCache()
+    compute, calls = counting([0.2, 0.8])
+    assert cache.get_or_compute("v1", [1, 2.0], compute) == [0.2, 0.8]
+    # Same vitals, written differently (int vs float, -0.0 vs 0.0)
+    assert cache.get_or_compute("v1", [1.0, 2], compute) == [0.2, 0.8]
+    assert cache.get_or_compute("v1", [-0.0, 2], counting(1)[0]) == 1
+    assert cache.get_or_compute("v1", [0.0, 2], compute) == 1
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+def test_new_model_version_drops_everything():
+    cache = PredictionCache()
+    cache.get_or_compute("v1", [1], lambda: "old")
+    assert cache.get_or_compute("v2", [1], lambda: "new") == "new"
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["model_version"] == "v2"
+
+
+def test_least_recently_used_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.get_or_compute("v1", [1], lambda: 1)
+    cache.get_or_compute("v1", [2], lambda: 2)
+    cache.get_or_compute("v1", [1], lambda: "recomputed")
+    cache.get_or_compute("v1", [3], lambda: 3)
+    assert cache.get_or_compute("v1", [1], lambda: "recomputed") == 1
+    assert cache.get_or_compute("v1", [2], lambda: "recomputed") == "recomputed"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_expired_entries_are_recomputed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = PredictionCache(ttl_seconds=10)
+    cache.get_or_compute("v1", [1], lambda: "first")
+    now[0] += 11
+    assert cache.get_or_compute("v1", [1], lambda: "second") == "second"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_concurrent_misses_compute_once():
+    cache = PredictionCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute("v1", [1], compute)))
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_compute("v1", [1], compute)))
+    waiter.start()
+    while cache.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert results == ["value", "value"] and len(calls) == 1
+
+
+def test_failures_are_not_cached():
+    cache = PredictionCache()
+
+    def broken():
+        raise RuntimeError("model broke")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("v1", [1], broken)
+    assert cache.get_or_compute("v1", [1], lambda: "ok") == "ok"
+
+
+def test_result_for_a_replaced_version_is_not_stored():
+    cache = PredictionCache()
+
+    def compute():
+        # The model is swapped while this one is still computing
+        cache.get_or_compute("v2", [9], lambda: "other")
+        return "stale"
+
+    assert cache.get_or_compute("v1", [1], compute) == "stale"
+    assert cache.stats()["size"] == 1
+    assert cache.get_or_compute("v2", [1], lambda: "fresh") == "fresh"
+
+
+def test_async_compute_is_shared():
+    cache = PredictionCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute_async("v1", [1], compute) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["value"] * 3
+    assert len(calls) == 1
@@ -0,0 +1,103 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app import utils
+from fastapi_app.advice_cache import AdviceCache
+from fastapi_app.hf_client import HFClientError
+from fastapi_app.main import app
+from fastapi_app.ratelimit import limit_chat
+from fastapi_app.routes import diabetes
+from fastapi_app.routes.diabetes import PromptEchoFilter, build_health_summary
+from fastapi_app.schemas.diabetes import ChatRequest
+
+REQUEST = {"glucose": 148, "blood_pressure": 72, "insulin": 0, "bmi": 33.6, "age": 50,
+           "diabetes_pedigree_function": 0.627, "prediction": "Diabetic", "probability": "94.81%"}
+
+
+class StubLLM:
+    """ Stands in for hf_client: streams the given chunks, then raises error if one is given. """
+
+    def __init__(self, *chunks, error: Exception = None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+
+    async def stream(self, prompt: str):
+        self.calls += 1
+        for chunk in self.chunks:
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[utils.get_current_user] = lambda: SimpleNamespace(id=7, username="alice")
+    app.dependency_overrides[limit_chat] = lambda: None
+    # No lifespan: the LLM client and advice cache are set per test
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def read_events(response) -> list:
+    events = []
+    for block in filter(None, response.text.split("\n\n")):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_echoed_prompt_split_across_chunks_is_dropped():
+    prompt = build_health_summary(ChatRequest(**REQUEST))
+    text = prompt + "\n\n- Cut down on sugar\n- Walk 30 minutes a day"
+    echo_filter = PromptEchoFilter(prompt)
+    lines = []
+    for start in range(0, len(text), 7):
+        lines += echo_filter.feed(text[start:start + 7])
+    lines += echo_filter.flush()
+    assert lines == ["- Cut down on sugar", "- Walk 30 minutes a day"]
+
+
+def test_lines_stream_then_done_and_fill_the_cache(client, monkeypatch):
+    cache = AdviceCache()
+    llm = StubLLM("- Cut down", " on sugar\n- Walk", " daily")
+    monkeypatch.setattr(diabetes, "advice_cache", cache)
+    monkeypatch.setattr(diabetes, "hf_client", llm)
+    response = client.post("/chat/stream", json=REQUEST)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert read_events(response) == [
+        ("line", {"line": "- Cut down on sugar"}),
+        ("line", {"line": "- Walk daily"}),
+        ("done", {"advice": "- Cut down on sugar\n- Walk daily"}),
+    ]
+    assert cache.get(cache.key(ChatRequest(**REQUEST))) == "- Cut down on sugar\n- Walk daily"
+
+
+def test_cached_advice_is_replayed_as_events(client, monkeypatch):
+    cache = AdviceCache()
+    cache.put(cache.key(ChatRequest(**REQUEST)), "- Cached one\n- Cached two")
+    llm = StubLLM()
+    monkeypatch.setattr(diabetes, "advice_cache", cache)
+    monkeypatch.setattr(diabetes, "hf_client", llm)
+    assert read_events(client.post("/chat/stream", json=REQUEST)) == [
+        ("line", {"line": "- Cached one"}),
+        ("line", {"line": "- Cached two"}),
+        ("done", {"advice": "- Cached one\n- Cached two"}),
+    ]
+    assert llm.calls == 0
+
+
+def test_upstream_error_ends_the_stream_with_an_error_event(client, monkeypatch):
+    cache = AdviceCache()
+    monkeypatch.setattr(diabetes, "advice_cache", cache)
+    monkeypatch.setattr(diabetes, "hf_client", StubLLM("- First line\n", error=HFClientError("overloaded", 503)))
+    assert read_events(client.post("/chat/stream", json=REQUEST)) == [
+        ("line", {"line": "- First line"}),
+        ("error", {"status_code": 503, "detail": "Chatbot service error."}),
+    ]
+    # A partial answer is never cached
+    assert cache.get(cache.key(ChatRequest(**REQUEST))) is None
@@ -0,0 +1,59 @@
+import pytest
+
+from fastapi_app.cohort import CsvChunker, in_quotes, parse_lines
+
+CSV = "Preg,Glucose\r\n1,2\r\n\r\n3,4\n\n5,6\r7,8"
+ROWS = [["Preg", "Glucose"], ["1", "2"], [], ["3", "4"], [], ["5", "6"], ["7", "8"]]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, len(CSV)])
+def test_every_line_is_a_row_whatever_the_chunking(chunk_size):
+    data = CSV.encode()
+    chunker = CsvChunker()
+    rows = []
+    for start in range(0, len(data), chunk_size):
+        rows += chunker.feed(data[start:start + chunk_size])
+    rows += chunker.close()
+    assert rows == ROWS
+
+
+def test_trailing_line_break_is_not_a_row():
+    chunker = CsvChunker()
+    assert chunker.feed(b"a,b\n1,2\n") + chunker.close() == [["a", "b"], ["1", "2"]]
+
+
+def test_byte_order_mark_is_dropped():
+    chunker = CsvChunker()
+    assert chunker.feed("﻿a,b\n".encode()) + chunker.close() == [["a", "b"]]
+
+
+QUOTED = 'id,note,Glucose\n1,"two\nlines",5\n2,"say ""hi""\r\nagain",6\n3,plain,7\n'
+QUOTED_ROWS = [["id", "note", "Glucose"], ["1", "two\nlines", "5"], ["2", 'say "hi"\r\nagain', "6"], ["3", "plain", "7"]]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 13, len(QUOTED)])
+def test_quoted_line_breaks_stay_in_their_field(chunk_size):
+    data = QUOTED.encode()
+    chunker = CsvChunker()
+    rows = []
+    for start in range(0, len(data), chunk_size):
+        rows += chunker.feed(data[start:start + chunk_size])
+    rows += chunker.close()
+    assert rows == QUOTED_ROWS
+    assert parse_lines(QUOTED) == QUOTED_ROWS
+
+
+def test_quotes_inside_an_unquoted_field_are_literal():
+    assert not in_quotes('5"6,7')
+    assert in_quotes('1,"open')
+    assert not in_quotes('1,"a""b"')
+    assert in_quotes('1,"a\n2,b')
+    assert not in_quotes('"a\n",b\n"c"')
+
+
+def test_unterminated_quote_is_rejected():
+    chunker = CsvChunker(max_record_chars=50)
+    chunker.feed(b'a,b\n1,"never closed\n')
+    with pytest.raises(ValueError, match="unterminated quote"):
+        for _ in range(10):
+            chunker.feed(b"more text\n")
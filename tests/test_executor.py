@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fastapi_app.executor import InferenceBusy, InferenceExecutor, InferenceTimeout
+from fastapi_app.registry import ModelRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+ROW = np.zeros((1, 7))
+
+
+class Blocking:
+    """ A model that doesn't answer until released. """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        self.release.wait(10)
+        return np.full((len(X), 2), 0.5)
+
+
+def model_version(model):
+    return SimpleNamespace(model=model, explainer=None, version="test", path="unused", engine="numpy")
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def blocking():
+    model = Blocking()
+    yield model
+    model.release.set()
+
+
+@pytest.mark.parametrize("mode", ["shared", "thread"])
+def test_busy_past_max_pending(mode, blocking):
+    executor = InferenceExecutor(mode, workers=1, max_pending=2, timeout_ms=0)
+    executor.start()
+    callers = [threading.Thread(target=executor.predict_proba_sync, args=(model_version(blocking), ROW)) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    wait_until(lambda: executor.stats()["pending"] == 2)
+    with pytest.raises(InferenceBusy):
+        executor.predict_proba_sync(model_version(blocking), ROW)
+    assert executor.stats()["rejected"] == 1
+
+    blocking.release.set()
+    for caller in callers:
+        caller.join()
+    assert executor.stats()["pending"] == 0
+    assert executor.stats()["completed"] == 2
+    executor.shutdown()
+
+
+def test_timed_out_call_keeps_its_slot_until_the_work_finishes(blocking):
+    executor = InferenceExecutor("thread", workers=1, max_pending=1, timeout_ms=50)
+    executor.start()
+    with pytest.raises(InferenceTimeout):
+        executor.predict_proba_sync(model_version(blocking), ROW)
+    # The worker is still running it, so there is no room for another call
+    assert executor.stats()["pending"] == 1
+    with pytest.raises(InferenceBusy):
+        executor.predict_proba_sync(model_version(blocking), ROW)
+
+    blocking.release.set()
+    wait_until(lambda: executor.stats()["pending"] == 0)
+    assert executor.predict_proba_sync(model_version(blocking), ROW).shape == (1, 2)
+    assert executor.stats()["timeouts"] == 1
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("mode", ["shared", "thread"])
+def test_async_timeout_and_cancellation_keep_the_slot(mode, blocking):
+    executor = InferenceExecutor(mode, workers=2, max_pending=2, timeout_ms=50)
+    executor.start()
+
+    async def main():
+        with pytest.raises(InferenceTimeout):
+            await executor.predict_proba(model_version(blocking), ROW)
+        caller = asyncio.ensure_future(executor.predict_proba(model_version(blocking), ROW))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # Neither the timed-out nor the cancelled call has given its slot back yet
+        assert executor.stats()["pending"] == 2
+        with pytest.raises(InferenceBusy):
+            await executor.predict_proba(model_version(blocking), ROW)
+        blocking.release.set()
+        while executor.stats()["pending"]:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert executor.stats()["timeouts"] == 1
+    executor.shutdown()
+
+
+def test_queued_call_that_is_cancelled_never_runs(blocking):
+    executor = InferenceExecutor("thread", workers=1, max_pending=4, timeout_ms=0)
+    executor.start()
+
+    async def main():
+        running = asyncio.ensure_future(executor.predict_proba(model_version(blocking), ROW))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(executor.predict_proba(model_version(blocking), ROW))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await asyncio.sleep(0.01)
+        assert executor.stats()["pending"] == 1
+        blocking.release.set()
+        await running
+
+    asyncio.run(main())
+    assert blocking.calls == 1
+    executor.shutdown()
+
+
+def test_process_pool_is_replaced_when_a_worker_dies(tmp_path):
+    registry = ModelRegistry("numpy", store_dir=tmp_path)
+    active = registry.load(ROOT / "fastapi_app" / "diabetes_model.npz", activate=True)
+    executor = InferenceExecutor("process", workers=1, max_pending=4, timeout_ms=0, health_interval=0)
+    executor.start(active)
+    try:
+        expected = active.model.predict_proba(ROW)
+        assert np.array_equal(executor.predict_proba_sync(active, ROW), expected)
+        for process in list(executor._pool._processes.values()):
+            process.kill()
+            process.join()
+        # The broken pool is noticed on submit and the call is retried on a new one
+        assert np.array_equal(asyncio.run(executor.predict_proba(active, ROW)), expected)
+        assert executor.stats()["restarts"] == 1
+        assert executor.stats()["pending"] == 0
+    finally:
+        executor.shutdown()
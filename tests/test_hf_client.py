@@ -0,0 +1,187 @@
+"""HFClient against local stand-ins: the benchmark stub app for the happy paths,
+and an httpx.MockTransport for retries, timeouts and upstream errors.
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from benchmarks import hf_stub
+from fastapi_app.hf_client import HFClient, HFClientError
+
+API_URL = "http://hf.test/models/stub"
+
+
+def make_client(handler=None, **kwargs) -> HFClient:
+    transport = httpx.ASGITransport(app=hf_stub.app) if handler is None else httpx.MockTransport(handler)
+    return HFClient(api_url=API_URL, api_key="test", transport=transport, **kwargs)
+
+
+async def collect(client: HFClient, prompt: str) -> list:
+    try:
+        return [chunk async for chunk in client.stream(prompt)]
+    finally:
+        await client.aclose()
+
+
+async def generate(client: HFClient, prompt: str) -> str:
+    try:
+        return await client.generate(prompt)
+    finally:
+        await client.aclose()
+
+
+class Upstream:
+    """ Answers with the queued (status, headers, body) triples in order, then 200s; counts calls. """
+
+    def __init__(self, *answers, stream_body: bytes = None):
+        self.answers = list(answers)
+        self.calls = 0
+        self.stream_body = stream_body
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.answers:
+            answer = self.answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            status_code, headers, body = answer
+            return httpx.Response(status_code, headers=headers, content=body)
+        if json.loads(request.content).get("stream") and self.stream_body is not None:
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=self.stream_body)
+        return httpx.Response(200, json=[{"generated_text": "advice"}])
+
+
+@pytest.fixture(autouse=True)
+def fast_stub(monkeypatch):
+    monkeypatch.setattr(hf_stub, "STUB_DELAY", 0)
+    monkeypatch.setattr(hf_stub, "STUB_TOKEN_DELAY", 0)
+    monkeypatch.setattr(hf_stub, "STUB_ERROR_RATE", 0)
+
+
+def test_generate_against_stub():
+    text = asyncio.run(generate(make_client(), "User prompt"))
+    assert text.startswith("User prompt\n\n")
+    assert "\n".join(hf_stub.ADVICE) in text
+
+
+def test_stream_against_stub():
+    chunks = asyncio.run(collect(make_client(), "User prompt"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == "\n".join(hf_stub.ADVICE)
+
+
+def test_stream_falls_back_to_json_body():
+    chunks = asyncio.run(collect(make_client(Upstream()), "prompt"))
+    assert chunks == ["advice"]
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_retries_then_succeeds(status_code):
+    upstream = Upstream((status_code, {"Retry-After": "0"}, b"{}"), (status_code, {}, b"{}"))
+    assert asyncio.run(generate(make_client(upstream, backoff_seconds=0.001), "prompt")) == "advice"
+    assert upstream.calls == 3
+
+
+def test_stream_retries_before_first_chunk():
+    events = b'data:{"token": {"text": "a", "special": false}}\n\ndata:{"token": {"text": "b", "special": false}}\n\n'
+    upstream = Upstream((503, {"Retry-After": "0"}, b"loading"), stream_body=events)
+    assert asyncio.run(collect(make_client(upstream), "prompt")) == ["a", "b"]
+    assert upstream.calls == 2
+
+
+def test_gives_up_after_max_retries():
+    upstream = Upstream(*[(503, {}, b"loading")] * 5)
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(generate(make_client(upstream, max_retries=2, backoff_seconds=0.001), "prompt"))
+    assert error.value.status_code == 502
+    assert upstream.calls == 3
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 404, 500])
+def test_upstream_errors_are_bad_gateway(status_code):
+    upstream = Upstream((status_code, {}, b"nope"))
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(generate(make_client(upstream), "prompt"))
+    assert error.value.status_code == 502
+    assert upstream.calls == 1
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(collect(make_client(Upstream((status_code, {}, b"nope"))), "prompt"))
+    assert error.value.status_code == 502
+
+
+def test_unexpected_body_is_bad_gateway():
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(generate(make_client(Upstream((200, {}, b'{"error": "x"}'))), "prompt"))
+    assert error.value.status_code == 502
+
+
+def test_stream_error_event_is_bad_gateway():
+    upstream = Upstream(stream_body=b'data:{"error": "overloaded"}\n\n')
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(collect(make_client(upstream), "prompt"))
+    assert error.value.status_code == 502
+
+
+@pytest.mark.parametrize("consume", [generate, collect])
+def test_timeout_is_gateway_timeout(consume):
+    upstream = Upstream(httpx.ReadTimeout("slow"))
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(consume(make_client(upstream), "prompt"))
+    assert error.value.status_code == 504
+    assert upstream.calls == 1
+
+
+def test_unreachable_is_bad_gateway():
+    with pytest.raises(HFClientError) as error:
+        asyncio.run(generate(make_client(Upstream(httpx.ConnectError("refused"))), "prompt"))
+    assert error.value.status_code == 502
+
+
+def test_retry_after_is_capped():
+    client = HFClient(api_url=API_URL, max_retries=3, backoff_seconds=0.5, read_timeout=30)
+    assert client.max_retry_delay == 4.0
+    for retry_after, expected in [("3600", 4.0), ("1.5", 1.5), ("-5", 0.0), ("inf", 0.5), ("soon", 0.5)]:
+        response = httpx.Response(503, headers={"Retry-After": retry_after})
+        assert client._retry_delay(response, 0) == expected
+    # Never longer than a read would be allowed to take
+    assert HFClient(api_url=API_URL, max_retries=10, backoff_seconds=1, read_timeout=2).max_retry_delay == 2
+
+
+def test_huge_retry_after_does_not_park_the_caller():
+    upstream = Upstream((503, {"Retry-After": "3600"}, b"loading"))
+    started = time.perf_counter()
+    assert asyncio.run(generate(make_client(upstream, max_retries=2, backoff_seconds=0.01), "prompt")) == "advice"
+    assert time.perf_counter() - started < 1
+
+
+def test_slot_is_released_while_waiting_to_retry():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content)["inputs"] == "retry" and not retried:
+            retried.append(True)
+            return httpx.Response(503, headers={"Retry-After": "0.3"})
+        return httpx.Response(200, json=[{"generated_text": "advice"}])
+
+    retried = []
+    finished = []
+
+    async def main():
+        client = make_client(handler, max_concurrency=1, queue_timeout=0.2, backoff_seconds=1)
+
+        async def call(prompt):
+            await client.generate(prompt)
+            finished.append(prompt)
+
+        try:
+            first = asyncio.create_task(call("retry"))
+            await asyncio.sleep(0.05)
+            # With the slot held through the 0.3 s wait this would time out in the queue
+            await call("other")
+            await first
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert finished == ["other", "retry"]
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_app import utils
+from fastapi_app.database import Base, apply_sqlite_pragmas, get_async_db
+from fastapi_app.history import PredictionWriter
+from fastapi_app.main import app
+from fastapi_app.models.prediction import Prediction
+from fastapi_app.models.user import User
+
+FEATURES = {"Pregnancies": 6, "Glucose": 148, "BloodPressure": 72, "Insulin": 0, "BMI": 33.6,
+            "DiabetesPedigreeFunction": 0.627, "Age": 50}
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "history.db"
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add_all([User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash="x")
+                    for user_id in (1, 2)])
+        db.commit()
+    yield SimpleNamespace(path=path, session_factory=session_factory)
+    engine.dispose()
+
+
+def count(database, **filters) -> int:
+    with database.session_factory() as db:
+        return db.scalar(select(func.count()).select_from(Prediction).filter_by(**filters))
+
+
+def test_rows_are_written_in_bulk(database):
+    writer = PredictionWriter(database.session_factory, max_batch_size=5, flush_interval_ms=10_000)
+    for _ in range(10):
+        writer.record(1, FEATURES, "Diabetic", 0.9, "v1")
+    writer.close()
+    assert count(database, user_id=1) == 10
+    stats = writer.stats()
+    assert (stats["written"], stats["flushes"], stats["mean_rows_per_flush"]) == (10, 2, 5.0)
+
+
+def test_flush_interval_writes_a_partial_batch(database):
+    writer = PredictionWriter(database.session_factory, max_batch_size=100, flush_interval_ms=20)
+    writer.record(1, FEATURES, "Diabetic", 0.9, "v1")
+    deadline = time.monotonic() + 5
+    while writer.stats()["written"] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    writer.close()
+    assert count(database) == 1
+
+
+def test_bad_row_does_not_sink_the_batch(database):
+    writer = PredictionWriter(database.session_factory, max_batch_size=3, flush_interval_ms=10_000)
+    writer.record(1, FEATURES, "Diabetic", 0.9, "v1")
+    writer.record(99, FEATURES, "Diabetic", 0.9, "v1")  # no such user
+    writer.record(2, FEATURES, "Non-Diabetic", 0.1, "v1")
+    writer.close()
+    assert count(database) == 2
+    assert (writer.stats()["written"], writer.stats()["failed"]) == (2, 1)
+
+
+def test_full_queue_and_closed_writer_drop_rows(database):
+    release = threading.Event()
+
+    def slow_session():
+        release.wait(5)
+        return database.session_factory()
+
+    writer = PredictionWriter(slow_session, max_batch_size=1, flush_interval_ms=0, max_queue_size=1)
+    for _ in range(5):
+        writer.record(1, FEATURES, "Diabetic", 0.9, "v1")
+    release.set()
+    writer.close()
+    writer.record(1, FEATURES, "Diabetic", 0.9, "v1")
+    stats = writer.stats()
+    assert stats["written"] + stats["dropped"] == 6 and stats["dropped"] >= 3
+    assert count(database) == stats["written"]
+
+
+@pytest.fixture
+def client(database):
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{database.path}")
+    sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def get_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = get_db
+    app.dependency_overrides[utils.get_current_user] = lambda: SimpleNamespace(id=1, username="user1")
+    # No lifespan: the database is the temporary one above
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
+
+
+def add_predictions(database, user_id: int, created: list):
+    with database.session_factory() as db:
+        db.add_all([
+            Prediction(user_id=user_id, pregnancies=1, glucose=i, blood_pressure=1, insulin=1, bmi=1,
+                       diabetes_pedigree_function=1, age=1, prediction="Diabetic", probability=0.9,
+                       model_version="v1", created_at=created_at)
+            for i, created_at in enumerate(created)
+        ])
+        db.commit()
+
+
+def test_keyset_pages_cover_every_row_once(database, client):
+    start = datetime(2025, 1, 1)
+    # Several rows share a timestamp, so the id has to break ties
+    created = [start + timedelta(seconds=i // 3) for i in range(10)]
+    add_predictions(database, 1, created)
+    add_predictions(database, 2, created[:4])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/predictions", params=params).json()
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 10 and len({item["id"] for item in seen}) == 10
+    keys = [(item["created_at"], item["id"]) for item in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert seen[0]["features"]["Glucose"] == 9
+
+
+def test_invalid_cursor(client):
+    assert client.get("/predictions", params={"cursor": "not a cursor"}).status_code == 400
@@ -0,0 +1,110 @@
+"""NumpyForest against the sklearn forest it was built from.
+
+    python -m pytest tests
+"""
+import csv
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fastapi_app.inference import NumpyForest, check_against_sklearn
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT / "fastapi_app" / "diabetes_model.pkl"
+CSV_PATH = ROOT / "model_preparation" / "diabetes.csv"
+
+# sklearn warns that the plain arrays have no feature names
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def forest():
+    with open(MODEL_PATH, "rb") as model_file:
+        return pickle.load(model_file)
+
+
+@pytest.fixture(scope="module")
+def engine(forest):
+    return NumpyForest.from_sklearn(forest)
+
+
+@pytest.fixture(scope="module")
+def training_rows(forest):
+    with open(CSV_PATH, newline="") as csv_file:
+        return np.array([[float(row[name]) for name in forest.feature_names_in_] for row in csv.DictReader(csv_file)])
+
+
+@pytest.fixture(scope="module")
+def edge_rows(engine, training_rows):
+    """ Training rows with one feature set exactly on a split threshold (and one step either side of it). """
+    rng = np.random.default_rng(0)
+    splits = np.flatnonzero(engine.left != np.arange(len(engine.left)))
+    splits = rng.choice(splits, size=min(2000, len(splits)), replace=False)
+    base = training_rows[rng.integers(len(training_rows), size=len(splits))]
+    rows = []
+    # The engine compares float32 inputs like sklearn does, so probe the float32 values around each threshold
+    threshold = engine.threshold[splits].astype(np.float32)
+    for value in (threshold, np.nextafter(threshold, np.float32(-np.inf)), np.nextafter(threshold, np.float32(np.inf))):
+        X = base.copy()
+        X[np.arange(len(splits)), engine.feature[splits]] = value
+        rows.append(X)
+    return np.concatenate(rows)
+
+
+@pytest.fixture(scope="module")
+def nan_rows(training_rows):
+    """ Training rows with one or more features missing. """
+    rng = np.random.default_rng(1)
+    X = training_rows.copy()
+    X[rng.random(X.shape) < 0.2] = np.nan
+    X[::50] = np.nan
+    return X
+
+
+def test_training_data_bit_identical(forest, engine, training_rows):
+    assert check_against_sklearn(forest, engine, training_rows)
+
+
+def test_split_thresholds_bit_identical(forest, engine, edge_rows):
+    assert check_against_sklearn(forest, engine, edge_rows)
+
+
+def test_missing_values_bit_identical(forest, engine, nan_rows):
+    assert check_against_sklearn(forest, engine, nan_rows)
+
+
+def test_single_row(forest, engine, training_rows):
+    assert np.array_equal(engine.predict_proba(training_rows[0]), forest.predict_proba(training_rows[:1]))
+    assert np.array_equal(engine.predict(training_rows[:5]), forest.predict(training_rows[:5]))
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_artifact_bit_identical(forest, engine, training_rows, edge_rows, nan_rows, tmp_path, mmap):
+    path = tmp_path / "model.npz"
+    engine.save(path)
+    loaded = NumpyForest.load(path, mmap=mmap)
+    if mmap:
+        assert isinstance(loaded.threshold, np.memmap)
+        assert isinstance(loaded.value, np.memmap)
+    for X in (training_rows, edge_rows, nan_rows):
+        assert check_against_sklearn(forest, loaded, X)
+
+
+def test_contributions_add_up_to_proba(engine, training_rows, edge_rows, nan_rows):
+    for X in (training_rows, edge_rows, nan_rows):
+        proba, contributions, expected_value = engine.explain(X)
+        assert contributions.shape == (len(X), engine.n_features_in_, len(engine.classes_))
+        assert np.array_equal(proba, engine.predict_proba(X))
+        np.testing.assert_allclose(expected_value + contributions.sum(axis=1), proba, rtol=0, atol=1e-12)
+
+
+def test_contributions_from_saved_artifact(engine, training_rows, tmp_path):
+    path = tmp_path / "model.npz"
+    engine.save(path)
+    loaded = NumpyForest.load(path)
+    _, expected, expected_value = engine.explain(training_rows)
+    _, contributions, loaded_expected_value = loaded.explain(training_rows)
+    assert np.array_equal(contributions, expected)
+    assert np.array_equal(loaded_expected_value, expected_value)
@@ -0,0 +1,50 @@
+import asyncio
+import signal
+
+from fastapi_app.main import drain_on_sigterm
+from fastapi_app.routes.health import lifecycle
+
+
+def test_sigterm_turns_readiness_off_before_passing_the_signal_on():
+    received = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+    async def main():
+        restore = drain_on_sigterm(0.2)
+        try:
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0.05)
+            # Still serving: the probe says 503, uvicorn's handler has not seen the signal yet
+            assert lifecycle.draining
+            assert received == []
+            await asyncio.sleep(0.3)
+            assert received == [signal.SIGTERM]
+        finally:
+            restore()
+
+    try:
+        asyncio.run(main())
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        lifecycle.draining = False
+
+
+def test_second_sigterm_stops_at_once():
+    received = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+    async def main():
+        restore = drain_on_sigterm(60)
+        try:
+            signal.raise_signal(signal.SIGTERM)
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0)
+            assert received == [signal.SIGTERM]
+        finally:
+            restore()
+
+    try:
+        asyncio.run(main())
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        lifecycle.draining = False
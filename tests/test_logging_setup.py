@@ -0,0 +1,130 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_app.logging_setup import (JsonFormatter, RequestIdFilter, RequestLoggingMiddleware, SamplingFilter,
+                                       _PreparedQueueHandler, access_logger, parse_sample_rates, request_id_var)
+
+
+class Keep(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_prepared_copy_leaves_the_record_to_other_handlers():
+    records = queue.Queue()
+    kept = Keep()
+    logger = logging.getLogger("tests.prepared_queue")
+    logger.propagate = False
+    logger.addHandler(_PreparedQueueHandler(records))
+    logger.addHandler(kept)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed %s", "here")
+    finally:
+        logger.handlers.clear()
+
+    queued = records.get_nowait()
+    assert queued.msg == "failed here" and queued.args is None and queued.exc_info is None
+    assert "ValueError: boom" in queued.exc_text
+
+    original = kept.records[0]
+    assert original is not queued
+    assert (original.msg, original.args) == ("failed %s", ("here",))
+    assert original.exc_info[0] is ValueError
+
+
+@pytest.fixture
+def kept():
+    """ Keep handler on the access logger and on "tests.request", stamping request ids like setup_logging. """
+    handler = Keep()
+    handler.addFilter(RequestIdFilter())
+    loggers = [access_logger, logging.getLogger("tests.request")]
+    for logger in loggers:
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+    yield handler.records
+    for logger in loggers:
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+
+
+def test_json_lines_carry_request_id_extras_and_exception():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    logger = logging.getLogger("tests.json")
+    logger.propagate = False
+    logger.addHandler(handler)
+    token = request_id_var.set("req-1")
+    try:
+        logger.warning("two\nlines", extra={"user": "alice", "rows": 3})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        request_id_var.reset(token)
+        logger.handlers.clear()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    first, second = map(json.loads, lines)
+    assert (first["message"], first["level"], first["logger"]) == ("two\nlines", "WARNING", "tests.json")
+    assert (first["request_id"], first["user"], first["rows"]) == ("req-1", "alice", 3)
+    assert "exception" not in first
+    assert "ValueError: boom" in second["exception"]
+
+
+def test_sampling_keeps_warnings_and_inherits_rates():
+    sampler = SamplingFilter({"a.b": 0.0, "a.b.keep": 1.0})
+
+    def passes(name, level=logging.INFO):
+        return sampler.filter(logging.makeLogRecord({"name": name, "levelno": level}))
+
+    assert not passes("a.b") and not passes("a.b.c")
+    assert passes("a.b.c", logging.WARNING) and passes("a.b", logging.ERROR)
+    # Own rate wins over the parent's; "a.bc" is not under "a.b"
+    assert passes("a.b.keep") and passes("a.bc") and passes("other")
+
+
+def test_malformed_sample_rates_are_skipped():
+    skipped = []
+    rates = parse_sample_rates("fastapi_app, a=0.5, b=often, =1, c=7", skipped)
+    assert rates == {"a": 0.5, "c": 1.0}
+    assert skipped == ["fastapi_app", "b=often", "=1"]
+
+
+def test_middleware_tags_the_request_and_its_records(kept):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        logging.getLogger("tests.request").info("working")
+        return {}
+
+    client = TestClient(RequestLoggingMiddleware(app))
+    response = client.get("/work", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["x-request-id"] == "abc-123"
+    assert [(record.name, record.request_id) for record in kept] == [
+        ("tests.request", "abc-123"), ("fastapi_app.access", "abc-123")
+    ]
+    assert (kept[1].path, kept[1].status) == ("/work", 200)
+
+    assert client.get("/work", headers={"X-Request-ID": "x" * 100}).headers["x-request-id"] == "x" * 64
+    generated = client.get("/work").headers["x-request-id"]
+    assert len(generated) == 32 and kept[-1].request_id == generated
+    # Nothing leaks out of the request
+    assert request_id_var.get() is None
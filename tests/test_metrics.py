@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app import metrics
+from fastapi_app.main import app
+from fastapi_app.metrics import Counter, Histogram
+
+
+@pytest.fixture
+def scrape(monkeypatch):
+    """ Registers the given metrics next to the app's own; returns a function that GETs /metrics. """
+    client = TestClient(app)
+
+    def get(*extra):
+        monkeypatch.setattr(metrics.registry, "_metrics", list(metrics.registry._metrics) + list(extra))
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == metrics.CONTENT_TYPE
+        return dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+
+    return get
+
+
+def in_threads(*calls):
+    """ Run each call on its own thread, so every one records into a separate shard. """
+    threads = [threading.Thread(target=call) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_shards_are_summed(scrape):
+    counter = Counter("test_jobs_total", "Jobs.", ("kind",))
+    in_threads(*(lambda: counter.inc("a") for _ in range(3)), lambda: counter.inc("b", amount=2.5))
+    assert len(counter._shards) == 4
+    samples = scrape(counter)
+    assert samples['test_jobs_total{kind="a"}'] == "3"
+    assert samples['test_jobs_total{kind="b"}'] == "2.5"
+
+
+def test_histogram_buckets_are_cumulative(scrape):
+    histogram = Histogram("test_wait_seconds", "Wait.", ("queue",), buckets=(0.01, 0.1, 1.0))
+    in_threads(lambda: histogram.observe(0.01, "q"), lambda: histogram.observe(0.05, "q"),
+               lambda: [histogram.observe(value, "q") for value in (0.05, 0.5, 30.0)])
+    samples = scrape(histogram)
+    buckets = [samples[f'test_wait_seconds_bucket{{queue="q",le="{le}"}}'] for le in ("0.01", "0.1", "1", "+Inf")]
+    # An observation equal to a bound falls in that bucket (le is "less than or equal")
+    assert buckets == ["1", "3", "4", "5"]
+    assert samples['test_wait_seconds_count{queue="q"}'] == buckets[-1]
+    assert float(samples['test_wait_seconds_sum{queue="q"}']) == pytest.approx(30.61)
+
+
+def test_requests_are_counted_per_route(scrape):
+    client = TestClient(app)
+    client.get("/")
+    client.get("/no/such/page")
+    samples = scrape()
+    assert int(samples['http_requests_total{method="GET",route="/",status="200"}']) >= 1
+    assert int(samples['http_requests_total{method="GET",route="unmatched",status="404"}']) >= 1
+    count = samples['http_request_duration_seconds_count{method="GET",route="/"}']
+    assert samples['http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"}'] == count
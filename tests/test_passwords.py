@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from fastapi_app.passwords import PasswordHasher, PasswordPoolBusy
+
+
+@pytest.fixture
+def hasher():
+    # Slow enough that a hash is still running when its caller gives up
+    hasher = PasswordHasher(rounds=13, workers=1, max_pending=2)
+    hasher.warm_up()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_cancelled_caller_keeps_the_slot_until_the_hash_is_done(hasher):
+    async def main():
+        running = asyncio.ensure_future(hasher.hash_async("secret"))
+        await asyncio.sleep(0.2)
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        # The request is gone but the worker is still hashing
+        assert hasher.pending() == 1
+        queued = asyncio.ensure_future(hasher.hash_async("secret"))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordPoolBusy):
+            await hasher.hash_async("secret")
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        started = time.monotonic()
+        while hasher.pending():
+            assert time.monotonic() - started < 30
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+
+
+def test_busy_past_max_pending(hasher):
+    async def main():
+        calls = [asyncio.ensure_future(hasher.hash_async("secret")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordPoolBusy):
+            await hasher.hash_async("secret")
+        hashes = await asyncio.gather(*calls)
+        assert all(await asyncio.gather(*(hasher.verify_async("secret", h) for h in hashes)))
+        assert hasher.pending() == 0
+
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+import io
+
+import numpy as np
+import orjson
+import pytest
+
+from fastapi_app import columnar
+from fastapi_app.columnar import ARROW_MEDIA_TYPE, ColumnarUnavailable, prefers_arrow
+from fastapi_app.routes import diabetes
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+RECORD = {"Pregnancies": 6, "Glucose": 148, "BloodPressure": 72, "Insulin": 0, "BMI": 33.6,
+          "DiabetesPedigreeFunction": 0.627, "Age": 50}
+
+
+@pytest.fixture
+def client(scoring_client):
+    return scoring_client()
+
+
+def arrow_stream(columns: dict, batches: int = 1) -> bytes:
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table(columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for _ in range(batches):
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+def test_json_in_json_out(client):
+    response = client.post("/predict/batch", json={"records": [RECORD, {**RECORD, "Glucose": -1}]})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["succeeded"], body["failed"]) == (2, 1, 1)
+    assert body["results"][0]["prediction"] == "Diabetic"
+    assert body["results"][1]["errors"][0]["type"] == "greater_than_equal"
+
+
+def test_arrow_in_arrow_out(client):
+    columns = {"Preg": [6.0, 1.0], "Glucose": [148.0, None], "BPressure": [72.0, 66.0], "Insulin": [0.0, 94.0],
+               "BMI": [33.6, 28.1], "DiabetesPedigreeFunction": [0.627, 0.167], "Age": [50.0, 21.0]}
+    response = client.post("/predict/batch", content=arrow_stream(columns),
+                           headers={"Content-Type": ARROW_MEDIA_TYPE, "Accept": ARROW_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ARROW_MEDIA_TYPE
+    pa = pytest.importorskip("pyarrow")
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("prediction").to_pylist() == ["Diabetic", None]
+    assert table.column("error").to_pylist()[1] == "Glucose: Field required"
+    assert table.schema.metadata[b"model_version"].decode() == response.headers["X-Model-Version"]
+
+
+def test_arrow_and_json_agree(client):
+    json_result = client.post("/predict/batch", json={"records": [RECORD]}, headers={"Accept": ARROW_MEDIA_TYPE})
+    columns = {feature: [float(value)] for feature, value in RECORD.items()}
+    arrow_result = client.post("/predict/batch", content=arrow_stream(columns), headers={"Content-Type": ARROW_MEDIA_TYPE})
+    pa = pytest.importorskip("pyarrow")
+    probability = pa.ipc.open_stream(json_result.content).read_all().column("probability").to_pylist()[0]
+    assert arrow_result.json()["results"][0]["probability"] == f"{probability * 100:.2f}%"
+
+
+def test_arrow_only_accept_needs_pyarrow(client, monkeypatch):
+    def require_pyarrow():
+        raise ColumnarUnavailable("Arrow payloads need pyarrow on the server")
+
+    monkeypatch.setattr(diabetes, "require_pyarrow", require_pyarrow)
+    response = client.post("/predict/batch", json={"records": [RECORD]}, headers={"Accept": ARROW_MEDIA_TYPE})
+    assert response.status_code == 406
+
+
+def test_arrow_request_needs_pyarrow(client, monkeypatch):
+    def require_pyarrow():
+        raise ColumnarUnavailable("Arrow payloads need pyarrow on the server")
+
+    monkeypatch.setattr(columnar, "require_pyarrow", require_pyarrow)
+    response = client.post("/predict/batch", content=b"not read", headers={"Content-Type": ARROW_MEDIA_TYPE})
+    assert response.status_code == 415
+
+
+def test_bad_arrow_payloads(client):
+    response = client.post("/predict/batch", content=b"not arrow", headers={"Content-Type": ARROW_MEDIA_TYPE})
+    assert response.status_code == 400
+    columns = {feature: [float(value)] for feature, value in RECORD.items()}
+    response = client.post("/predict/batch", content=arrow_stream({**columns, "Glucose": ["high"]}),
+                           headers={"Content-Type": ARROW_MEDIA_TYPE})
+    assert response.status_code == 400 and "numeric" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("accept, arrow", [
+    ("", False),
+    ("*/*", False),
+    (ARROW_MEDIA_TYPE, True),
+    (f"application/json, {ARROW_MEDIA_TYPE}", True),
+    (f"application/json;q=1, {ARROW_MEDIA_TYPE};q=0.5", False),
+    (f"{ARROW_MEDIA_TYPE};q=0.9, */*;q=0.1", True),
+    (f"{ARROW_MEDIA_TYPE};q=0", False),
+])
+def test_accept_negotiation(accept, arrow):
+    assert prefers_arrow(accept) is arrow
+
+
+def test_too_many_json_records(client):
+    response = client.post("/predict/batch", json={"records": [RECORD] * (diabetes.MAX_BATCH_SIZE + 1)})
+    assert response.status_code == 413
+
+
+def test_too_many_arrow_rows_stops_at_the_limit(client):
+    columns = {feature: np.full(diabetes.MAX_BATCH_SIZE // 2 + 1, float(value)) for feature, value in RECORD.items()}
+    response = client.post("/predict/batch", content=arrow_stream(columns, batches=2),
+                           headers={"Content-Type": ARROW_MEDIA_TYPE})
+    assert response.status_code == 413
+
+
+def test_body_over_the_byte_limit(client, monkeypatch):
+    monkeypatch.setattr(diabetes, "MAX_BATCH_BYTES", 100)
+    response = client.post("/predict/batch", content=orjson.dumps({"records": [RECORD] * 2}),
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert "body too large" in response.json()["detail"]
+
+    def chunks():
+        # No Content-Length: the limit applies to the bytes as they arrive
+        yield b'{"records": ['
+        for _ in range(200):
+            yield orjson.dumps(RECORD) + b","
+        yield orjson.dumps(RECORD) + b"]}"
+
+    monkeypatch.setattr(diabetes, "MAX_BATCH_BYTES", 10_000)
+    response = client.post("/predict/batch", content=chunks(), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan"])
+def test_non_finite_values_rejected_by_predict_and_batch(client, value):
+    response = client.post("/predict", json={**RECORD, "Glucose": value})
+    assert response.status_code == 422
+    error = response.json()["detail"][0]
+    assert (error["loc"], error["type"]) == (["body", "Glucose"], "finite_number")
+
+    response = client.post("/predict/batch", json={"records": [RECORD, {**RECORD, "Glucose": value}]})
+    assert response.json()["results"][1]["errors"][0]["type"] == "finite_number"
+    assert client.post("/predict", json=RECORD).json()["prediction"] == "Diabetic"
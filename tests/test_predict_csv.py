@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app.main import app
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+HEADER = "Preg,Glucose,BPressure,SThickness,Insulin,BMI,DiabetesPedigreeFunction,Age,Outcome\n"
+
+
+@pytest.fixture
+def history(scoring_client):
+    rows = []
+    scoring_client(SimpleNamespace(record=lambda *args: rows.append(args)))
+    return rows
+
+
+def post_csv(body: str, **params):
+    return TestClient(app).post("/predict/csv", params=params, content=body.encode(),
+                                headers={"Content-Type": "text/csv"})
+
+
+def test_rows_are_scored_numbered_and_recorded(history):
+    body = HEADER + "6,148,72,35,0,33.6,0.627,50,1\n\n1,abc,66,29,0,26.6,0.351,31,0\n1,89,66,23,94,28.1,0.167,21,0\n"
+    response = post_csv(body)
+    assert response.status_code == 200
+    assert response.headers["X-Rows-Scored"] == "2" and response.headers["X-Rows-Rejected"] == "1"
+    results = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [result["row"] for result in results] == [1, 3, 4]
+    assert results[1]["errors"][0]["loc"] == ["Glucose"]
+    assert [result["prediction"] for result in (results[0], results[2])] == ["Diabetic", "Non-Diabetic"]
+
+    assert [(user_id, features["Glucose"], result) for user_id, features, result, _, _ in history] == [
+        (7, 148.0, "Diabetic"), (7, 89.0, "Non-Diabetic")
+    ]
+    assert history[0][1]["Pregnancies"] == 6.0 and history[0][1]["BloodPressure"] == 72.0
+
+
+def test_quoted_line_break_is_one_row(history):
+    body = HEADER.replace(",Outcome", ",Note") + '6,148,72,35,0,33.6,0.627,50,"first\nsecond"\n1,89,66,23,94,28.1,0.167,21,x\n'
+    response = post_csv(body, format="csv")
+    assert response.status_code == 200
+    assert [line.split(",")[:2] for line in response.text.splitlines()] == [
+        ["row", "prediction"], ["1", "Diabetic"], ["2", "Non-Diabetic"]
+    ]
+    assert len(history) == 2
+
+
+def test_missing_column_fails_before_scoring(history):
+    response = post_csv("Preg,Glucose\n1,2\n")
+    assert response.status_code == 422
+    assert "BloodPressure" in response.json()["detail"]
+    assert history == []
@@ -0,0 +1,87 @@
+import pytest
+from starlette.requests import Request
+
+from fastapi_app import ratelimit
+from fastapi_app.ratelimit import TokenBucketLimiter, client_address
+from fastapi_app.routes import diabetes
+
+
+def request(forwarded_for: list = (), peer: str = "10.0.0.1") -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def test_socket_address_unless_proxies_are_trusted():
+    assert client_address(request(["1.2.3.4"]), trusted_proxies=0) == "10.0.0.1"
+    assert client_address(request(), trusted_proxies=1) == "10.0.0.1"
+
+
+def test_forwarded_address_is_counted_from_the_right():
+    # The client forged the first entry; our proxy appended the address it saw
+    forwarded = ["6.6.6.6, 1.2.3.4"]
+    assert client_address(request(forwarded), trusted_proxies=1) == "1.2.3.4"
+    assert client_address(request(["6.6.6.6, 1.2.3.4, 172.16.0.5"]), trusted_proxies=2) == "1.2.3.4"
+    # Repeated headers are read as one list
+    assert client_address(request(["6.6.6.6", "1.2.3.4"]), trusted_proxies=1) == "1.2.3.4"
+    # Fewer entries than proxies: the leftmost is the best we have
+    assert client_address(request(["1.2.3.4"]), trusted_proxies=3) == "1.2.3.4"
+
+
+def test_bucket_allows_burst_then_limits():
+    limiter = TokenBucketLimiter("test", rate=1, burst=3)
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.acquire("a")
+    assert 0 < wait <= 1
+    # Other keys have their own bucket
+    assert limiter.acquire("b") == 0.0
+    assert limiter.stats()["limited"] == 1
+
+
+def test_cost_above_burst_leaves_the_bucket_in_debt():
+    limiter = TokenBucketLimiter("test", rate=1, burst=3)
+    assert limiter.acquire("a", 5) == 0.0
+    # 2 tokens in debt, and one more needed before the next request
+    assert 2.9 < limiter.acquire("a") <= 3
+    assert limiter.acquire("a", 5) > limiter.acquire("a")
+
+
+RECORD = {"Pregnancies": 6, "Glucose": 148, "BloodPressure": 72, "Insulin": 0, "BMI": 33.6,
+          "DiabetesPedigreeFunction": 0.627, "Age": 50}
+
+
+@pytest.fixture
+def row_budget(monkeypatch):
+    """ Returns set_budget(rows): a fresh predict bucket of that many rows that doesn't refill during a test. """
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+
+    def set_budget(rows):
+        monkeypatch.setattr(ratelimit, "predict_limiter", TokenBucketLimiter("predict", rate=1e-6, burst=rows))
+
+    return set_budget
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+def test_bulk_routes_pay_per_row(scoring_client, row_budget):
+    client = scoring_client()
+    row_budget(1000)
+    assert client.post("/predict/batch", json={"records": [RECORD] * 1000}).status_code == 200
+    assert client.post("/predict", json=RECORD).status_code == 429
+    response = client.post("/predict/batch", json={"records": [RECORD]})
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) > 0
+
+    row_budget(1000)
+    assert {client.post("/predict", json=RECORD).status_code for _ in range(1000)} == {200}
+    assert client.post("/predict", json=RECORD).status_code == 429
+
+
+@pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+def test_csv_upload_stops_when_the_budget_runs_out(scoring_client, row_budget, monkeypatch):
+    client = scoring_client()
+    monkeypatch.setattr(diabetes, "CSV_CHUNK_ROWS", 4)
+    row_budget(10)
+    body = "Preg,Glucose,BPressure,Insulin,BMI,DiabetesPedigreeFunction,Age\n" + "6,148,72,0,33.6,0.627,50\n" * 12
+    response = client.post("/predict/csv", content=body.encode(), headers={"Content-Type": "text/csv"})
+    # Chunks of 4: rows 1-8 fit in the budget, rows 9-12 don't
+    assert response.status_code == 429
+    assert "before row 9" in response.json()["detail"] and "Retry-After" in response.headers
+    assert ratelimit.predict_limiter.stats()["allowed"] == 2
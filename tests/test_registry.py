@@ -0,0 +1,152 @@
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from fastapi_app.executor import ModelMismatch, _worker_model, _worker_models
+from fastapi_app.registry import ModelLoadError, ModelRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT / "fastapi_app" / "diabetes_model.pkl"
+
+# The canary rows are plain arrays, the deployed forest was fitted on a DataFrame
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+def forest(seed: int, classes: int = 2) -> bytes:
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 200, size=(200, 7))
+    y = rng.integers(0, classes, size=200)
+    return pickle.dumps(RandomForestClassifier(n_estimators=5, random_state=seed).fit(X, y))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry("numpy", max_versions=3, store_dir=tmp_path / "store")
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    paths = {}
+    for name, raw in (("deployed", MODEL_PATH.read_bytes()), ("a", forest(1)), ("b", forest(2))):
+        paths[name] = tmp_path / f"{name}.pkl"
+        paths[name].write_bytes(raw)
+    return paths
+
+
+def test_activate_and_rollback(registry, artifacts):
+    first = registry.load(artifacts["deployed"], activate=True)
+    second = registry.load(artifacts["a"])
+    assert registry.active is first
+    assert "agreement_with_active" in second.canary
+
+    registry.activate(second.version)
+    assert registry.active is second
+    assert registry.rollback() is first
+    with pytest.raises(KeyError):
+        registry.rollback()
+
+
+def test_loading_the_same_bytes_twice_is_one_version(registry, artifacts, tmp_path):
+    copy = tmp_path / "copy.pkl"
+    copy.write_bytes(artifacts["a"].read_bytes())
+    assert registry.load(artifacts["a"]) is registry.load(copy)
+
+
+def test_version_keeps_its_bytes_when_the_upload_is_overwritten(registry, artifacts):
+    model_version = registry.load(artifacts["a"], activate=True)
+    stored = model_version.path
+    assert stored.parent == registry.store_dir and stored.name == f"{model_version.version}.pkl"
+    original = stored.read_bytes()
+
+    artifacts["a"].write_bytes(artifacts["b"].read_bytes())
+    # Workers (and a rollback) reload from the stored copy, which still holds the old bytes
+    assert stored.read_bytes() == original
+    reloaded = registry.load(artifacts["a"])
+    assert reloaded.version != model_version.version
+    assert model_version.path.read_bytes() == original
+
+
+def test_worker_refuses_a_file_that_is_not_the_version(registry, artifacts):
+    model_version = registry.load(artifacts["a"])
+    _worker_models.clear()
+    try:
+        with pytest.raises(ModelMismatch):
+            _worker_model(model_version.version, str(artifacts["b"]), model_version.engine)
+        model = _worker_model(model_version.version, str(model_version.path), model_version.engine)
+        rows = np.random.default_rng(0).uniform(0, 200, size=(8, 7))
+        assert np.array_equal(model.predict_proba(rows), model_version.model.predict_proba(rows))
+    finally:
+        _worker_models.clear()
+
+
+def test_canary_rejects_wrong_classes(registry, tmp_path):
+    path = tmp_path / "three.pkl"
+    path.write_bytes(forest(3, classes=3))
+    with pytest.raises(ModelLoadError):
+        registry.load(path)
+    assert registry.describe()["versions"] == []
+
+
+def test_min_agreement(tmp_path, artifacts):
+    registry = ModelRegistry("numpy", min_agreement=1.0, store_dir=tmp_path / "store")
+    registry.load(artifacts["deployed"], activate=True)
+    with pytest.raises(ModelLoadError):
+        registry.load(artifacts["a"])
+
+
+def test_traffic_split(registry, artifacts, monkeypatch):
+    first = registry.load(artifacts["deployed"], activate=True)
+    second = registry.load(artifacts["a"])
+    registry.set_split({first.version: 3, second.version: 1})
+    assert registry.split_weights() == {first.version: 0.75, second.version: 0.25}
+
+    draws = iter([0.1, 0.74, 0.76, 0.99])
+    monkeypatch.setattr("fastapi_app.registry.random.random", lambda: next(draws))
+    assert [registry.select() for _ in range(4)] == [first, first, second, second]
+
+    with pytest.raises(KeyError):
+        registry.set_split({"unknown": 1})
+    with pytest.raises(ValueError):
+        registry.set_split({first.version: 0})
+    registry.set_split(None)
+    assert registry.select() is first
+
+
+def test_versions_in_the_split_are_not_evicted(registry, artifacts, tmp_path):
+    active = registry.load(artifacts["deployed"], activate=True)
+    pinned = registry.load(artifacts["a"])
+    registry.set_split({active.version: 1, pinned.version: 1})
+    for seed in range(10, 13):
+        path = tmp_path / f"extra{seed}.pkl"
+        path.write_bytes(forest(seed))
+        registry.load(path)
+    versions = {v["version"] for v in registry.describe()["versions"]}
+    assert len(versions) == registry.max_versions
+    assert {active.version, pinned.version} <= versions
+
+
+def wait_for_job(registry, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while (job := registry.job(job_id))["status"] == "loading":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return job
+
+
+def test_load_in_background(registry, artifacts, tmp_path):
+    job = registry.load_in_background(artifacts["deployed"], activate=True)
+    assert job["status"] == "loading"
+    job = wait_for_job(registry, job["id"])
+    assert job["status"] == "loaded"
+    assert registry.active.version == job["version"]
+
+    broken = tmp_path / "broken.pkl"
+    broken.write_bytes(b"not a pickle")
+    failed = wait_for_job(registry, registry.load_in_background(broken)["id"])
+    assert failed["status"] == "failed" and failed["error"]
+    assert registry.active.version == job["version"]
+    assert [load["id"] for load in registry.describe()["loads"]] == [failed["id"], job["id"]]
@@ -0,0 +1,56 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from fastapi_app import score_batch
+from fastapi_app.routes import diabetes
+
+ROOT = Path(__file__).resolve().parent.parent
+CSV_PATH = ROOT / "model_preparation" / "diabetes.csv"
+MODEL_PATH = ROOT / "fastapi_app" / "diabetes_model.pkl"
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture
+def cohort(monkeypatch, tmp_path):
+    monkeypatch.setattr(diabetes, "MODEL_STORE_DIR", tmp_path / "versions")
+    path = tmp_path / "cohort.csv"
+    shutil.copyfile(CSV_PATH, path)
+    return path
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["score_batch", *map(str, args), "--model", str(MODEL_PATH), "--workers", "1"])
+    score_batch.main()
+
+
+def test_resume_after_an_interruption_matches_a_full_run(monkeypatch, cohort, tmp_path):
+    expected = tmp_path / "expected.csv"
+    run(monkeypatch, cohort, expected, "--chunk-rows", "200")
+
+    output = tmp_path / "scored.csv"
+    write_result = score_batch.write_result
+
+    def stop_after_one_chunk(*args):
+        write_result(*args)
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(score_batch, "write_result", stop_after_one_chunk)
+        with pytest.raises(SystemExit, match="Interrupted after 200 rows"):
+            run(patch, cohort, output, "--chunk-rows", "200")
+    state = score_batch.Checkpoint(output).load()
+    assert state["rows"] == 200 and state["input_offset"] < cohort.stat().st_size
+    # Half a chunk written after the last checkpoint: dropped on resume
+    with open(output, "a") as f:
+        f.write("201,Diabetic,0.9")
+
+    with pytest.raises(SystemExit, match="different input, chunk size or model"):
+        run(monkeypatch, cohort, output, "--chunk-rows", "100", "--resume")
+
+    run(monkeypatch, cohort, output, "--chunk-rows", "200", "--resume")
+    assert output.read_bytes() == expected.read_bytes()
+    assert not score_batch.Checkpoint(output).path.exists()
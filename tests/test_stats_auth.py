@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app import utils
+from fastapi_app.main import app
+
+# Operational numbers (queue depths, hit rates, model versions) are for admins only
+STATS_PATHS = [
+    "/batching/stats",
+    "/cache/stats",
+    "/chat/cache/stats",
+    "/users/cache/stats",
+    "/predictions/stats",
+    "/inference/stats",
+    "/ratelimit/stats",
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(utils, "ADMIN_USERNAMES", {"admin"})
+    # No lifespan: the stats routes need none, and nothing is started for them
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def log_in_as(username: str):
+    app.dependency_overrides[utils.get_current_user] = lambda: SimpleNamespace(id=1, username=username)
+
+
+@pytest.mark.parametrize("path", STATS_PATHS)
+def test_stats_need_an_admin(client, path):
+    assert client.get(path).status_code == 401
+    log_in_as("someone")
+    assert client.get(path).status_code == 403
+    log_in_as("admin")
+    assert client.get(path).status_code == 200
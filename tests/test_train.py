@@ -0,0 +1,32 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from fastapi_app.train import build_model, frames, preprocess
+
+ROOT = Path(__file__).resolve().parent.parent
+CSV_PATH = ROOT / "model_preparation" / "diabetes.csv"
+MODEL_PATH = ROOT / "fastapi_app" / "diabetes_model.pkl"
+NOTEBOOK_FOREST = {"n_estimators": 50, "max_depth": 10}
+
+
+def test_notebook_forest_is_reproduced(tmp_path):
+    arrays, dataset = preprocess(CSV_PATH, tmp_path)
+    named = frames(arrays, dataset["features"])
+    model = build_model("random_forest", NOTEBOOK_FOREST).fit(named["X_train"], named["y_train"])
+    with open(MODEL_PATH, "rb") as model_file:
+        deployed = pickle.load(model_file)
+
+    assert list(model.feature_names_in_) == list(deployed.feature_names_in_)
+    for tree, deployed_tree in zip(model.estimators_, deployed.estimators_):
+        assert np.array_equal(tree.tree_.threshold, deployed_tree.tree_.threshold)
+        assert np.array_equal(tree.tree_.value, deployed_tree.tree_.value)
+
+
+def test_preprocessing_is_cached(tmp_path):
+    arrays, dataset = preprocess(CSV_PATH, tmp_path)
+    cached, cached_dataset = preprocess(CSV_PATH, tmp_path)
+    assert (dataset["cache"], cached_dataset["cache"]) == ("miss", "hit")
+    for name, array in arrays.items():
+        assert np.array_equal(cached[name], array)
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fastapi_app import utils
+from fastapi_app.cache import UserCache
+from fastapi_app.database import Base, apply_sqlite_pragmas, get_async_db
+from fastapi_app.main import app
+from fastapi_app.passwords import PasswordHasher
+from fastapi_app.ratelimit import limit_login, limit_register
+
+ALICE = {"username": "alice", "email": "alice@example.com", "password": "secret123"}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    path = tmp_path / "users.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    sessions = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with sessions() as db:
+            yield db
+
+    # get_current_user opens its own session on a cache miss, so it needs the temporary database too
+    monkeypatch.setattr(utils, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(utils, "user_cache", UserCache())
+    # Cheap hashes on the calling thread: no worker processes to start
+    monkeypatch.setattr(utils, "password_hasher", PasswordHasher(rounds=4, workers=0))
+    app.dependency_overrides[get_async_db] = get_db
+    app.dependency_overrides[limit_login] = lambda: None
+    app.dependency_overrides[limit_register] = lambda: None
+    # No lifespan: the database is the temporary one above
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
+
+
+def register(client, **changes):
+    return client.post("/register", json={**ALICE, **changes})
+
+
+def log_in(client, username="alice", password="secret123") -> dict:
+    response = client.post("/login", data={"username": username, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_register_and_log_in(client):
+    response = register(client)
+    assert response.status_code == 201
+    assert response.json() == {"id": 1, "username": "alice", "email": "alice@example.com"}
+    profile = client.get("/profile", headers=log_in(client))
+    assert profile.status_code == 200 and profile.json()["email"] == "alice@example.com"
+    wrong = client.post("/login", data={"username": "alice", "password": "wrong-password"})
+    assert wrong.status_code == 401
+
+
+def test_duplicate_username_or_email(client):
+    register(client)
+    response = register(client, email="other@example.com")
+    assert response.status_code == 400 and response.json()["detail"] == "Username already exists!"
+    response = register(client, username="bob")
+    assert response.status_code == 400 and response.json()["detail"] == "Email is already registered!"
+
+
+def test_update_drops_the_cached_user(client):
+    register(client)
+    register(client, username="bob", email="bob@example.com")
+    headers = log_in(client)
+    # Cached under this token from here on
+    assert client.get("/profile", headers=headers).json()["username"] == "alice"
+
+    response = client.put("/users/update", headers=headers, json={"username": "alice", "email": "bob@example.com"})
+    assert response.status_code == 400
+    response = client.put("/users/update", headers=headers, json={"username": "alicia", "email": "new@example.com"})
+    assert response.status_code == 200
+    assert response.json() == {"id": 1, "username": "alicia", "email": "new@example.com"}
+    # The token still names "alice": not served from the cache any more, so it no longer resolves
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert client.get("/profile", headers=log_in(client, "alicia")).json()["email"] == "new@example.com"
+
+
+def test_update_password(client):
+    register(client)
+    headers = log_in(client)
+    response = client.put("/users/update-password", headers=headers,
+                          json={"old_password": "not-it-at-all", "new_password": "newsecret"})
+    assert response.status_code == 400
+    response = client.put("/users/update-password", headers=headers,
+                          json={"old_password": "secret123", "new_password": "newsecret"})
+    assert response.status_code == 200
+    assert client.post("/login", data={"username": "alice", "password": "secret123"}).status_code == 401
+    log_in(client, password="newsecret")
+
+
+def test_delete_drops_the_cached_user(client):
+    register(client)
+    headers = log_in(client)
+    assert client.get("/profile", headers=headers).status_code == 200
+
+    assert client.request("DELETE", "/users/delete", headers=headers, json={"password": "wrong-password"}).status_code == 400
+    response = client.request("DELETE", "/users/delete", headers=headers, json={"password": "secret123"})
+    assert response.status_code == 200
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert register(client).status_code == 201